@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""Resumable bulk classification of archived vein images.
+
+Reads a directory (or glob) of images, or a JSONL manifest written by
+`create_json.py --bulk`. Reading, encoding, batched prediction and result
+writing are pipelined under a bounded in-flight window. Predictions go through
+the on-demand service or straight to the Vertex AI endpoints.
+
+Every finished image is appended to the results JSONL. On restart, images
+already recorded as successful are skipped, so an interrupted run resumes
+exactly where it stopped, and failed images are retried.
+
+Usage:
+  python bulk_classify.py archive/ --output results.jsonl --in-flight 8 --batch-size 4
+  python bulk_classify.py requests.jsonl --vein-type hepatic --target direct
+"""
+
+import argparse
+import base64
+import json
+import os
+import re
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from create_json import find_images
+from vexus_tools import ENDPOINTS, auth_headers, get_session, ondemand_predict_url, predict_url
+
+DEFAULT_PARAMETERS = {
+    "confidenceThreshold": 0.0,
+    "maxPredictions": 5
+}
+PROGRESS_INTERVAL = 10  # Seconds between progress lines
+
+# File names in the gallery look like 02.0.2.HV.MD.png; folders say Hepatic/Portal/Renal
+VEIN_PATTERNS = {
+    "hepatic": re.compile(r"hepatic|\bhv\b", re.IGNORECASE),
+    "portal": re.compile(r"portal|\bpv\b", re.IGNORECASE),
+    "renal": re.compile(r"renal|\brv\b", re.IGNORECASE),
+}
+
+
+def infer_vein_type(path):
+    """Guess the vein type from a file path, or return None."""
+    name = path.replace("_", " ").replace(".", " ")
+    for vein_type, pattern in VEIN_PATTERNS.items():
+        if pattern.search(name):
+            return vein_type
+    return None
+
+
+def iter_items(source, vein_type=None):
+    """Yield work items as dicts with a stable key, vein type and a way to get content."""
+    if source.endswith(".jsonl") and os.path.isfile(source):
+        with open(source, "r") as f:
+            for line_number, line in enumerate(f):
+                if not line.strip():
+                    continue
+                payload = json.loads(line)
+                files = (payload.get("metadata") or {}).get("files") or []
+                for index, instance in enumerate(payload.get("instances", [])):
+                    path = files[index] if index < len(files) else None
+                    yield {
+                        "key": path or f"{source}:{line_number}:{index}",
+                        "path": path,
+                        "vein_type": vein_type or (path and infer_vein_type(path)),
+                        "content": instance.get("content"),
+                    }
+    else:
+        for path in find_images(source):
+            yield {
+                "key": path,
+                "path": path,
+                "vein_type": vein_type or infer_vein_type(path),
+                "content": None,
+            }
+
+
+def load_completed(output_path):
+    """Keys already classified successfully by an earlier run."""
+    completed = set()
+    if not os.path.exists(output_path):
+        return completed
+    with open(output_path, "r") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # Line cut short by an interruption
+            if record.get("status") == "ok":
+                completed.add(record["key"])
+    return completed
+
+
+def encode(item):
+    """Return the item's base64 content, reading the file if needed."""
+    if item["content"] is None:
+        with open(item["path"], "rb") as f:
+            item["content"] = base64.b64encode(f.read()).decode("ascii")
+    return item["content"]
+
+
+def parse_predictions(target, body, count):
+    """Normalize on-demand and direct responses into one prediction per instance."""
+    if target == "direct" or "predictions" in body:
+        predictions = body.get("predictions", [])
+    else:
+        # Older on-demand deployments only return the first instance's result
+        predictions = [body]
+    if len(predictions) != count:
+        raise ValueError(f"Expected {count} predictions, got {len(predictions)}")
+    return predictions
+
+
+def classify_batch(target, vein_type, batch, timeout):
+    """Read, encode and classify one batch; return one result record per item."""
+    start = time.perf_counter()
+    try:
+        payload = {
+            "instances": [{"content": encode(item)} for item in batch],
+            "parameters": DEFAULT_PARAMETERS
+        }
+        if target == "direct":
+            response = get_session().post(predict_url(ENDPOINTS[vein_type]), headers=auth_headers(),
+                                          json=payload, timeout=timeout)
+        else:
+            response = get_session().post(ondemand_predict_url(vein_type), json=payload, timeout=timeout)
+        if response.status_code != 200:
+            raise RuntimeError(f"HTTP {response.status_code}: {response.text[:300]}")
+        predictions = parse_predictions(target, response.json(), len(batch))
+        error = None
+    except Exception as e:
+        predictions = [None] * len(batch)
+        error = f"{type(e).__name__}: {e}"
+    latency_ms = round((time.perf_counter() - start) * 1000, 1)
+
+    records = []
+    for item, prediction in zip(batch, predictions):
+        record = {
+            "key": item["key"],
+            "path": item["path"],
+            "vein_type": vein_type,
+            "latency_ms": latency_ms,
+            "batch_size": len(batch),
+        }
+        if prediction is None:
+            record.update(status="error", error=error)
+        else:
+            names = prediction.get("displayNames", [])
+            confidences = prediction.get("confidences", [])
+            record.update(
+                status="ok",
+                label=names[0] if names else None,
+                confidence=confidences[0] if confidences else None,
+                displayNames=names,
+                confidences=confidences
+            )
+        records.append(record)
+        item["content"] = None  # Release the encoded image as soon as it is sent
+    return records
+
+
+class Progress:
+    """Tracks sustained throughput and prints it at a fixed interval."""
+
+    def __init__(self):
+        self.start = time.monotonic()
+        self.last_report = self.start
+        self.ok = 0
+        self.failed = 0
+
+    def update(self, records):
+        for record in records:
+            if record["status"] == "ok":
+                self.ok += 1
+            else:
+                self.failed += 1
+        now = time.monotonic()
+        if now - self.last_report >= PROGRESS_INTERVAL:
+            self.last_report = now
+            print(self.line(), flush=True)
+
+    def rate(self):
+        elapsed = time.monotonic() - self.start
+        return (self.ok + self.failed) / elapsed if elapsed > 0 else 0.0
+
+    def line(self):
+        return (f"{self.ok} classified, {self.failed} failed, "
+                f"{time.monotonic() - self.start:.0f}s elapsed, {self.rate():.2f} images/s")
+
+
+def run(source, output_path, target, vein_type=None, batch_size=4, in_flight=8, timeout=60):
+    completed = load_completed(output_path)
+    if completed:
+        print(f"Resuming: {len(completed)} images already classified")
+
+    progress = Progress()
+    skipped = unknown = 0
+    batches = {}  # {vein_type: [items]} being filled
+    pending = set()
+
+    with open(output_path, "a") as out, ThreadPoolExecutor(max_workers=in_flight) as executor:
+        def drain(block):
+            """Write every finished batch; block until at least one finishes if asked."""
+            nonlocal pending
+            if not pending:
+                return
+            done, pending = wait(pending, timeout=None if block else 0, return_when=FIRST_COMPLETED)
+            for future in done:
+                records = future.result()
+                for record in records:
+                    out.write(json.dumps(record) + "\n")
+                out.flush()
+                progress.update(records)
+
+        def submit(vein, batch):
+            while len(pending) >= in_flight:
+                drain(block=True)
+            pending.add(executor.submit(classify_batch, target, vein, batch, timeout))
+
+        for item in iter_items(source, vein_type):
+            if item["key"] in completed:
+                skipped += 1
+                continue
+            if item["vein_type"] not in ENDPOINTS:
+                unknown += 1
+                continue
+            batch = batches.setdefault(item["vein_type"], [])
+            batch.append(item)
+            if len(batch) >= batch_size:
+                submit(item["vein_type"], batches.pop(item["vein_type"]))
+            drain(block=False)
+
+        for vein, batch in batches.items():
+            submit(vein, batch)
+        while pending:
+            drain(block=True)
+
+    print("\n========== SUMMARY ==========")
+    print(progress.line())
+    print(f"Skipped {skipped} already classified, {unknown} with unknown vein type")
+    print(f"Results: {output_path}")
+    return progress
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Classify an archive of vein images, resumably")
+    parser.add_argument("source", help="Directory, glob, or JSONL from create_json.py --bulk")
+    parser.add_argument("--output", default="classification_results.jsonl", help="Results JSONL (also the checkpoint)")
+    parser.add_argument("--target", choices=("ondemand", "direct"), default="ondemand",
+                        help="Send predictions through the on-demand service or directly to Vertex AI")
+    parser.add_argument("--vein-type", choices=sorted(ENDPOINTS), help="Vein type for every image (default: infer from path)")
+    parser.add_argument("--batch-size", type=int, default=4, help="Instances per prediction request")
+    parser.add_argument("--in-flight", type=int, default=8, help="Maximum prediction requests in flight")
+    parser.add_argument("--timeout", type=float, default=60, help="Seconds per prediction request")
+    args = parser.parse_args()
+
+    try:
+        run(args.source, args.output, args.target, args.vein_type,
+            max(1, args.batch_size), max(1, args.in_flight), args.timeout)
+    except KeyboardInterrupt:
+        print("\nInterrupted; re-run the same command to resume")
+
+
+if __name__ == "__main__":
+    main()
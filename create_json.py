@@ -1,8 +1,21 @@
+import argparse
 import base64
+import glob
+import hashlib
 import json
+import os
 import sys
+from multiprocessing import Pool
 from pathlib import Path
 
+IMAGE_EXTENSIONS = {'.png', '.jpg', '.jpeg', '.gif', '.bmp', '.tif', '.tiff', '.webp'}
+# Multiple of 3 so each chunk base64-encodes without padding and chunks concatenate cleanly
+READ_CHUNK_SIZE = 3 * 256 * 1024
+DEFAULT_PARAMETERS = {
+    "confidenceThreshold": 0.0,
+    "maxPredictions": 5
+}
+
 def image_to_base64(image_path):
     """Convert an image file to base64 string."""
     try:
@@ -20,12 +33,12 @@ def create_json(image_path, output_path):
         if not Path(image_path).is_file():
             print(f"Error: Image file not found: {image_path}")
             sys.exit(1)
-        
+
         # Convert image to base64
         print(f"Reading image from: {image_path}")
         b64_data = image_to_base64(image_path)
         print(f"Successfully encoded image to base64 ({len(b64_data)} bytes)")
-        
+
         # Create the properly formatted JSON structure
         data = {
             "instances": [
@@ -33,42 +46,152 @@ def create_json(image_path, output_path):
                     "content": b64_data
                 }
             ],
-            "parameters": {
-                "confidenceThreshold": 0.0,
-                "maxPredictions": 5
-            }
+            "parameters": DEFAULT_PARAMETERS
         }
 
         # Write to output file with proper formatting
         with open(output_path, 'w') as outfile:
             json.dump(data, outfile, indent=2)
         print(f"Successfully created JSON file at: {output_path}")
-        
+
         # Validate the output file
         with open(output_path, 'r') as infile:
             loaded = json.load(infile)
             content_length = len(loaded["instances"][0]["content"])
             print(f"Validated JSON file. Content length: {content_length}")
-            
+
     except Exception as e:
         print(f"Error: {e}")
         sys.exit(1)
 
+def find_images(source):
+    """List image files under a directory, or matching a glob pattern, in sorted order."""
+    if os.path.isdir(source):
+        paths = [
+            os.path.join(root, name)
+            for root, _, names in os.walk(source)
+            for name in names
+        ]
+    else:
+        paths = glob.glob(source, recursive=True)
+    return sorted(p for p in paths if os.path.isfile(p) and Path(p).suffix.lower() in IMAGE_EXTENSIONS)
+
+def load_manifest(manifest_path):
+    """Load the content-hash manifest: {sha256: {path, size, mtime}}."""
+    if not os.path.exists(manifest_path):
+        return {}
+    with open(manifest_path, 'r') as f:
+        return json.load(f)
+
+def save_manifest(manifest_path, manifest):
+    tmp_path = f"{manifest_path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, manifest_path)
+
+_known_hashes = frozenset()
+
+def _init_worker(known_hashes):
+    global _known_hashes
+    _known_hashes = known_hashes
+
+def encode_file(path):
+    """Hash a file in chunks and, unless its hash is already known, base64-encode it in chunks.
+
+    Returns (path, sha256, base64 string or None when skipped).
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(READ_CHUNK_SIZE), b''):
+            digest.update(chunk)
+        sha256 = digest.hexdigest()
+        if sha256 in _known_hashes:
+            return path, sha256, None
+        f.seek(0)
+        encoded = [base64.b64encode(chunk) for chunk in iter(lambda: f.read(READ_CHUNK_SIZE), b'')]
+    return path, sha256, b''.join(encoded).decode('ascii')
+
+def create_jsonl(source, output_path, batch_size=1, workers=None, manifest_path=None):
+    """Encode every image under source into compact JSONL request payloads.
+
+    Each line holds up to batch_size instances. Files whose content hash is
+    already in the manifest are skipped, so re-running after adding images
+    only encodes the new ones.
+    """
+    manifest_path = manifest_path or f"{output_path}.manifest.json"
+    # A manifest without its output file no longer describes anything written
+    manifest = load_manifest(manifest_path) if os.path.exists(output_path) else {}
+
+    # Unchanged files (same path, size and mtime) are skipped without being read
+    seen = {(entry['path'], entry['size'], entry['mtime']) for entry in manifest.values()}
+    paths = []
+    for path in find_images(source):
+        stat = os.stat(path)
+        if (path, stat.st_size, stat.st_mtime) not in seen:
+            paths.append(path)
+
+    print(f"Found {len(paths)} new or changed images under {source}")
+    written = skipped = lines = 0
+    batch = []
+    encoded_hashes = set(manifest)
+
+    def flush(outfile):
+        nonlocal lines
+        payload = {
+            "instances": [{"content": content} for _, _, content in batch],
+            "parameters": DEFAULT_PARAMETERS,
+            "metadata": {"files": [path for path, _, _ in batch]}
+        }
+        outfile.write(json.dumps(payload, separators=(',', ':')) + '\n')
+        for path, sha256, _ in batch:
+            stat = os.stat(path)
+            manifest[sha256] = {'path': path, 'size': stat.st_size, 'mtime': stat.st_mtime}
+        lines += 1
+        batch.clear()
+
+    with open(output_path, 'a') as outfile, \
+            Pool(processes=workers, initializer=_init_worker, initargs=(frozenset(manifest),)) as pool:
+        try:
+            for path, sha256, content in pool.imap(encode_file, paths, chunksize=8):
+                if content is None or sha256 in encoded_hashes:
+                    skipped += 1
+                    continue
+                encoded_hashes.add(sha256)
+                batch.append((path, sha256, content))
+                written += 1
+                if len(batch) >= batch_size:
+                    flush(outfile)
+            if batch:
+                flush(outfile)
+        finally:
+            outfile.flush()
+            save_manifest(manifest_path, manifest)
+
+    print(f"Encoded {written} images into {lines} lines of {output_path} "
+          f"(skipped {skipped} duplicates)")
+    print(f"Manifest: {manifest_path}")
+
 def main():
     """Main function with usage instructions."""
-    if len(sys.argv) != 3:
-        print("\nUsage: python create_json.py <image_path> <output_json_path>")
-        print("\nExample:")
-        print("  python create_json.py test_image.png input.json")
-        print("\nThis script will:")
-        print("1. Read the image file")
-        print("2. Convert it to base64")
-        print("3. Create a properly formatted JSON file for the API")
-        sys.exit(1)
-    
-    image_file = sys.argv[1]
-    output_file = sys.argv[2]
-    create_json(image_file, output_file)
+    parser = argparse.ArgumentParser(
+        description="Create prediction request JSON from images",
+        epilog="Examples:\n"
+               "  python create_json.py test_image.png input.json\n"
+               "  python create_json.py --bulk test_images/ requests.jsonl --batch-size 8",
+        formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("source", help="Image file, or directory/glob with --bulk")
+    parser.add_argument("output", help="Output JSON file, or JSONL file with --bulk")
+    parser.add_argument("--bulk", action="store_true", help="Encode every image under a directory or glob into JSONL")
+    parser.add_argument("--batch-size", type=int, default=1, help="Instances per JSONL line (bulk mode)")
+    parser.add_argument("--workers", type=int, default=None, help="Encoding processes (default: CPU count)")
+    parser.add_argument("--manifest", help="Content-hash manifest path (default: <output>.manifest.json)")
+    args = parser.parse_args()
+
+    if args.bulk:
+        create_jsonl(args.source, args.output, max(1, args.batch_size), args.workers, args.manifest)
+    else:
+        create_json(args.source, args.output)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,440 @@
+import os
+import json
+import time
+import uuid
+import base64
+import logging
+import threading
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+# Job states, named after Vertex AI JobState without the JOB_STATE_ prefix
+PENDING = "PENDING"
+RUNNING = "RUNNING"
+SUCCEEDED = "SUCCEEDED"
+FAILED = "FAILED"
+CANCELLED = "CANCELLED"
+TERMINAL_STATES = (SUCCEEDED, FAILED, CANCELLED)
+
+POLL_INTERVAL_SECONDS = int(os.environ.get("BATCH_POLL_SECONDS", "30"))
+# AutoML image models write predictions_00001.jsonl, ... under prediction-<model>-<timestamp>/
+OUTPUT_DIR_PREFIX = "prediction-"
+SHARD_PREFIX = "predictions_"
+SHARD_SUFFIX = ".jsonl"
+
+
+def is_shard(path):
+    """Whether a path under a job's output prefix is a result shard, not an errors_stats file or temp file."""
+    parent, name = os.path.split(path)
+    return (os.path.basename(parent).startswith(OUTPUT_DIR_PREFIX)
+            and name.startswith(SHARD_PREFIX) and name.endswith(SHARD_SUFFIX))
+
+
+class BatchStore:
+    """Storage for batch manifests, result shards and the job records themselves."""
+
+    def write_manifest(self, job_id, instances):
+        """Store the JSONL input for a job and return its URI."""
+        raise NotImplementedError
+
+    def output_prefix(self, job_id):
+        """Return the URI prefix a job writes its result shards under."""
+        raise NotImplementedError
+
+    def list_shards(self, output_prefix):
+        """Return the URIs of completed result shards, sorted."""
+        raise NotImplementedError
+
+    def read_shard(self, uri):
+        """Return the JSON records in a result shard."""
+        raise NotImplementedError
+
+    def save_job(self, job):
+        """Store a job record, replacing the one saved before."""
+        raise NotImplementedError
+
+    def load_job(self, job_id):
+        """Return a stored job record, or None."""
+        raise NotImplementedError
+
+    def list_jobs(self):
+        """Return every stored job record."""
+        raise NotImplementedError
+
+
+class BatchRunner:
+    """Submits and tracks batch prediction jobs.
+
+    A resumable runner's handles can be polled and cancelled from any
+    process, so its jobs are tracked again after a restart.
+    """
+
+    resumable = False
+
+    def submit(self, job_id, vein_type, input_uri, output_prefix):
+        """Start a job and return a handle for state() and cancel()."""
+        raise NotImplementedError
+
+    def state(self, handle):
+        """Return (state, error message or None)."""
+        raise NotImplementedError
+
+    def cancel(self, handle):
+        raise NotImplementedError
+
+
+class GCSBatchStore(BatchStore):
+    """Keeps manifests and results in a Cloud Storage bucket."""
+
+    def __init__(self, bucket_name, project=None, prefix="batch"):
+        from google.cloud import storage
+        self.client = storage.Client(project=project)
+        self.bucket_name = bucket_name
+        self.prefix = prefix
+
+    def write_manifest(self, job_id, instances):
+        blob_name = f"{self.prefix}/{job_id}/input.jsonl"
+        data = "".join(json.dumps(instance) + "\n" for instance in instances)
+        self.client.bucket(self.bucket_name).blob(blob_name).upload_from_string(
+            data, content_type="application/jsonl"
+        )
+        return f"gs://{self.bucket_name}/{blob_name}"
+
+    def output_prefix(self, job_id):
+        return f"gs://{self.bucket_name}/{self.prefix}/{job_id}/output"
+
+    def list_shards(self, output_prefix):
+        prefix = output_prefix[len(f"gs://{self.bucket_name}/"):]
+        return sorted(
+            f"gs://{self.bucket_name}/{blob.name}"
+            for blob in self.client.list_blobs(self.bucket_name, prefix=prefix)
+            if is_shard(blob.name)
+        )
+
+    def read_shard(self, uri):
+        blob_name = uri[len(f"gs://{self.bucket_name}/"):]
+        text = self.client.bucket(self.bucket_name).blob(blob_name).download_as_text()
+        return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+    # Job records sit apart from the job directories, so listing them does not list every shard
+    def _job_blob_name(self, job_id):
+        return f"{self.prefix}/jobs/{job_id}.json"
+
+    def save_job(self, job):
+        self.client.bucket(self.bucket_name).blob(self._job_blob_name(job["job_id"])).upload_from_string(
+            json.dumps(job), content_type="application/json"
+        )
+
+    def load_job(self, job_id):
+        from google.api_core import exceptions
+        try:
+            text = self.client.bucket(self.bucket_name).blob(self._job_blob_name(job_id)).download_as_text()
+        except exceptions.NotFound:
+            return None
+        return json.loads(text)
+
+    def list_jobs(self):
+        return [
+            json.loads(blob.download_as_text())
+            for blob in self.client.list_blobs(self.bucket_name, prefix=f"{self.prefix}/jobs/")
+            if blob.name.endswith(".json")
+        ]
+
+
+class VertexBatchRunner(BatchRunner):
+    """Runs jobs as Vertex AI batch prediction jobs."""
+
+    resumable = True
+
+    def __init__(self, project, location, models):
+        self.project = project
+        self.location = location
+        self.models = models
+
+    def submit(self, job_id, vein_type, input_uri, output_prefix):
+        from google.cloud import aiplatform
+        model_id = self.models[vein_type]["model_id"]
+        job = aiplatform.BatchPredictionJob.create(
+            job_display_name=f"vexus-{vein_type}-{job_id}",
+            model_name=f"projects/{self.project}/locations/{self.location}/models/{model_id}",
+            instances_format="jsonl",
+            predictions_format="jsonl",
+            gcs_source=input_uri,
+            gcs_destination_prefix=output_prefix,
+            sync=False
+        )
+        job.wait_for_resource_creation()
+        return job.resource_name
+
+    def state(self, handle):
+        from google.cloud import aiplatform
+        job = aiplatform.BatchPredictionJob(handle)
+        state = job.state.name.replace("JOB_STATE_", "")
+        if state in ("QUEUED", "PENDING"):
+            state = PENDING
+        elif state in ("CANCELLING", "CANCELLED"):
+            state = CANCELLED
+        elif state not in TERMINAL_STATES:
+            state = RUNNING
+        error = job.error.message if state == FAILED and job.error else None
+        return state, error
+
+    def cancel(self, handle):
+        from google.cloud import aiplatform
+        aiplatform.BatchPredictionJob(handle).cancel()
+
+
+class LocalBatchStore(BatchStore):
+    """Filesystem stand-in for Cloud Storage."""
+
+    def __init__(self, root):
+        self.root = root
+
+    def write_manifest(self, job_id, instances):
+        job_dir = os.path.join(self.root, job_id)
+        os.makedirs(job_dir, exist_ok=True)
+        path = os.path.join(job_dir, "input.jsonl")
+        with open(path, "w") as f:
+            for instance in instances:
+                f.write(json.dumps(instance) + "\n")
+        return path
+
+    def output_prefix(self, job_id):
+        return os.path.join(self.root, job_id, "output")
+
+    def list_shards(self, output_prefix):
+        if not os.path.isdir(output_prefix):
+            return []
+        return sorted(
+            os.path.join(output_prefix, directory, name)
+            for directory in os.listdir(output_prefix)
+            if os.path.isdir(os.path.join(output_prefix, directory))
+            for name in os.listdir(os.path.join(output_prefix, directory))
+            if is_shard(os.path.join(directory, name))
+        )
+
+    def read_shard(self, uri):
+        with open(uri, "r") as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    def _job_path(self, job_id):
+        return os.path.join(self.root, job_id, "job.json")
+
+    def save_job(self, job):
+        path = self._job_path(job["job_id"])
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Written under a temporary name and renamed, so readers never see half a record
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(job, f)
+        os.replace(tmp_path, path)
+
+    def load_job(self, job_id):
+        path = self._job_path(job_id)
+        if not os.path.exists(path):
+            return None
+        with open(path, "r") as f:
+            return json.load(f)
+
+    def list_jobs(self):
+        if not os.path.isdir(self.root):
+            return []
+        return [job for job in (self.load_job(name) for name in sorted(os.listdir(self.root))) if job]
+
+
+class LocalBatchRunner(BatchRunner):
+    """Runs jobs in a background thread, writing shards in the layout Vertex AI uses for AutoML image models.
+
+    Each manifest line's content is a local path (optionally file://). Images
+    are sent shard_size at a time to predict_fn(vein_type, instances), which
+    returns one prediction dict per instance. Jobs run in the process that
+    submitted them and end with it.
+    """
+
+    def __init__(self, predict_fn, shard_size=10):
+        self.predict_fn = predict_fn
+        self.shard_size = shard_size
+        self.jobs = {}
+        self.lock = threading.Lock()
+
+    def submit(self, job_id, vein_type, input_uri, output_prefix):
+        with self.lock:
+            self.jobs[job_id] = {"state": PENDING, "error": None, "cancelled": False}
+        thread = threading.Thread(target=self._run, args=(job_id, vein_type, input_uri, output_prefix))
+        thread.daemon = True
+        thread.start()
+        return job_id
+
+    def state(self, handle):
+        with self.lock:
+            job = self.jobs[handle]
+            return job["state"], job["error"]
+
+    def cancel(self, handle):
+        with self.lock:
+            # A job submitted by another worker process runs there and cannot be reached
+            if handle in self.jobs:
+                self.jobs[handle]["cancelled"] = True
+
+    def _set_state(self, job_id, state, error=None):
+        with self.lock:
+            self.jobs[job_id]["state"] = state
+            self.jobs[job_id]["error"] = error
+
+    def _run(self, job_id, vein_type, input_uri, output_prefix):
+        try:
+            self._set_state(job_id, RUNNING)
+            with open(input_uri, "r") as f:
+                instances = [json.loads(line) for line in f if line.strip()]
+            created = datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + "Z"
+            output_dir = os.path.join(output_prefix, f"{OUTPUT_DIR_PREFIX}vexus-{vein_type}-{created}")
+            os.makedirs(output_dir, exist_ok=True)
+            shard_count = max(1, (len(instances) + self.shard_size - 1) // self.shard_size)
+            for index in range(shard_count):
+                if self.jobs[job_id]["cancelled"]:
+                    self._set_state(job_id, CANCELLED)
+                    return
+                chunk = instances[index * self.shard_size:(index + 1) * self.shard_size]
+                payload = []
+                for instance in chunk:
+                    path = instance["content"]
+                    if path.startswith("file://"):
+                        path = path[len("file://"):]
+                    with open(path, "rb") as image:
+                        payload.append({"content": base64.b64encode(image.read()).decode("ascii")})
+                predictions = self.predict_fn(vein_type, payload) if payload else []
+                # Write to a temp name and rename so readers never see a partial shard
+                name = f"{SHARD_PREFIX}{index + 1:05d}{SHARD_SUFFIX}"
+                tmp_path = os.path.join(output_dir, f".{name}.tmp")
+                with open(tmp_path, "w") as out:
+                    for instance, prediction in zip(chunk, predictions):
+                        out.write(json.dumps({"instance": instance, "prediction": prediction}) + "\n")
+                os.replace(tmp_path, os.path.join(output_dir, name))
+            self._set_state(job_id, SUCCEEDED)
+        except Exception as e:
+            logger.error(f"Local batch job {job_id} failed: {str(e)}")
+            self._set_state(job_id, FAILED, str(e))
+
+
+class BatchJobManager:
+    """Submits batch jobs and tracks them asynchronously.
+
+    Job records are saved to the store on every change, so any instance can
+    report a job, and resume() tracks unfinished jobs again after a restart
+    when the runner allows it. Vertex AI jobs keep running, and billing,
+    whether or not anything tracks them.
+    """
+
+    def __init__(self, store, runner, poll_interval=POLL_INTERVAL_SECONDS):
+        self.store = store
+        self.runner = runner
+        self.poll_interval = poll_interval
+        self.jobs = {}
+        self.lock = threading.Lock()
+
+    def submit(self, vein_type, instances):
+        """Write the manifest, start the job and a tracker thread; return the job record."""
+        job_id = uuid.uuid4().hex[:12]
+        input_uri = self.store.write_manifest(job_id, instances)
+        output_prefix = self.store.output_prefix(job_id)
+        handle = self.runner.submit(job_id, vein_type, input_uri, output_prefix)
+        now = datetime.now().isoformat()
+        job = {
+            "job_id": job_id,
+            "vein_type": vein_type,
+            "state": PENDING,
+            "error": None,
+            "handle": handle,
+            "input_uri": input_uri,
+            "output_prefix": output_prefix,
+            "instance_count": len(instances),
+            "shards": [],
+            "created_at": now,
+            "updated_at": now,
+        }
+        self.store.save_job(job)
+        self._start_tracking(job)
+        logger.info(f"Submitted batch job {job_id} for {vein_type} with {len(instances)} instances")
+        return self.get(job_id)
+
+    def resume(self):
+        """Track every unfinished job again, e.g. after a restart; return those jobs."""
+        if not self.runner.resumable:
+            return []
+        resumed = [job for job in self.store.list_jobs() if job["state"] not in TERMINAL_STATES]
+        for job in resumed:
+            self._start_tracking(job)
+        return resumed
+
+    def _start_tracking(self, job):
+        with self.lock:
+            if job["job_id"] in self.jobs:
+                return
+            self.jobs[job["job_id"]] = job
+        thread = threading.Thread(target=self._track, args=(job["job_id"],))
+        thread.daemon = True
+        thread.start()
+
+    def get(self, job_id):
+        """A job tracked here, or else as stored by whichever instance tracks it; None if unknown."""
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job:
+                return dict(job, shards=list(job["shards"]))
+        job = self.store.load_job(job_id)
+        if job and job["state"] not in TERMINAL_STATES and self.runner.resumable:
+            # The instance that submitted it may be gone; track it here too
+            self._start_tracking(job)
+        return job
+
+    def cancel(self, job_id):
+        job = self.get(job_id)
+        if job and job["state"] not in TERMINAL_STATES:
+            self.runner.cancel(job["handle"])
+        return job
+
+    def refresh(self, job_id):
+        """Poll the runner and storage once and update the job record."""
+        job = self.get(job_id)
+        state, error = self.runner.state(job["handle"])
+        shards = self.store.list_shards(job["output_prefix"])
+        if (state, error, shards) == (job["state"], job["error"], job["shards"]):
+            return state
+        with self.lock:
+            self.jobs[job_id].update(
+                state=state,
+                error=error,
+                shards=shards,
+                updated_at=datetime.now().isoformat()
+            )
+            job = dict(self.jobs[job_id], shards=list(shards))
+        # Saved only on a change: a Vertex AI job is polled for hours
+        self.store.save_job(job)
+        return state
+
+    def _track(self, job_id):
+        while True:
+            try:
+                if self.refresh(job_id) in TERMINAL_STATES:
+                    logger.info(f"Batch job {job_id} finished: {self.get(job_id)['state']}")
+                    return
+            except Exception as e:
+                logger.error(f"Error tracking batch job {job_id}: {str(e)}")
+            time.sleep(self.poll_interval)
+
+    def completed_shards(self, job_id):
+        """(job, URIs of the result shards written so far), or (None, []) for an unknown job.
+
+        The state is read before the shards, so the list of a job in a terminal state is final.
+        """
+        job = self.get(job_id)
+        if not job:
+            return None, []
+        return job, self.store.list_shards(job["output_prefix"])
+
+    def stream_results(self, shards):
+        """Yield the result records of the given shards, shard by shard."""
+        for shard in shards:
+            for record in self.store.read_shard(shard):
+                yield record
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""Measure how fast the on-demand service comes up from cold.
+
+Locally, each run starts a fresh gunicorn from this directory with
+gunicorn.conf.py and reports:
+  import_s         time to `import main`
+  sdk_import_s     time to `import main` and load the Vertex AI SDK
+  first_byte_s     process start to the first byte of GET /health
+  first_predict_s  latency of the first /predict request (needs --image)
+  second_predict_s latency of the next one, for comparison
+
+With --url, the deployed service is measured instead (scale it to zero
+first): first_byte_s is the latency of its first GET /health.
+
+Usage:
+  python benchmark_startup.py --runs 3
+  python benchmark_startup.py --image ../test_image.png --vein-type hepatic
+  python benchmark_startup.py --url https://endpoints-on-demand-456295042668.us-central1.run.app --image ../test_image.png
+"""
+
+import argparse
+import base64
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+from statistics import median
+
+import requests
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+BOOT_TIMEOUT = 120  # Seconds to wait for gunicorn to answer
+
+
+def time_import(statement):
+    """Seconds for a fresh interpreter to run statement after importing main."""
+    code = ("import time; start = time.perf_counter(); import main; "
+            f"{statement}; print(time.perf_counter() - start)")
+    output = subprocess.run([sys.executable, "-c", code], cwd=HERE, capture_output=True, text=True, check=True)
+    return float(output.stdout.strip().splitlines()[-1])
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_first_byte(url, start, deadline):
+    while time.perf_counter() < deadline:
+        try:
+            requests.get(f"{url}/health", timeout=60, stream=True)
+            return time.perf_counter() - start
+        except requests.RequestException:
+            time.sleep(0.05)
+    raise TimeoutError(f"No response from {url} within {BOOT_TIMEOUT}s")
+
+
+def time_predict(url, vein_type, content):
+    payload = {
+        "instances": [{"content": content}],
+        "parameters": {"confidenceThreshold": 0.0, "maxPredictions": 5}
+    }
+    start = time.perf_counter()
+    response = requests.post(f"{url}/predict/{vein_type}", json=payload, timeout=300)
+    elapsed = time.perf_counter() - start
+    if response.status_code != 200:
+        print(f"  /predict returned {response.status_code}: {response.text[:200]}", file=sys.stderr)
+    return elapsed
+
+
+def run_local(vein_type, content):
+    result = {
+        "import_s": time_import("pass"),
+        "sdk_import_s": time_import("main.aiplatform.Endpoint"),
+    }
+    port = free_port()
+    env = dict(os.environ, PORT=str(port))
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "main:app"],
+        cwd=HERE, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        url = f"http://127.0.0.1:{port}"
+        result["first_byte_s"] = wait_for_first_byte(url, start, start + BOOT_TIMEOUT)
+        if content:
+            result["first_predict_s"] = time_predict(url, vein_type, content)
+            result["second_predict_s"] = time_predict(url, vein_type, content)
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+    return result
+
+
+def run_remote(url, vein_type, content):
+    start = time.perf_counter()
+    result = {"first_byte_s": wait_for_first_byte(url, start, start + BOOT_TIMEOUT)}
+    if content:
+        result["first_predict_s"] = time_predict(url, vein_type, content)
+        result["second_predict_s"] = time_predict(url, vein_type, content)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark cold start of the on-demand service")
+    parser.add_argument("--runs", type=int, default=3, help="Cold starts to measure")
+    parser.add_argument("--url", help="Measure a deployed service instead of a local gunicorn")
+    parser.add_argument("--image", help="Image to send for the first-prediction measurement")
+    parser.add_argument("--vein-type", default="hepatic", choices=("hepatic", "portal", "renal"))
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    content = None
+    if args.image:
+        with open(args.image, "rb") as f:
+            content = base64.b64encode(f.read()).decode("ascii")
+
+    runs = []
+    for index in range(max(1, args.runs)):
+        result = run_remote(args.url, args.vein_type, content) if args.url else run_local(args.vein_type, content)
+        runs.append(result)
+        if not args.json:
+            print(f"run {index + 1}: " + ", ".join(f"{key}={value:.3f}" for key, value in result.items()))
+        if args.url and index + 1 < args.runs:
+            print("  (later runs only measure a cold start if the service scaled to zero in between)")
+
+    summary = {key: round(median(run[key] for run in runs), 3) for key in runs[0]}
+    if args.json:
+        print(json.dumps({"runs": runs, "median": summary}, indent=2))
+    else:
+        print("median: " + ", ".join(f"{key}={value:.3f}" for key, value in summary.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+import os
+import json
+import time
+import random
+import logging
+import threading
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+PRIMARY = "primary"
+LATENCY_HISTORY = 1000  # Recent latencies kept per vein and version
+SHADOW_WORKERS = int(os.environ.get("SHADOW_WORKERS", "4"))
+SHADOW_MAX_IN_FLIGHT = 16  # Mirrored requests beyond this are dropped, never queued
+
+
+def load_candidates(models, config=None):
+    """Attach candidate versions from JSON config to models[vein_type]['candidates'].
+
+    config (default: the MODEL_CANDIDATES environment variable) maps a vein
+    type to a list of {name, model_id, endpoint_id, weight, shadow_rate}.
+    weight is the fraction of live traffic the candidate serves; shadow_rate
+    the fraction of primary traffic mirrored to it in the background.
+    """
+    config = config if config is not None else os.environ.get("MODEL_CANDIDATES", "")
+    candidates = json.loads(config) if config else {}
+    for vein_type, info in models.items():
+        info["candidates"] = []
+        for candidate in candidates.get(vein_type, []):
+            info["candidates"].append({
+                "name": candidate["name"],
+                "model_id": candidate["model_id"],
+                "endpoint_id": candidate["endpoint_id"],
+                "weight": float(candidate.get("weight", 0.0)),
+                "shadow_rate": float(candidate.get("shadow_rate", 0.0)),
+            })
+        total = sum(candidate["weight"] for candidate in info["candidates"])
+        if total > 1.0:
+            raise ValueError(f"Candidate weights for {vein_type} add up to {total}, more than 1")
+
+
+def find_candidate(models, vein_type, name):
+    for candidate in models[vein_type].get("candidates", []):
+        if candidate["name"] == name:
+            return candidate
+    return None
+
+
+def choose_version(models, vein_type, rng=random):
+    """Pick the version to serve a request: a candidate by weight, or None for the primary."""
+    roll = rng.random()
+    for candidate in models[vein_type].get("candidates", []):
+        if roll < candidate["weight"]:
+            return candidate
+        roll -= candidate["weight"]
+    return None
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class VersionStats:
+    """Latency, errors and label agreement per vein and model version."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(lambda: deque(maxlen=LATENCY_HISTORY))  # {(vein, version): [seconds]}
+        self.requests = defaultdict(int)
+        self.errors = defaultdict(int)
+        self.compared = defaultdict(int)  # {(vein, candidate): shadow results compared with the primary}
+        self.agreed = defaultdict(int)
+
+    def record(self, vein_type, version, seconds, error=False):
+        with self.lock:
+            key = (vein_type, version)
+            self.requests[key] += 1
+            if error:
+                self.errors[key] += 1
+            else:
+                self.latencies[key].append(seconds)
+
+    def record_agreement(self, vein_type, version, agreed):
+        with self.lock:
+            key = (vein_type, version)
+            self.compared[key] += 1
+            if agreed:
+                self.agreed[key] += 1
+
+    def report(self):
+        """{vein_type: {version: {requests, errors, p50_ms, p90_ms, p99_ms, label_agreement}}}"""
+        with self.lock:
+            report = defaultdict(dict)
+            for (vein_type, version), count in self.requests.items():
+                latencies = list(self.latencies[(vein_type, version)])
+                entry = {"requests": count, "errors": self.errors[(vein_type, version)]}
+                if latencies:
+                    entry.update({
+                        f"p{int(fraction * 100)}_ms": round(percentile(latencies, fraction) * 1000, 1)
+                        for fraction in (0.5, 0.9, 0.99)
+                    })
+                compared = self.compared.get((vein_type, version), 0)
+                if compared:
+                    entry["shadow_compared"] = compared
+                    entry["label_agreement"] = round(self.agreed[(vein_type, version)] / compared, 4)
+                report[vein_type][version] = entry
+            return dict(report)
+
+
+class ShadowMirror:
+    """Sends sampled copies of primary traffic to candidates without delaying the primary.
+
+    predict_fn(candidate, instances, parameters) returns the candidate's
+    predictions; candidates for which ready_fn(vein_type, candidate) is false
+    are skipped. Mirrors run on a small thread pool; when SHADOW_MAX_IN_FLIGHT
+    are already running, new ones are dropped rather than queued.
+    """
+
+    def __init__(self, stats, predict_fn, ready_fn=None, workers=SHADOW_WORKERS,
+                 max_in_flight=SHADOW_MAX_IN_FLIGHT, rng=random):
+        self.stats = stats
+        self.predict_fn = predict_fn
+        self.ready_fn = ready_fn
+        self.rng = rng
+        self.slots = threading.BoundedSemaphore(max_in_flight)
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="shadow")
+        self.dropped = 0
+
+    def mirror(self, models, vein_type, instances, parameters, primary_label):
+        """Mirror a request the primary served to each candidate sampled by its shadow_rate."""
+        for candidate in models[vein_type].get("candidates", []):
+            if self.rng.random() >= candidate["shadow_rate"]:
+                continue
+            if self.ready_fn and not self.ready_fn(vein_type, candidate):
+                continue
+            if not self.slots.acquire(blocking=False):
+                self.dropped += 1
+                continue
+            self.executor.submit(self._run, vein_type, candidate, instances, parameters, primary_label)
+
+    def _run(self, vein_type, candidate, instances, parameters, primary_label):
+        try:
+            start = time.perf_counter()
+            try:
+                predictions = self.predict_fn(candidate, instances, parameters)
+            except Exception as e:
+                logger.warning(f"Shadow prediction on {vein_type}/{candidate['name']} failed: {str(e)}")
+                self.stats.record(vein_type, candidate["name"], 0.0, error=True)
+                return
+            self.stats.record(vein_type, candidate["name"], time.perf_counter() - start)
+            self.stats.record_agreement(vein_type, candidate["name"], top_label(predictions) == primary_label)
+        finally:
+            self.slots.release()
+
+
+def top_label(predictions):
+    """Highest-confidence label of the first prediction, or None."""
+    if not predictions:
+        return None
+    names = predictions[0].get("displayNames", [])
+    confidences = predictions[0].get("confidences", [])
+    if not names:
+        return None
+    if len(confidences) != len(names):
+        return names[0]
+    return max(zip(confidences, names))[1]
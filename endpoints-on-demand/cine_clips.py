@@ -0,0 +1,146 @@
+import io
+import os
+import base64
+import logging
+
+logger = logging.getLogger(__name__)
+
+MAX_CLIP_BYTES = 20 * 1024 * 1024  # Largest clip accepted, decoded
+MAX_FRAME_BYTES = int(1.5 * 1024 * 1024)  # Vertex AI's limit per image instance
+CLIP_BATCH_FRAMES = int(os.environ.get("CLIP_BATCH_FRAMES", "4"))  # Frames per prediction request
+CLIP_MAX_FRAMES = int(os.environ.get("CLIP_MAX_FRAMES", "16"))  # Frames classified at most per clip
+STABLE_CONFIDENCE_DELTA = 0.05  # Top-label mean confidence may move this much between batches and still be stable
+FRAME_JPEG_QUALITY = 90
+
+
+class ClipFrames:
+    """Frames of a clip, decoded only when asked for.
+
+    A multi-frame image (animated GIF, multi-frame TIFF) is opened with
+    Pillow and each requested frame is seeked to and re-encoded as JPEG. A
+    frame sequence is a list of already-encoded images and is passed through.
+    """
+
+    def __init__(self, image_bytes=None, frames=None):
+        self.image = None
+        self.frames = frames
+        if image_bytes is not None:
+            # Imported here, off the startup path
+            from PIL import Image
+            self.image = Image.open(io.BytesIO(image_bytes))
+            self.count = getattr(self.image, "n_frames", 1)
+        else:
+            self.count = len(frames)
+
+    def contents(self, indices):
+        """Base64 content of each frame in indices, decoding them in order so seeks only go forward."""
+        encoded = {}
+        for index in sorted(indices):
+            encoded[index] = self.frames[index] if self.image is None else self._encode(index)
+        return [encoded[index] for index in indices]
+
+    def _encode(self, index):
+        self.image.seek(index)
+        buffer = io.BytesIO()
+        self.image.convert("RGB").save(buffer, "JPEG", quality=FRAME_JPEG_QUALITY)
+        if buffer.tell() > MAX_FRAME_BYTES:
+            raise ValueError(f"Frame {index} is larger than 1.5MB once encoded")
+        return base64.b64encode(buffer.getvalue()).decode("ascii")
+
+    def close(self):
+        if self.image is not None:
+            self.image.close()
+
+
+def sampling_order(count, limit=CLIP_MAX_FRAMES):
+    """Frame indices in the order to classify them: spread over the whole clip first, then refined.
+
+    The first and middle frames come first, then the midpoints of the gaps
+    left, so every prefix of the order covers the clip evenly and stopping
+    early still sees its whole length.
+    """
+    if count <= 0:
+        return []
+    order = [0]
+    seen = {0}
+    step = count
+    while len(order) < min(count, limit) and step > 1:
+        step /= 2
+        position = step
+        while position < count:
+            index = int(position)
+            if index not in seen:
+                seen.add(index)
+                order.append(index)
+            position += 2 * step
+    for index in range(count):
+        if len(order) >= min(count, limit):
+            break
+        if index not in seen:
+            seen.add(index)
+            order.append(index)
+    return order[:limit]
+
+
+def aggregate(frame_results):
+    """Mean confidence per label over the frames; a label a frame did not return counts as 0 for it."""
+    totals = {}
+    for result in frame_results:
+        for name, confidence in zip(result["displayNames"], result["confidences"]):
+            totals[name] = totals.get(name, 0.0) + confidence
+    if not frame_results:
+        return {"displayNames": [], "confidences": [], "topLabel": None, "agreement": None}
+    ranked = sorted(totals.items(), key=lambda item: item[1], reverse=True)
+    top = ranked[0][0] if ranked else None
+    agreeing = sum(1 for result in frame_results if frame_top_label(result) == top)
+    return {
+        "displayNames": [name for name, _ in ranked],
+        "confidences": [round(total / len(frame_results), 6) for _, total in ranked],
+        "topLabel": top,
+        "agreement": round(agreeing / len(frame_results), 4),
+    }
+
+
+def frame_top_label(result):
+    if not result["displayNames"]:
+        return None
+    if len(result["confidences"]) != len(result["displayNames"]):
+        return result["displayNames"][0]
+    return max(zip(result["confidences"], result["displayNames"]))[1]
+
+
+def stable(previous, current):
+    """True once another batch left the aggregate top label and its confidence in place."""
+    if previous is None or not current["displayNames"] or previous["topLabel"] != current["topLabel"]:
+        return False
+    return abs(previous["confidences"][0] - current["confidences"][0]) <= STABLE_CONFIDENCE_DELTA
+
+
+def classify_clip(clip, predict_batch, batch_size=CLIP_BATCH_FRAMES, max_frames=CLIP_MAX_FRAMES):
+    """Classify sampled frames in batches until the aggregate is stable or max_frames are done.
+
+    predict_batch(contents) returns one {displayNames, confidences} per
+    content, in order. Returns (per-frame results sorted by frame index,
+    aggregate, whether it stopped before classifying every sampled frame,
+    number of batches).
+    """
+    order = sampling_order(clip.count, max_frames)
+    frame_results = []
+    previous = None
+    batches = 0
+    for start in range(0, len(order), batch_size):
+        indices = order[start:start + batch_size]
+        predictions = predict_batch(clip.contents(indices))
+        batches += 1
+        for index, prediction in zip(indices, predictions):
+            frame_results.append({
+                "frame": index,
+                "displayNames": prediction.get("displayNames", []),
+                "confidences": prediction.get("confidences", []),
+            })
+        current = aggregate(frame_results)
+        if stable(previous, current):
+            logger.info(f"Clip aggregate stable after {len(frame_results)} of {clip.count} frames")
+            return sorted(frame_results, key=lambda r: r["frame"]), current, start + batch_size < len(order), batches
+        previous = current
+    return sorted(frame_results, key=lambda r: r["frame"]), aggregate(frame_results), False, batches
@@ -0,0 +1,401 @@
+import os
+import json
+import time
+import uuid
+import logging
+import threading
+from datetime import datetime
+
+from batch_jobs import CANCELLED, FAILED, PENDING, RUNNING, SUCCEEDED, TERMINAL_STATES
+
+logger = logging.getLogger(__name__)
+
+POLL_INTERVAL_SECONDS = int(os.environ.get("DEPLOY_POLL_SECONDS", "10"))
+JOB_TTL_SECONDS = int(os.environ.get("DEPLOY_JOB_TTL_SECONDS", str(7 * 24 * 3600)))  # How long finished jobs stay pollable
+
+# Finer-grained progress than the job state
+PHASE_QUEUED = "queued"
+PHASE_WAITING = "waiting_for_undeploy"
+PHASE_CREATING_ENDPOINT = "creating_endpoint"
+PHASE_DEPLOYING = "deploying_model"
+PHASE_DONE = "done"
+
+# Tier a deploy resumes from: a kept endpoint only needs the model deployed,
+# a deleted one must be recreated first
+RESUME_HIBERNATED = "hibernated"
+RESUME_DELETED = "deleted"
+
+# google.rpc.Code values reported by long-running operations
+RPC_CANCELLED = 1
+
+
+class DeployJobStore:
+    """Keeps one JSON file per deploy job so any worker, or a restarted one, can read it.
+
+    Next to the jobs, <endpoint_id>.active names the endpoint's unfinished
+    job, so finding it reads one small file instead of every job.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, job_id):
+        return os.path.join(self.root, f"{job_id}.json")
+
+    def save(self, job):
+        tmp_path = os.path.join(self.root, f".{job['job_id']}.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(job, f)
+        os.replace(tmp_path, self._path(job["job_id"]))
+
+    def load(self, job_id):
+        path = self._path(job_id)
+        if not os.path.exists(path):
+            return None
+        with open(path, "r") as f:
+            return json.load(f)
+
+    def list(self):
+        jobs = []
+        for name in sorted(os.listdir(self.root)):
+            if name.endswith(".json"):
+                job = self.load(name[:-len(".json")])
+                if job:
+                    jobs.append(job)
+        return jobs
+
+    def _active_path(self, endpoint_id):
+        return os.path.join(self.root, f"{endpoint_id}.active")
+
+    def set_active(self, endpoint_id, job_id):
+        tmp_path = os.path.join(self.root, f".{endpoint_id}.active.tmp")
+        with open(tmp_path, "w") as f:
+            f.write(job_id)
+        os.replace(tmp_path, self._active_path(endpoint_id))
+
+    def active(self, endpoint_id):
+        """The ID of the endpoint's unfinished job, or None."""
+        try:
+            with open(self._active_path(endpoint_id), "r") as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def clear_active(self, endpoint_id, job_id):
+        """Drop the endpoint's active entry if it still names job_id."""
+        if self.active(endpoint_id) == job_id:
+            try:
+                os.remove(self._active_path(endpoint_id))
+            except FileNotFoundError:
+                pass
+
+    def prune(self, ttl, now=None):
+        """Delete finished jobs last written more than ttl seconds ago; return how many were deleted.
+
+        A job file is rewritten on every update, so only files older than
+        the TTL are parsed at all.
+        """
+        cutoff = (now or time.time()) - ttl
+        pruned = 0
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            try:
+                if not name.endswith(".json") or os.path.getmtime(path) >= cutoff:
+                    continue
+                job = self.load(name[:-len(".json")])
+                if job and job["state"] in TERMINAL_STATES:
+                    os.remove(path)
+                    pruned += 1
+            except (OSError, ValueError) as e:
+                logger.warning(f"Could not prune deploy job file {name}: {str(e)}")
+        return pruned
+
+
+class VertexDeployRunner:
+    """Starts model deployments as Vertex AI long-running operations and polls them by name.
+
+    location_fn(endpoint_id), if given, names the region an endpoint lives
+    in; otherwise every endpoint is in location. credentials_fn(), if given,
+    returns the credentials the clients authenticate with; otherwise they
+    use Application Default Credentials.
+    """
+
+    def __init__(self, project, location, machine_type="n1-standard-2", location_fn=None, credentials_fn=None):
+        self.project = project
+        self.location = location
+        self.machine_type = machine_type
+        self.location_fn = location_fn
+        self.credentials_fn = credentials_fn
+        self._clients = {}
+        self._clients_lock = threading.Lock()
+
+    def client(self, location):
+        """The regional service client; Vertex AI only serves a region's resources from its own host."""
+        with self._clients_lock:
+            if location not in self._clients:
+                from google.cloud import aiplatform_v1
+                self._clients[location] = aiplatform_v1.EndpointServiceClient(
+                    credentials=self.credentials_fn() if self.credentials_fn else None,
+                    client_options={"api_endpoint": f"{location}-aiplatform.googleapis.com"}
+                )
+            return self._clients[location]
+
+    def endpoint_location(self, endpoint_id):
+        return self.location_fn(endpoint_id) if self.location_fn else self.location
+
+    @staticmethod
+    def operation_location(operation_name):
+        # projects/<project>/locations/<location>/.../operations/<id>
+        return operation_name.split("/")[3]
+
+    def endpoint_name(self, endpoint_id):
+        return f"projects/{self.project}/locations/{self.endpoint_location(endpoint_id)}/endpoints/{endpoint_id}"
+
+    def deployed_models(self, endpoint_id):
+        """IDs of the models deployed to the endpoint, or None if it does not exist."""
+        from google.api_core import exceptions
+        try:
+            endpoint = self.client(self.endpoint_location(endpoint_id)).get_endpoint(
+                name=self.endpoint_name(endpoint_id)
+            )
+        except exceptions.NotFound:
+            return None
+        return [model.id for model in endpoint.deployed_models]
+
+    def ensure_endpoint(self, endpoint_id, display_name):
+        """Create the endpoint if it does not exist yet; return (whether it was created, deployed model IDs)."""
+        from google.cloud import aiplatform_v1
+        deployed = self.deployed_models(endpoint_id)
+        if deployed is not None:
+            return False, deployed
+        location = self.endpoint_location(endpoint_id)
+        operation = self.client(location).create_endpoint(
+            parent=f"projects/{self.project}/locations/{location}",
+            endpoint=aiplatform_v1.Endpoint(display_name=display_name),
+            endpoint_id=endpoint_id
+        )
+        operation.result()  # Creating an empty endpoint takes seconds, not minutes
+        return True, []
+
+    def submit(self, endpoint_id, model_id, display_name):
+        """Start deploying the model and return the operation name."""
+        from google.cloud import aiplatform_v1
+        location = self.endpoint_location(endpoint_id)
+        deployed_model = aiplatform_v1.DeployedModel(
+            model=f"projects/{self.project}/locations/{location}/models/{model_id}",
+            display_name=display_name,
+            dedicated_resources=aiplatform_v1.DedicatedResources(
+                machine_spec=aiplatform_v1.MachineSpec(machine_type=self.machine_type),
+                min_replica_count=1,
+                max_replica_count=1
+            )
+        )
+        operation = self.client(location).deploy_model(
+            endpoint=self.endpoint_name(endpoint_id),
+            deployed_model=deployed_model,
+            traffic_split={"0": 100}
+        )
+        return operation.operation.name
+
+    def state(self, operation_name):
+        """Return (state, error message or None) for a deploy operation."""
+        client = self.client(self.operation_location(operation_name))
+        operation = client.get_operation(request={"name": operation_name})
+        if not operation.done:
+            return RUNNING, None
+        if operation.HasField("error") and operation.error.code:
+            if operation.error.code == RPC_CANCELLED:
+                return CANCELLED, None
+            return FAILED, operation.error.message
+        return SUCCEEDED, None
+
+    def cancel(self, operation_name):
+        self.client(self.operation_location(operation_name)).cancel_operation(request={"name": operation_name})
+
+
+class DeployJobManager:
+    """Runs deploys as background jobs whose progress is persisted and pollable.
+
+    submit() only records the job and returns. A tracker thread creates the
+    endpoint if needed, starts the deploy operation and polls it until it
+    finishes. Jobs left unfinished by a previous process are picked up again
+    by resume(), using the operation name saved with the job. on_finish(job)
+    is called once when a job reaches a terminal state. If blocked_fn is
+    given, a job waits while blocked_fn(endpoint_id) is true, so a deploy
+    never races an undeploy of the same endpoint. Finished jobs are deleted
+    job_ttl seconds after they finish.
+    """
+
+    def __init__(self, store, runner, poll_interval=POLL_INTERVAL_SECONDS, on_finish=None, blocked_fn=None,
+                 job_ttl=JOB_TTL_SECONDS):
+        self.store = store
+        self.runner = runner
+        self.poll_interval = poll_interval
+        self.job_ttl = job_ttl
+        self.on_finish = on_finish
+        self.blocked_fn = blocked_fn
+        self.lock = threading.Lock()
+        self.tracking = set()
+
+    def get(self, job_id):
+        job = self.store.load(job_id)
+        if job:
+            job["elapsed_seconds"] = round((job.get("finished_at") or time.time()) - job["started_at"], 1)
+        return job
+
+    def active_job(self, endpoint_id):
+        """The unfinished deploy job for an endpoint, if any."""
+        job_id = self.store.active(endpoint_id)
+        job = self.get(job_id) if job_id else None
+        if job is None or job["state"] in TERMINAL_STATES:
+            return None
+        return job
+
+    def _update(self, job_id, **fields):
+        with self.lock:
+            job = self.store.load(job_id)
+            job.update(fields, updated_at=datetime.now().isoformat())
+            self.store.save(job)
+            return job
+
+    def submit(self, vein_type, endpoint_id, model_id, display_name, resume_from=None):
+        """Record a deploy job and start it in the background; return the job record.
+
+        resume_from=RESUME_HIBERNATED skips the endpoint existence check.
+        """
+        with self.lock:
+            existing = self.active_job(endpoint_id)
+            if existing:
+                return existing
+            now = datetime.now().isoformat()
+            job = {
+                "job_id": uuid.uuid4().hex[:12],
+                "vein_type": vein_type,
+                "endpoint_id": endpoint_id,
+                "model_id": model_id,
+                "display_name": display_name,
+                "state": PENDING,
+                "phase": PHASE_QUEUED,
+                "resumed_from": resume_from,
+                "already_deployed": False,
+                "operation": None,
+                "error": None,
+                "cancel_requested": False,
+                "started_at": time.time(),
+                "finished_at": None,
+                "created_at": now,
+                "updated_at": now,
+            }
+            self.store.save(job)
+            self.store.set_active(endpoint_id, job["job_id"])
+        self._start_tracking(job["job_id"])
+        logger.info(f"Submitted deploy job {job['job_id']} for {vein_type} endpoint {endpoint_id}")
+        return self.get(job["job_id"])
+
+    def cancel(self, job_id):
+        job = self.get(job_id)
+        if job is None or job["state"] in TERMINAL_STATES:
+            return job
+        self._update(job_id, cancel_requested=True)
+        if job["operation"]:
+            try:
+                self.runner.cancel(job["operation"])
+            except Exception as e:
+                logger.error(f"Error cancelling deploy operation {job['operation']}: {str(e)}")
+        return self.get(job_id)
+
+    def resume(self):
+        """Track every unfinished job again, e.g. after a worker restart; return those jobs.
+
+        Expired finished jobs are deleted first, so this one full scan stays
+        bounded by the TTL.
+        """
+        self.prune()
+        resumed = [job for job in self.store.list() if job["state"] not in TERMINAL_STATES]
+        for job in resumed:
+            self.store.set_active(job["endpoint_id"], job["job_id"])
+            self._start_tracking(job["job_id"])
+        return resumed
+
+    def prune(self):
+        """Delete finished jobs older than the TTL; return how many were deleted."""
+        try:
+            pruned = self.store.prune(self.job_ttl)
+        except OSError as e:
+            logger.error(f"Error pruning deploy jobs: {str(e)}")
+            return 0
+        if pruned:
+            logger.info(f"Pruned {pruned} finished deploy jobs older than {self.job_ttl}s")
+        return pruned
+
+    def _start_tracking(self, job_id):
+        with self.lock:
+            if job_id in self.tracking:
+                return
+            self.tracking.add(job_id)
+        thread = threading.Thread(target=self._track, args=(job_id,))
+        thread.daemon = True
+        thread.start()
+
+    def _finish(self, job_id, state, error=None):
+        job = self._update(job_id, state=state, error=error, phase=PHASE_DONE, finished_at=time.time())
+        self.store.clear_active(job["endpoint_id"], job_id)
+        logger.info(f"Deploy job {job_id} finished: {state}")
+        # Deploys are rare, so sweeping expired jobs as each one finishes is cheap enough
+        self.prune()
+        if self.on_finish:
+            try:
+                self.on_finish(job)
+            except Exception as e:
+                logger.error(f"Deploy job {job_id} finish callback failed: {str(e)}")
+
+    def _track(self, job_id):
+        try:
+            job = self.store.load(job_id)
+            if job["operation"] is None:
+                if self.blocked_fn and self.blocked_fn(job["endpoint_id"]):
+                    self._update(job_id, phase=PHASE_WAITING)
+                    while self.blocked_fn(job["endpoint_id"]):
+                        time.sleep(self.poll_interval)
+                job = self.store.load(job_id)
+                if job["cancel_requested"]:
+                    self._finish(job_id, CANCELLED)
+                    return
+                if job["resumed_from"] == RESUME_HIBERNATED:
+                    # Fast path: the endpoint was kept, only the model needs deploying
+                    self._update(job_id, state=RUNNING)
+                    deployed = self.runner.deployed_models(job["endpoint_id"]) or []
+                else:
+                    self._update(job_id, state=RUNNING, phase=PHASE_CREATING_ENDPOINT)
+                    created, deployed = self.runner.ensure_endpoint(job["endpoint_id"], job["display_name"])
+                    self._update(job_id, resumed_from=RESUME_DELETED if created else RESUME_HIBERNATED)
+                if deployed:
+                    # Served already, e.g. deployed before this worker's endpoint state was synced;
+                    # a second copy of the model would only cost a second node
+                    logger.info(f"Endpoint {job['endpoint_id']} already has deployed models {deployed}")
+                    self._update(job_id, already_deployed=True)
+                    self._finish(job_id, SUCCEEDED)
+                    return
+                operation = self.runner.submit(job["endpoint_id"], job["model_id"], job["display_name"])
+                job = self._update(job_id, phase=PHASE_DEPLOYING, operation=operation)
+                if job["cancel_requested"]:
+                    self.runner.cancel(operation)
+            while True:
+                try:
+                    state, error = self.runner.state(job["operation"])
+                    if state in TERMINAL_STATES:
+                        self._finish(job_id, state, error)
+                        return
+                except Exception as e:
+                    logger.error(f"Error polling deploy job {job_id}: {str(e)}")
+                time.sleep(self.poll_interval)
+        except Exception as e:
+            logger.error(f"Deploy job {job_id} failed: {str(e)}")
+            error = str(e)
+            if "quota" in error.lower() or "exceeded" in error.lower():
+                error = f"Quota exceeded: {error}. Please request a quota increase or clean up unused endpoints."
+            self._finish(job_id, FAILED, error)
+        finally:
+            with self.lock:
+                self.tracking.discard(job_id)
@@ -0,0 +1,563 @@
+import os
+import random
+import logging
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from frames import Frame
+
+logger = logging.getLogger(__name__)
+
+PRECLASSIFY_MODE = os.environ.get("DOPPLER_PRECLASSIFY", "track")  # off, track or answer
+MIN_CONFIDENCE = float(os.environ.get("DOPPLER_MIN_CONFIDENCE", "0.85"))  # Below this the rules never answer
+AUDIT_RATE = float(os.environ.get("DOPPLER_AUDIT_RATE", "0.1"))  # Confident frames still sent to the model
+TRACK_QUEUE = int(os.environ.get("DOPPLER_TRACK_QUEUE", "8"))  # Frames waiting to be graded in track mode; more are skipped
+MAX_WIDTH = 800  # Frames are downscaled to this width before the strip is searched
+MIN_BASELINE_FRACTION = 0.4  # The zero-velocity line spans at least this share of the frame width
+SIGNAL_LEVEL = 0.35  # Spectrum pixels are at least this share of the strip's bright level
+NO_FLOW_LEVEL = 0.1  # Velocities below this share of the peak count as no flow
+ENVELOPE_ENERGY = 0.9  # The envelope is where a column's spectrum reaches this share of its energy
+MIN_CYCLES = 2
+GRADES = ("Normal", "Mild", "Severe")
+# Side of the baseline antegrade flow is displayed on, as VExUS views are usually set up,
+# and whether flow on the other side is read as reversal (for the renal vein it is arterial)
+FLOW_DIRECTIONS = {
+    "hepatic": ("below", True),
+    "portal": ("above", True),
+    "renal": ("below", False),
+}
+
+# VExUS grade thresholds
+HEPATIC_REVERSED_DURATION = 0.25  # Share of a cycle below the baseline once systolic flow is reversed
+PORTAL_PULSATILITY = (0.3, 0.5)  # Pulsatility fraction from mild, from severe
+RENAL_INTERRUPTION = 0.05  # Share of a cycle without flow from which flow is discontinuous
+
+
+def load_rgb(image):
+    """Decode encoded bytes or a Frame to an RGB array no wider than MAX_WIDTH.
+
+    Only the width is reduced: the baseline is a line a pixel or two high,
+    which shrinking the height would blur into the spectrum around it.
+    """
+    # Imported here, off the startup path
+    import numpy as np
+    from PIL import Image
+    image = Frame.of(image).rgb()
+    if image.width > MAX_WIDTH:
+        image = image.resize((MAX_WIDTH, image.height), Image.BOX)
+    return np.asarray(image, dtype=np.int16)
+
+
+def longest_runs(mask, max_gap=0):
+    """(length, start) of the longest run of True in each row of a 2-D mask, bridging gaps up to max_gap."""
+    import numpy as np
+    height, width = mask.shape
+    best = np.zeros(height, dtype=int)
+    best_start = np.zeros(height, dtype=int)
+    start = np.zeros(height, dtype=int)
+    last = np.full(height, -width - max_gap - 2)
+    for x in range(width):
+        on = mask[:, x]
+        start = np.where(on & (x - last > max_gap + 1), x, start)
+        last = np.where(on, x, last)
+        longer = on & (x - start + 1 > best)
+        best[longer] = x - start[longer] + 1
+        best_start[longer] = start[longer]
+    return best, best_start
+
+
+def find_baseline(rgb):
+    """(row, left, right) of the zero-velocity line, or None.
+
+    The baseline is the longest straight, evenly lit horizontal line in the
+    frame. The B-mode image, text and ECG trace never run as straight or as
+    far, and a spectrum touching the line is too speckled to continue it.
+    Short breaks, such as JPEG ringing, are bridged.
+    """
+    import numpy as np
+    value = rgb.max(axis=2)
+    even = np.abs(np.diff(value, axis=1)) < 20
+    lengths, starts = longest_runs((value[:, 1:] > 90) & even, max_gap=max(2, rgb.shape[1] // 100))
+    row = int(lengths.argmax())
+    if lengths[row] < MIN_BASELINE_FRACTION * rgb.shape[1]:
+        return None
+    return row, int(starts[row]), int(starts[row] + lengths[row])
+
+
+def spectrum_intensity(rgb):
+    """Grey level of the spectrum; green overlays (ECG trace, green baselines) are zeroed."""
+    import numpy as np
+    red, green, blue = rgb[..., 0], rgb[..., 1], rgb[..., 2]
+    overlay = (green > red + 30) & (green > blue + 30)
+    return np.where(overlay, 0, rgb.mean(axis=2))
+
+
+def locate_strip(rgb):
+    """The spectral Doppler strip of a frame as {baseline, left, right, top, bottom}, or None.
+
+    Columns are those along the baseline with spectrum near it. The strip
+    extends up and down from the baseline until a band of rows with no
+    spectrum, which separates it from the ECG trace, labels and B-mode image.
+    """
+    import numpy as np
+    found = find_baseline(rgb)
+    if found is None:
+        return None
+    baseline, left, right = found
+    height = rgb.shape[0]
+    intensity = spectrum_intensity(rgb)
+    band = max(4, height // 10)
+    near = np.concatenate([intensity[max(0, baseline - band):baseline - 1, left:right],
+                           intensity[baseline + 2:baseline + band, left:right]])
+    if near.size == 0:
+        return None
+    level = max(40.0, SIGNAL_LEVEL * float(np.percentile(near, 99)))
+    active = np.flatnonzero((near > level).mean(axis=0) > 0.02)
+    if len(active) < MIN_BASELINE_FRACTION * rgb.shape[1]:
+        return None
+    left, right = left + int(active[0]), left + int(active[-1]) + 1
+    rows = (intensity[:, left:right] > level).mean(axis=1)
+    gap = max(3, height // 50)
+
+    def extent(step):
+        row, empty, last = baseline + step * 2, 0, baseline
+        while 0 <= row < height and empty < gap:
+            if rows[row] < 0.01:
+                empty += 1
+            else:
+                empty, last = 0, row
+            row += step
+        return last
+
+    return {
+        "baseline": baseline,
+        "left": left,
+        "right": right,
+        "top": extent(-1),
+        "bottom": extent(1),
+        "level": level,
+    }
+
+
+def side_envelope(spectrum, level):
+    """Envelope and energy of each column of one side of the strip, rows ordered outward from the baseline."""
+    import numpy as np
+    signal = np.where(spectrum > level, spectrum, 0.0)
+    energy = signal.sum(axis=0)
+    cumulative = np.cumsum(signal, axis=0)
+    reached = cumulative >= ENVELOPE_ENERGY * np.maximum(energy, 1e-9)
+    envelope = np.where(energy > 0, reached.argmax(axis=0) + 1, 0)
+    return envelope.astype(float), energy
+
+
+def extract_trace(rgb, strip, forward="below", with_reverse=True):
+    """Velocity envelope along the strip as a 1-D signal, peak-normalized, positive in the forward direction.
+
+    forward is the side of the baseline that antegrade flow is displayed
+    on. With with_reverse, each column takes the side with more spectrum and
+    the other side reads as negative, reversed flow; without it, only the
+    forward side is read, e.g. to keep arterial flow out of a renal vein
+    trace. Returns (trace, share of columns with any flow), or (None, 0.0)
+    if there is no spectrum.
+    """
+    import numpy as np
+    intensity = spectrum_intensity(rgb)[:, strip["left"]:strip["right"]]
+    baseline = strip["baseline"]
+    sides = {
+        "above": side_envelope(intensity[strip["top"]:baseline - 1][::-1], strip["level"]),
+        "below": side_envelope(intensity[baseline + 2:strip["bottom"] + 1], strip["level"]),
+    }
+    envelope, energy = sides[forward]
+    if with_reverse:
+        reverse, reverse_energy = sides["above" if forward == "below" else "below"]
+        trace = np.where(energy >= reverse_energy, envelope, -reverse)
+        flowing = (energy > 0) | (reverse_energy > 0)
+    else:
+        trace, flowing = envelope, energy > 0
+    # Smooth over about 1% of the strip, which keeps wave shapes but not speckle
+    window = max(3, len(trace) // 100)
+    trace = np.convolve(trace, np.ones(window) / window, mode="same")
+    peak = np.abs(trace).max()
+    if peak == 0:
+        return None, 0.0
+    return trace / peak, float(flowing.mean())
+
+
+def ecg_trace(rgb, strip):
+    """The ECG trace under or over the strip as a 1-D signal, column for column with the strip, or None.
+
+    The ECG is drawn in green, so it is the horizontal band of rows holding
+    the most green pixels outside the baseline; its height in each column
+    is the mean row of the green pixels there.
+    """
+    import numpy as np
+    red, green, blue = rgb[..., 0], rgb[..., 1], rgb[..., 2]
+    mask = ((green > red + 30) & (green > blue + 30))[:, strip["left"]:strip["right"]]
+    mask[max(0, strip["baseline"] - 2):strip["baseline"] + 3] = False
+    counts = mask.sum(axis=1)
+    top = bottom = int(counts.argmax())
+    if counts[top] == 0:
+        return None
+    while top > 0 and counts[top - 1] > 0:
+        top -= 1
+    while bottom < len(counts) - 1 and counts[bottom + 1] > 0:
+        bottom += 1
+    band = mask[top:bottom + 1]
+    drawn = band.any(axis=0)
+    if drawn.mean() < 0.8:
+        return None
+    rows = np.arange(top, bottom + 1)[:, None]
+    height = np.where(drawn, (band * rows).sum(axis=0) / np.maximum(band.sum(axis=0), 1), np.nan)
+    columns = np.arange(len(height))
+    height = np.interp(columns, columns[drawn], height[drawn])
+    return np.median(height) - height
+
+
+def r_peaks(ecg):
+    """Column of each R wave: the largest deflections of the ECG either way, at least 1/15 of the strip apart."""
+    import numpy as np
+    deflection = np.abs(ecg)
+    threshold = 0.5 * deflection.max()
+    shortest = max(4, len(ecg) // 15)
+    peaks = []
+    for index in range(1, len(ecg) - 1):
+        if deflection[index] < threshold or deflection[index] < deflection[index - 1] \
+                or deflection[index] < deflection[index + 1]:
+            continue
+        if peaks and index - peaks[-1] < shortest:
+            if deflection[index] > deflection[peaks[-1]]:
+                peaks[-1] = index
+            continue
+        peaks.append(index)
+    return peaks
+
+
+def cycle_length(trace):
+    """Samples per cardiac cycle, from the strongest autocorrelation peak, or None."""
+    import numpy as np
+    centered = trace - trace.mean()
+    correlation = np.correlate(centered, centered, mode="full")[len(trace) - 1:]
+    if correlation[0] <= 0:
+        return None
+    correlation = correlation / correlation[0]
+    shortest, longest = max(4, len(trace) // 15), int(len(trace) / MIN_CYCLES)
+    if longest <= shortest:
+        return None
+    lags = np.arange(shortest, longest)
+    peaks = [lag for lag in lags if correlation[lag] >= correlation[lag - 1] and correlation[lag] >= correlation[lag + 1]]
+    if not peaks:
+        return None
+    best = max(peaks, key=lambda lag: correlation[lag])
+    return int(best) if correlation[best] > 0.2 else None
+
+
+def split_cycles(trace, length):
+    """(start, end) of each whole cycle, cut at the lowest velocity of each, e.g. the atrial wave of a hepatic vein."""
+    import numpy as np
+    bounds = [int(np.argmin(trace[:length]))]
+    while True:
+        low, high = bounds[-1] + int(0.7 * length), bounds[-1] + int(1.3 * length)
+        if high > len(trace):
+            break
+        bounds.append(low + int(np.argmin(trace[low:high])))
+    return list(zip(bounds, bounds[1:]))
+
+
+def wave_peaks(cycle, minimum_prominence=0.1):
+    """Indices of the local maxima of a cycle that stand out from the valleys either side of them."""
+    peaks = []
+    for index in range(1, len(cycle) - 1):
+        if cycle[index] < cycle[index - 1] or cycle[index] < cycle[index + 1] or cycle[index] <= 0:
+            continue
+        if cycle[index] - max(min(cycle[:index]), min(cycle[index + 1:])) >= minimum_prominence:
+            peaks.append(index)
+    # Plateaus report each sample; keep the first of adjacent maxima
+    return [index for position, index in enumerate(peaks) if position == 0 or index - peaks[position - 1] > 1]
+
+
+def flow_segments(cycle):
+    """Runs of forward flow in a cycle; a run must last 3% of the cycle to count."""
+    flowing = cycle >= NO_FLOW_LEVEL
+    segments, run = 0, 0
+    for value in list(flowing) + [False]:
+        if value:
+            run += 1
+            continue
+        if run >= max(1, int(0.03 * len(cycle))):
+            segments += 1
+        run = 0
+    return segments
+
+
+def cycle_metrics(cycle):
+    """Waveform metrics of one cardiac cycle of a peak-normalized trace."""
+    import numpy as np
+    vmax, vmin = float(cycle.max()), float(cycle.min())
+    metrics = {
+        "pulsatility_fraction": (vmax - vmin) / vmax if vmax > 0 else None,
+        "reversed_duration": float((cycle < -NO_FLOW_LEVEL).mean()),
+        "interruption": float((np.abs(cycle) < NO_FLOW_LEVEL).mean()),
+        "flow_segments": flow_segments(cycle),
+        "sd_ratio": None,
+    }
+    peaks = wave_peaks(cycle)
+    if len(peaks) >= 2:
+        # Cycles start at the R wave or the atrial wave, so of the two largest waves the systolic comes first
+        systolic, diastolic = sorted(sorted(peaks, key=lambda index: cycle[index])[-2:])
+        metrics["sd_ratio"] = float(cycle[systolic] / cycle[diastolic])
+    return metrics
+
+
+def waveform_metrics(trace, beats=None):
+    """Per-cycle metrics of a trace and their medians, or None if no cardiac cycle can be found.
+
+    beats are the columns of the R waves when the frame has an ECG; the
+    cycles run from one to the next. Otherwise the cycle length comes from
+    the trace's own periodicity, which can lock onto half or twice the true
+    length when the waveform has two similar waves per beat.
+    """
+    import numpy as np
+    if beats and len(beats) > MIN_CYCLES:
+        bounds, source = list(zip(beats, beats[1:])), "ecg"
+        length = int(np.median(np.diff(beats)))
+    else:
+        length = cycle_length(trace)
+        if length is None:
+            return None
+        bounds, source = split_cycles(trace, length), "spectrum"
+    cycles = [cycle_metrics(trace[start:end]) for start, end in bounds]
+    if len(cycles) < MIN_CYCLES:
+        return None
+
+    def median(name):
+        values = [cycle[name] for cycle in cycles if cycle[name] is not None]
+        return round(float(np.median(values)), 3) if values else None
+
+    mean = float(trace.mean())
+    return {
+        "cycles": len(cycles),
+        "cycle_samples": length,
+        "cycle_source": source,
+        "sd_ratio": median("sd_ratio"),
+        "pulsatility_fraction": median("pulsatility_fraction"),
+        "pulsatility_index": round((float(trace.max()) - float(trace.min())) / mean, 3) if mean > 0 else None,
+        "reversed_duration": median("reversed_duration"),
+        "interruption": median("interruption"),
+        "flow_segments": median("flow_segments"),
+        "per_cycle": cycles,
+    }
+
+
+def hepatic_grade(cycle, from_ecg):
+    if cycle["reversed_duration"] >= HEPATIC_REVERSED_DURATION:
+        return 2, cycle["reversed_duration"] - HEPATIC_REVERSED_DURATION
+    if cycle["sd_ratio"] is None:
+        return None, 0.0
+    # Margins on the log scale, so S twice D is as clear as D twice S
+    import math
+    return (0 if cycle["sd_ratio"] > 1 else 1), abs(math.log(cycle["sd_ratio"]))
+
+
+def portal_grade(cycle, from_ecg):
+    fraction = cycle["pulsatility_fraction"]
+    if fraction is None:
+        return None, 0.0
+    mild, severe = PORTAL_PULSATILITY
+    grade = 0 if fraction < mild else 1 if fraction < severe else 2
+    return grade, min(abs(fraction - mild), abs(fraction - severe))
+
+
+def renal_grade(cycle, from_ecg):
+    if cycle["interruption"] < RENAL_INTERRUPTION:
+        return 0, RENAL_INTERRUPTION - cycle["interruption"]
+    # Biphasic and monophasic flow differ in waves per beat, which only an ECG can count
+    if not from_ecg or cycle["flow_segments"] == 0:
+        return None, 0.0
+    return (1 if cycle["flow_segments"] >= 2 else 2), cycle["interruption"] - RENAL_INTERRUPTION
+
+
+RULES = {
+    # Grade function and the margin past a threshold that counts as clear
+    "hepatic": (hepatic_grade, 0.3),
+    "portal": (portal_grade, 0.1),
+    "renal": (renal_grade, 0.1),
+}
+
+
+def grade_waveform(vein_type, metrics):
+    """(grade index, confidence) from the per-cycle metrics of a vein's waveform, or (None, 0.0).
+
+    Every cycle is graded on its own. Confidence is the share of cycles that
+    agree with the most common grade, lowered when their margin past the
+    nearest threshold is small.
+    """
+    grade_fn, clear_margin = RULES[vein_type]
+    from_ecg = metrics["cycle_source"] == "ecg"
+    graded = [grade_fn(cycle, from_ecg) for cycle in metrics["per_cycle"]]
+    grades = [grade for grade, _ in graded if grade is not None]
+    if not grades:
+        return None, 0.0
+    grade = max(set(grades), key=grades.count)
+    margins = sorted(margin for cycle_grade, margin in graded if cycle_grade == grade)
+    margin = min(1.0, margins[len(margins) // 2] / clear_margin)
+    return grade, round(grades.count(grade) / len(graded) * (0.6 + 0.4 * margin), 4)
+
+
+def label_grade(label):
+    """Grade index named in a model label, e.g. 1 for "Hepatic Vein: Mild", or None."""
+    if not label:
+        return None
+    lowered = label.lower()
+    for index, grade in enumerate(GRADES):
+        if grade.lower() in lowered:
+            return index
+    return None
+
+
+def analyze(vein_type, image):
+    """Strip, trace metrics and coverage of a vein's frame, or None if it has no readable Doppler waveform."""
+    rgb = load_rgb(image)
+    strip = locate_strip(rgb)
+    if strip is None:
+        return None
+    forward, with_reverse = FLOW_DIRECTIONS[vein_type]
+    trace, coverage = extract_trace(rgb, strip, forward, with_reverse)
+    if trace is None:
+        return None
+    ecg = ecg_trace(rgb, strip)
+    metrics = waveform_metrics(trace, r_peaks(ecg) if ecg is not None else None)
+    if metrics is None:
+        return None
+    metrics["coverage"] = round(coverage, 3)
+    metrics["strip"] = {key: strip[key] for key in ("baseline", "left", "right", "top", "bottom")}
+    return metrics
+
+
+class DopplerPreclassifier:
+    """Grades a frame from its Doppler waveform with VExUS rules, before or instead of the model.
+
+    classify() returns the metrics, the rule-based label and its confidence.
+    Whenever the model also classified the frame, record() notes whether its
+    top label named the same grade, so the rules' agreement with the model is
+    known before they are trusted to answer on their own.
+
+    In track mode nothing waits on the rules: track() grades the frame on a
+    background thread once the model has answered, and records the result.
+    """
+
+    def __init__(self, mode=PRECLASSIFY_MODE, min_confidence=MIN_CONFIDENCE, audit_rate=AUDIT_RATE,
+                 track_queue=TRACK_QUEUE):
+        self.mode = mode
+        self.min_confidence = min_confidence
+        self.audit_rate = audit_rate
+        self.track_queue = track_queue
+        self.executor = None
+        self.pid = None
+        self.pending = 0
+        self.lock = threading.Lock()
+        self.counts = defaultdict(lambda: defaultdict(int))  # {vein_type: {outcome: count}}
+        self.confusion = defaultdict(lambda: defaultdict(int))  # {vein_type: {"rules->model": count}}
+
+    @property
+    def enabled(self):
+        return self.mode in ("track", "answer")
+
+    def classify(self, vein_type, image):
+        """{label, grade, confidence, confident, metrics} for a frame, or None if no waveform was read."""
+        try:
+            metrics = analyze(vein_type, image)
+        except Exception as e:
+            logger.warning(f"Could not read a Doppler waveform: {str(e)}")
+            metrics = None
+        if metrics is None:
+            self._count(vein_type, "no_waveform")
+            return None
+        grade, confidence = grade_waveform(vein_type, metrics)
+        if grade is None:
+            self._count(vein_type, "ungraded")
+            return None
+        confident = confidence >= self.min_confidence
+        self._count(vein_type, "confident" if confident else "uncertain")
+        metrics = {name: value for name, value in metrics.items() if name != "per_cycle"}
+        return {
+            "label": f"{vein_type.capitalize()} Vein: {GRADES[grade]}",
+            "grade": grade,
+            "confidence": confidence,
+            "confident": confident,
+            "metrics": metrics,
+        }
+
+    def should_answer(self, result):
+        """True if a confident result answers on its own; a sample still goes to the model for auditing."""
+        return self.mode == "answer" and result is not None and result["confident"] \
+            and random.random() >= self.audit_rate
+
+    def answered(self, vein_type):
+        self._count(vein_type, "answered")
+
+    def track(self, vein_type, image, model_label):
+        """Grade a frame on a background thread and record() it against the model's top label; never waits.
+
+        Returns False, and counts the frame as skipped, when track_queue frames are already waiting.
+        """
+        with self.lock:
+            if self.pending >= self.track_queue:
+                self.counts[vein_type]["track_skipped"] += 1
+                return False
+            # An executor from before a fork has no thread in this process
+            if self.executor is None or self.pid != os.getpid():
+                self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="doppler-track")
+                self.pid = os.getpid()
+            self.pending += 1
+            executor = self.executor
+        executor.submit(self._track, vein_type, image, model_label)
+        return True
+
+    def _track(self, vein_type, image, model_label):
+        try:
+            self.record(vein_type, self.classify(vein_type, image), model_label)
+        except Exception as e:
+            logger.warning(f"Could not track the Doppler grade of a {vein_type} frame: {str(e)}")
+        finally:
+            with self.lock:
+                self.pending -= 1
+
+    def record(self, vein_type, result, model_label):
+        """Compare a rule-based result with the model's top label for the same frame."""
+        model_grade = label_grade(model_label)
+        if result is None or model_grade is None:
+            return
+        agreed = model_grade == result["grade"]
+        with self.lock:
+            counts = self.counts[vein_type]
+            counts["compared"] += 1
+            counts["agreed"] += agreed
+            if result["confident"]:
+                counts["compared_confident"] += 1
+                counts["agreed_confident"] += agreed
+            self.confusion[vein_type][f"{GRADES[result['grade']]}->{GRADES[model_grade]}"] += 1
+
+    def _count(self, vein_type, outcome):
+        with self.lock:
+            self.counts[vein_type][outcome] += 1
+
+    def report(self):
+        """{mode, min_confidence, veins: {vein_type: {counts, agreement, confident_agreement, confusion}}}"""
+        with self.lock:
+            veins = {}
+            for vein_type, counts in self.counts.items():
+                compared, confident = counts["compared"], counts["compared_confident"]
+                veins[vein_type] = {
+                    "counts": dict(counts),
+                    "agreement": round(counts["agreed"] / compared, 4) if compared else None,
+                    "confident_agreement": round(counts["agreed_confident"] / confident, 4) if confident else None,
+                    "confusion": dict(self.confusion[vein_type]),
+                }
+            return {
+                "mode": self.mode,
+                "min_confidence": self.min_confidence,
+                "audit_rate": self.audit_rate,
+                "track_pending": self.pending,
+                "veins": veins,
+            }
@@ -0,0 +1,262 @@
+import os
+import time
+import logging
+from collections import defaultdict, deque
+from statistics import median
+
+from reaper import EndpointReaper
+
+logger = logging.getLogger(__name__)
+
+# Pool policy. These are module attributes rather than literals so the offline
+# simulator (simulator.py) can sweep them against the same code the service runs.
+DEFAULT_TIMEOUT_MINUTES = int(os.environ.get("TIMEOUT_MINUTES", "15"))  # Default time before endpoint deletion
+MIN_TIMEOUT_MINUTES = 5  # Minimum timeout for rarely used endpoints
+MAX_TIMEOUT_MINUTES = 20  # Maximum timeout for frequently used endpoints
+MAX_ENDPOINTS_PER_TYPE = 2  # Maximum number of endpoints to maintain per model type
+LOW_USAGE_THRESHOLD = 5  # Fewer requests than this in the window counts as rarely used
+HIGH_USAGE_THRESHOLD = 20  # More requests than this in the window counts as frequently used
+# A hibernated endpoint (model undeployed, resource kept) costs nothing to keep,
+# but counts against the endpoint quota, so it is deleted after this long
+HIBERNATED_DELETE_MINUTES = int(os.environ.get("HIBERNATED_DELETE_MINUTES", str(24 * 60)))
+
+# Lifecycle tiers: warm -> hibernated -> deleted
+TIER_WARM = "warm"
+TIER_HIBERNATED = "hibernated"
+TIER_DELETED = "deleted"
+TIME_TO_READY_HISTORY = 50  # Recent resumes kept per tier
+
+# Dictionary to store endpoint data with creation timestamp
+# Structure: {model_type: {endpoint_id: {endpoint_obj, created_at, in_use}}}
+endpoints = {}
+
+# Track usage patterns for adaptive timeouts
+usage_history = defaultdict(list)  # {model_type: [timestamp1, timestamp2, ...]}
+usage_window = 24 * 60 * 60  # 24 hours window for usage analysis
+
+# Endpoints whose model was undeployed but whose resource was kept
+# Structure: {model_type: {endpoint_id: {endpoint_obj, hibernated_at}}}
+hibernated = {}
+
+# Seconds from a request for a model to the model being ready, by the tier it resumed from
+time_to_ready = defaultdict(lambda: deque(maxlen=TIME_TO_READY_HISTORY))
+
+# Time source for every pool decision. The simulator replaces it with its
+# virtual clock; the service always uses wall-clock time.
+clock = time.time
+
+# Undeploys and deletes run on the reaper's workers, never on a request thread.
+# The simulator swaps in an inline reaper (workers=0).
+reaper = EndpointReaper()
+
+
+class EndpointPool:
+    """Manages a pool of endpoints for more efficient resource usage."""
+
+    @staticmethod
+    def get_available_endpoint(model_type):
+        """Get an available endpoint for the specified model type."""
+        if model_type not in endpoints:
+            endpoints[model_type] = {}
+            return None
+
+        # Look for an existing endpoint that's not in use
+        available_endpoints = [
+            endpoint_id for endpoint_id, info in endpoints[model_type].items()
+            if not info.get('in_use', False)
+        ]
+
+        if available_endpoints:
+            # Get the most recently used endpoint
+            endpoint_id = max(
+                available_endpoints,
+                key=lambda eid: endpoints[model_type][eid]['created_at']
+            )
+
+            # Mark as in use
+            endpoints[model_type][endpoint_id]['in_use'] = True
+            return endpoint_id
+
+        return None
+
+    @staticmethod
+    def release_endpoint(model_type, endpoint_id):
+        """Release an endpoint back to the pool."""
+        if model_type in endpoints and endpoint_id in endpoints[model_type]:
+            # Update timestamp and mark as not in use
+            endpoints[model_type][endpoint_id]['created_at'] = clock()
+            endpoints[model_type][endpoint_id]['in_use'] = False
+            logger.info("Released endpoint %s back to the pool", endpoint_id, extra={"sample": True})
+
+    @staticmethod
+    def add_endpoint(model_type, endpoint_id, endpoint_obj):
+        """Add a new endpoint to the pool."""
+        if model_type not in endpoints:
+            endpoints[model_type] = {}
+
+        endpoints[model_type][endpoint_id] = {
+            "endpoint_obj": endpoint_obj,
+            "created_at": clock(),
+            "in_use": True
+        }
+
+        # Check if we have too many endpoints of this type
+        if len(endpoints[model_type]) > MAX_ENDPOINTS_PER_TYPE:
+            # Find the oldest endpoint
+            oldest_endpoint_id = min(
+                endpoints[model_type].keys(),
+                key=lambda eid: endpoints[model_type][eid]['created_at']
+            )
+
+            # If it's not the one we just added and not in use, delete it
+            if oldest_endpoint_id != endpoint_id and not endpoints[model_type][oldest_endpoint_id]['in_use']:
+                logger.info(f"Pool maintenance: removing oldest endpoint {oldest_endpoint_id}")
+                EndpointPool.delete_endpoint(model_type, oldest_endpoint_id)
+
+    @staticmethod
+    def delete_endpoint(model_type, endpoint_id):
+        """Remove an endpoint from the pool and mark it for background undeploy and delete."""
+        if model_type in endpoints and endpoint_id in endpoints[model_type]:
+            endpoint_obj = endpoints[model_type][endpoint_id]['endpoint_obj']
+            del endpoints[model_type][endpoint_id]
+            reaper.mark(model_type, endpoint_id, endpoint_obj)
+        elif model_type in hibernated and endpoint_id in hibernated[model_type]:
+            endpoint_obj = hibernated[model_type].pop(endpoint_id)['endpoint_obj']
+            reaper.mark(model_type, endpoint_id, endpoint_obj)
+
+    @staticmethod
+    def hibernate_endpoint(model_type, endpoint_id):
+        """Remove an endpoint from the pool and mark its model for undeploy, keeping the endpoint."""
+        if model_type in endpoints and endpoint_id in endpoints[model_type]:
+            endpoint_obj = endpoints[model_type].pop(endpoint_id)['endpoint_obj']
+            hibernated.setdefault(model_type, {})[endpoint_id] = {
+                "endpoint_obj": endpoint_obj,
+                "hibernated_at": clock()
+            }
+            reaper.mark(model_type, endpoint_id, endpoint_obj, delete=False)
+
+    @staticmethod
+    def resume_endpoint(model_type, endpoint_id):
+        """Forget a hibernated endpoint that is being redeployed; return its endpoint object or None."""
+        entry = hibernated.get(model_type, {}).pop(endpoint_id, None)
+        return entry["endpoint_obj"] if entry else None
+
+
+def record_usage(model_type):
+    """Record a request for a model type so the adaptive timeout can see it."""
+    usage_history[model_type].append(clock())
+
+
+def calculate_adaptive_timeout(model_type):
+    """Calculate timeout based on usage patterns."""
+    now = clock()
+    # Remove timestamps older than the window
+    usage_history[model_type] = [ts for ts in usage_history[model_type] if now - ts < usage_window]
+
+    # Count usages in the past window
+    usage_count = len(usage_history[model_type])
+
+    if usage_count < LOW_USAGE_THRESHOLD:
+        # Rarely used - shorter timeout to save costs
+        return MIN_TIMEOUT_MINUTES
+    elif usage_count > HIGH_USAGE_THRESHOLD:
+        # Frequently used - longer timeout to reduce cold starts
+        return MAX_TIMEOUT_MINUTES
+    else:
+        # Moderate usage - use default timeout
+        return DEFAULT_TIMEOUT_MINUTES
+
+
+def endpoint_expired(model_type, endpoint_id, timeout_seconds):
+    """Return True if a tracked endpoint has been idle for at least timeout_seconds."""
+    if model_type not in endpoints or endpoint_id not in endpoints[model_type]:
+        return False
+    info = endpoints[model_type][endpoint_id]
+    if info.get('in_use', False):
+        return False
+    return clock() - info['created_at'] >= timeout_seconds
+
+
+# Deployed-model state of every managed endpoint, kept current by the background
+# reconciler (reconciler.py) so request handlers never ask Vertex AI for it.
+# Structure: {model_type: {endpoint_id: {endpoint_obj, display_name, deployed_models, synced_at, error}}}
+deployment_state = {}
+
+
+def set_deployment_state(model_type, endpoint_id, endpoint_obj, display_name, deployed_models, error=None):
+    """Record the latest synced state of an endpoint; return True if it changed."""
+    previous = deployment_state.get(model_type, {}).get(endpoint_id)
+    deployment_state.setdefault(model_type, {})[endpoint_id] = {
+        "endpoint_obj": endpoint_obj if endpoint_obj is not None else (previous or {}).get("endpoint_obj"),
+        "display_name": display_name,
+        "deployed_models": deployed_models,
+        "synced_at": clock(),
+        "error": error,
+    }
+    if previous is None:
+        return True
+    return previous["deployed_models"] != deployed_models or previous["error"] != error
+
+
+def get_deployment_state(model_type, endpoint_id):
+    """Return the last synced state of an endpoint, or None if it has not been synced yet."""
+    return deployment_state.get(model_type, {}).get(endpoint_id)
+
+
+def deployment_ready(model_type, endpoint_id):
+    """True/False once the endpoint has been synced; None while its state is still unknown."""
+    state = get_deployment_state(model_type, endpoint_id)
+    if state is None or state["error"]:
+        return None
+    return bool(state["deployed_models"])
+
+
+def endpoint_tier(model_type, endpoint_id):
+    """The lifecycle tier an endpoint would resume from."""
+    if model_type in endpoints and endpoint_id in endpoints[model_type]:
+        return TIER_WARM
+    if model_type in hibernated and endpoint_id in hibernated[model_type]:
+        return TIER_HIBERNATED
+    state = get_deployment_state(model_type, endpoint_id)
+    if state is not None and not state["error"]:
+        # The endpoint resource exists; it is warm if a model is deployed to it
+        return TIER_WARM if state["deployed_models"] else TIER_HIBERNATED
+    return TIER_DELETED
+
+
+def sweep_idle():
+    """Step idle endpoints down one tier; return [(model_type, endpoint_id, new tier)].
+
+    Warm endpoints idle past their adaptive timeout are hibernated, and
+    hibernated ones idle past HIBERNATED_DELETE_MINUTES are deleted.
+    """
+    changes = []
+    for model_type in list(endpoints):
+        timeout_seconds = calculate_adaptive_timeout(model_type) * 60
+        for endpoint_id in list(endpoints[model_type]):
+            if endpoint_expired(model_type, endpoint_id, timeout_seconds):
+                EndpointPool.hibernate_endpoint(model_type, endpoint_id)
+                changes.append((model_type, endpoint_id, TIER_HIBERNATED))
+    now = clock()
+    for model_type in list(hibernated):
+        for endpoint_id, info in list(hibernated[model_type].items()):
+            if now - info["hibernated_at"] >= HIBERNATED_DELETE_MINUTES * 60:
+                EndpointPool.delete_endpoint(model_type, endpoint_id)
+                changes.append((model_type, endpoint_id, TIER_DELETED))
+    return changes
+
+
+def record_time_to_ready(tier, seconds):
+    time_to_ready[tier].append(round(seconds, 1))
+
+
+def time_to_ready_summary():
+    """{tier: {count, median_seconds, max_seconds}} over recent resumes."""
+    return {
+        tier: {
+            "count": len(samples),
+            "median_seconds": median(samples),
+            "max_seconds": max(samples),
+        }
+        for tier, samples in time_to_ready.items() if samples
+    }
@@ -0,0 +1,55 @@
+import io
+import threading
+
+
+class Frame:
+    """An uploaded image, decoded at most once and shared by everything that reads its pixels.
+
+    Cropping, the near-duplicate hash and the Doppler grading all look at
+    the same frame. The size is read from the header alone; the pixels are
+    decoded on first use, from whichever thread gets there first.
+    """
+
+    def __init__(self, data):
+        self.data = data
+        self.lock = threading.Lock()
+        self._size = None
+        self._rgb = None
+        self._gray = None
+
+    @classmethod
+    def of(cls, image):
+        """A Frame for encoded bytes; a Frame is returned as it is."""
+        return image if isinstance(image, cls) else cls(image)
+
+    @property
+    def size(self):
+        """(width, height), from the header without decoding the pixels."""
+        if self._size is None:
+            # Imported here, off the startup path
+            from PIL import Image
+            with Image.open(io.BytesIO(self.data)) as image:
+                self._size = image.size
+        return self._size
+
+    @property
+    def decoded(self):
+        return self._rgb is not None
+
+    def rgb(self):
+        """The frame as an RGB PIL image; callers must not modify it in place."""
+        with self.lock:
+            if self._rgb is None:
+                from PIL import Image
+                with Image.open(io.BytesIO(self.data)) as image:
+                    self._rgb = image.convert("RGB")
+                self._size = self._rgb.size
+            return self._rgb
+
+    def gray(self):
+        """The frame as a grayscale PIL image."""
+        rgb = self.rgb()
+        with self.lock:
+            if self._gray is None:
+                self._gray = rgb.convert("L")
+            return self._gray
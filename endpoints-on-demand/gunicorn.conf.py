@@ -0,0 +1,24 @@
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8080')}"
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", "300"))
+worker_class = "gthread"
+# Every open SSE stream (/readiness/stream, /sessions/<id>/stream) holds one of these threads
+# while it is open; main.MAX_STREAMS (default a quarter of them) caps how many may, per worker
+threads = int(os.environ.get("GUNICORN_THREADS", "16"))
+
+# Import the app once in the master; workers are forked from it already loaded
+preload_app = True
+
+
+def on_starting(server):
+    # Runs in the master after the app is loaded but before the port is bound,
+    # so Cloud Run's startup probe only passes once the SDK and credentials are ready
+    import main
+    main.warm_up()
+
+
+def post_worker_init(worker):
+    # Background threads do not survive fork; start them in each worker at boot
+    import main
+    main.start_background_tasks()
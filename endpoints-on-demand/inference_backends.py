@@ -0,0 +1,202 @@
+import io
+import os
+import json
+import base64
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+LOCAL_MODEL_PATH = os.environ.get("LOCAL_MODEL_PATH")  # .onnx export, or .npz for a NumPy model
+LOCAL_MODEL_METADATA = os.environ.get("LOCAL_MODEL_METADATA")  # Teachable Machine metadata.json with the labels
+LOCAL_INFERENCE_WORKERS = int(os.environ.get("LOCAL_INFERENCE_WORKERS", "2"))
+LOCAL_PREDICT_TIMEOUT_SECONDS = 30
+
+
+class InferenceBackend:
+    """Where predictions are computed. predict() returns (predictions, details).
+
+    predictions holds one {displayNames, confidences} per instance, in order;
+    details are extra response fields, such as the region that served them.
+    """
+
+    name = None
+
+    def available(self, vein_type):
+        raise NotImplementedError
+
+    def predict(self, vein_type, instances, parameters, endpoint_id=None):
+        raise NotImplementedError
+
+
+class VertexBackend(InferenceBackend):
+    """Online prediction on the vein's Vertex AI endpoints.
+
+    routed_fn(vein_type, instances, parameters) and pinned_fn(vein_type,
+    endpoint_id, instances, parameters) both return (region, response);
+    available_fn(vein_type) says whether any region has the model deployed.
+    """
+
+    name = "vertex"
+
+    def __init__(self, routed_fn, pinned_fn, available_fn):
+        self.routed_fn = routed_fn
+        self.pinned_fn = pinned_fn
+        self.available_fn = available_fn
+
+    def available(self, vein_type):
+        return self.available_fn(vein_type)
+
+    def predict(self, vein_type, instances, parameters, endpoint_id=None):
+        if endpoint_id:
+            region, response = self.pinned_fn(vein_type, endpoint_id, instances, parameters)
+        else:
+            region, response = self.routed_fn(vein_type, instances, parameters)
+        details = {
+            "region": region["location"],
+            "endpointId": region["endpoint_id"],
+            "deployedModelId": response.deployed_model_id,
+        }
+        for attribute, field in (("model", "model"), ("model_display_name", "modelDisplayName"),
+                                 ("model_version_id", "modelVersionId")):
+            if hasattr(response, attribute):
+                details[field] = getattr(response, attribute)
+        return [dict(prediction) for prediction in response.predictions], details
+
+
+class LocalBackend(InferenceBackend):
+    """Runs an exported image model on this machine's CPUs, so there is no deploy to wait for.
+
+    The model is loaded once in each process of a small pool; a request's
+    instances are preprocessed and classified there as one batch, off the
+    request threads and the GIL. Its labels come from the Teachable Machine
+    metadata; a vein's predictions only rank the labels named after it.
+    """
+
+    name = "local"
+
+    def __init__(self, model_path=LOCAL_MODEL_PATH, metadata_path=LOCAL_MODEL_METADATA,
+                 workers=LOCAL_INFERENCE_WORKERS):
+        self.model_path = model_path
+        self.workers = workers
+        self.labels = []
+        self.lock = threading.Lock()
+        self.pool = None
+        if model_path:
+            metadata_path = metadata_path or os.path.join(os.path.dirname(model_path), "metadata.json")
+            with open(metadata_path, "r") as f:
+                self.labels = [label.strip() for label in json.load(f)["labels"]]
+
+    @property
+    def enabled(self):
+        return bool(self.model_path)
+
+    def vein_labels(self, vein_type):
+        """Indices of the labels for a vein, e.g. "Hepatic Vein: Mild" for hepatic."""
+        return [index for index, label in enumerate(self.labels) if label.lower().startswith(vein_type)]
+
+    def available(self, vein_type):
+        return self.enabled and bool(self.vein_labels(vein_type))
+
+    def start(self):
+        """Start the worker processes and load the model in each, ahead of the first request."""
+        with self.lock:
+            if self.pool is None and self.enabled:
+                # Spawned, not forked: the service process already runs threads
+                self.pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=load_worker_model,
+                    initargs=(self.model_path,)
+                )
+                for _ in range(self.workers):
+                    self.pool.submit(worker_ready)
+            return self.pool
+
+    def predict(self, vein_type, instances, parameters, endpoint_id=None):
+        indices = self.vein_labels(vein_type)
+        scores = self.start().submit(classify_batch, [instance["content"] for instance in instances]) \
+            .result(timeout=LOCAL_PREDICT_TIMEOUT_SECONDS)
+        threshold = parameters.get("confidenceThreshold", 0.0)
+        limit = parameters.get("maxPredictions", len(indices))
+        predictions = []
+        for row in scores:
+            # Renormalize over the vein's own labels
+            total = sum(row[index] for index in indices) or 1.0
+            ranked = sorted(((row[index] / total, self.labels[index]) for index in indices), reverse=True)
+            ranked = [(confidence, label) for confidence, label in ranked if confidence >= threshold][:limit]
+            predictions.append({
+                "displayNames": [label for _, label in ranked],
+                "confidences": [round(float(confidence), 6) for confidence, _ in ranked],
+            })
+        return predictions, {"model": os.path.basename(self.model_path)}
+
+
+# Everything below runs in the local backend's worker processes
+
+_worker_model = None
+
+
+class OnnxModel:
+    """An ONNX export of the image model, run with onnxruntime on the CPU."""
+
+    def __init__(self, path):
+        import onnxruntime
+        self.session = onnxruntime.InferenceSession(path, providers=["CPUExecutionProvider"])
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        shape = model_input.shape
+        self.channels_first = shape[1] == 3
+        self.image_size = shape[2] if self.channels_first else shape[1]
+
+    def __call__(self, batch):
+        if self.channels_first:
+            batch = batch.transpose(0, 3, 1, 2)
+        return self.session.run(None, {self.input_name: batch})[0]
+
+
+class NumpyModel:
+    """A dense softmax layer over the flattened image, stored as .npz (weights, bias, image_size).
+
+    Small enough to stand in for the exported model on a laptop or in checks.
+    """
+
+    def __init__(self, path):
+        import numpy as np
+        data = np.load(path)
+        self.weights = data["weights"].astype(np.float32)
+        self.bias = data["bias"].astype(np.float32)
+        self.image_size = int(data["image_size"])
+
+    def __call__(self, batch):
+        import numpy as np
+        logits = batch.reshape(len(batch), -1) @ self.weights + self.bias
+        logits -= logits.max(axis=1, keepdims=True)
+        exp = np.exp(logits)
+        return exp / exp.sum(axis=1, keepdims=True)
+
+
+def load_worker_model(path):
+    global _worker_model
+    _worker_model = OnnxModel(path) if path.endswith(".onnx") else NumpyModel(path)
+
+
+def worker_ready():
+    return _worker_model is not None
+
+
+def preprocess(content, image_size):
+    """Base64 image to the model's input: RGB, image_size square, scaled to [-1, 1] as Teachable Machine trains."""
+    import numpy as np
+    from PIL import Image
+    with Image.open(io.BytesIO(base64.b64decode(content))) as image:
+        image = image.convert("RGB").resize((image_size, image_size), Image.BILINEAR)
+        return np.asarray(image, dtype=np.float32) / 127.5 - 1.0
+
+
+def classify_batch(contents):
+    import numpy as np
+    batch = np.stack([preprocess(content, _worker_model.image_size) for content in contents])
+    return _worker_model(batch).tolist()
@@ -0,0 +1,25 @@
+import sys
+import importlib.util
+
+
+def lazy_import(name):
+    """Return module name, deferring its import until an attribute is first used.
+
+    Parent packages are still imported right away, so name should be the
+    heavy module itself (e.g. google.cloud.aiplatform).
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ImportError(f"No module named {name!r}")
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    # Bind it on the parent package as a regular import would (google.auth, ...)
+    parent, _, child = name.rpartition(".")
+    if parent:
+        setattr(sys.modules[parent], child, module)
+    return module
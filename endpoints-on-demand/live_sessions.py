@@ -0,0 +1,237 @@
+import os
+import json
+import time
+import uuid
+import queue
+import logging
+import threading
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+SESSION_IDLE_SECONDS = int(os.environ.get("SESSION_IDLE_SECONDS", "120"))  # Closed after this long without a frame
+MAX_SESSIONS = int(os.environ.get("MAX_LIVE_SESSIONS", "8"))
+LATENCY_HISTORY = 200  # Recent end-to-end latencies kept per session
+RATE_WINDOW_SECONDS = 10  # Frame rates are measured over this trailing window
+SUBSCRIBER_QUEUE_SIZE = 50
+
+
+class SessionLimitError(Exception):
+    pass
+
+
+class LiveSession:
+    """One scanning session: frames in, classifications out, newest frame first.
+
+    submit() only parks the frame in a single slot; one worker thread
+    classifies whatever is in the slot when it is free. A frame still waiting
+    when a newer one arrives is dropped, so the results never fall behind the
+    probe. Results go to stream() subscribers as SSE events.
+    predict_fn(content) returns (prediction, region).
+    """
+
+    def __init__(self, vein_type, predict_fn, clock=time.time):
+        self.session_id = uuid.uuid4().hex[:12]
+        self.vein_type = vein_type
+        self.predict_fn = predict_fn
+        self.clock = clock
+        self.condition = threading.Condition()
+        self.pending = None  # (sequence, content, received_at)
+        self.closed = False
+        self.sequence = 0
+        self.received = 0
+        self.processed = 0
+        self.superseded = 0
+        self.errors = 0
+        self.busy = False
+        self.created_at = clock()
+        self.last_frame_at = self.created_at
+        self.latencies = deque(maxlen=LATENCY_HISTORY)
+        self.received_times = deque()
+        self.processed_times = deque()
+        self.latest = None
+        self.subscribers = set()
+        thread = threading.Thread(target=self._work, name=f"live-session-{self.session_id}")
+        thread.daemon = True
+        thread.start()
+
+    def submit(self, content):
+        """Queue a frame, replacing any frame still waiting; return its sequence number."""
+        with self.condition:
+            if self.closed:
+                raise ValueError(f"Session {self.session_id} is closed")
+            self.sequence += 1
+            now = self.clock()
+            if self.pending is not None:
+                self.superseded += 1
+            self.pending = (self.sequence, content, now)
+            self.received += 1
+            self.last_frame_at = now
+            self.received_times.append(now)
+            self.condition.notify()
+            return self.sequence
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.pending = None
+            self.condition.notify()
+        self._publish("closed", self.metrics())
+
+    def idle(self, now):
+        return now - self.last_frame_at > SESSION_IDLE_SECONDS
+
+    def _work(self):
+        while True:
+            with self.condition:
+                while self.pending is None and not self.closed:
+                    self.condition.wait()
+                if self.closed:
+                    return
+                sequence, content, received_at = self.pending
+                self.pending = None
+                self.busy = True
+            try:
+                prediction, region = self.predict_fn(content)
+                result = {
+                    "sequence": sequence,
+                    "displayNames": prediction.get("displayNames", []),
+                    "confidences": prediction.get("confidences", []),
+                    "region": region,
+                }
+                error = None
+            except Exception as e:
+                logger.warning(f"Live session {self.session_id} frame {sequence} failed: {str(e)}")
+                result, error = {"sequence": sequence, "error": str(e)}, e
+            now = self.clock()
+            with self.condition:
+                self.busy = False
+                if error is None:
+                    self.processed += 1
+                    self.processed_times.append(now)
+                    self.latencies.append(now - received_at)
+                    result["latencyMs"] = round((now - received_at) * 1000, 1)
+                    self.latest = result
+                else:
+                    self.errors += 1
+            self._publish("error" if error else "result", result)
+
+    def _rate(self, times, now):
+        while times and now - times[0] > RATE_WINDOW_SECONDS:
+            times.popleft()
+        # A session younger than the window is measured over its age
+        window = min(RATE_WINDOW_SECONDS, now - self.created_at)
+        return round(len(times) / window, 2) if window > 0 else 0.0
+
+    def metrics(self):
+        with self.condition:
+            now = self.clock()
+            latencies = sorted(self.latencies)
+            metrics = {
+                "session_id": self.session_id,
+                "vein_type": self.vein_type,
+                "closed": self.closed,
+                "busy": self.busy,
+                "frames_received": self.received,
+                "frames_processed": self.processed,
+                "frames_superseded": self.superseded,
+                "errors": self.errors,
+                "received_fps": self._rate(self.received_times, now),
+                "processed_fps": self._rate(self.processed_times, now),
+                "age_seconds": round(now - self.created_at, 1),
+            }
+            if latencies:
+                metrics.update({
+                    f"latency_p{int(fraction * 100)}_ms":
+                        round(latencies[min(len(latencies) - 1, int(fraction * len(latencies)))] * 1000, 1)
+                    for fraction in (0.5, 0.9)
+                })
+            return metrics
+
+    def _publish(self, event, data):
+        with self.condition:
+            subscribers = list(self.subscribers)
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait((event, data))
+            except queue.Full:
+                # A client that cannot keep up only wants the newest result anyway
+                try:
+                    subscriber.get_nowait()
+                    subscriber.put_nowait((event, data))
+                except (queue.Empty, queue.Full):
+                    pass
+
+    def stream(self, heartbeat_seconds=15):
+        """Yield SSE messages: the latest result, if any, then every result and error as it completes."""
+        subscriber = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        with self.condition:
+            self.subscribers.add(subscriber)
+            latest = self.latest
+        try:
+            if latest:
+                yield format_event("result", latest)
+            while True:
+                try:
+                    event, data = subscriber.get(timeout=heartbeat_seconds)
+                except queue.Empty:
+                    if self.closed:
+                        return
+                    # Comment line keeps proxies from closing an idle connection
+                    yield ": keep-alive\n\n"
+                    continue
+                yield format_event(event, data)
+                if event == "closed":
+                    return
+        finally:
+            with self.condition:
+                self.subscribers.discard(subscriber)
+
+
+class LiveSessionManager:
+    """Open live sessions by id; idle sessions are closed whenever sessions are created or listed."""
+
+    def __init__(self, max_sessions=MAX_SESSIONS, clock=time.time):
+        self.max_sessions = max_sessions
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.sessions = {}
+
+    def create(self, vein_type, predict_fn):
+        self.close_idle()
+        with self.lock:
+            if len(self.sessions) >= self.max_sessions:
+                raise SessionLimitError(f"{self.max_sessions} live sessions are already open")
+            session = LiveSession(vein_type, predict_fn, clock=self.clock)
+            self.sessions[session.session_id] = session
+        logger.info(f"Opened live {vein_type} session {session.session_id}")
+        return session
+
+    def get(self, session_id):
+        with self.lock:
+            return self.sessions.get(session_id)
+
+    def close(self, session_id):
+        with self.lock:
+            session = self.sessions.pop(session_id, None)
+        if session:
+            session.close()
+            logger.info(f"Closed live session {session_id}")
+        return session
+
+    def close_idle(self):
+        now = self.clock()
+        with self.lock:
+            idle = [session_id for session_id, session in self.sessions.items() if session.idle(now)]
+        for session_id in idle:
+            self.close(session_id)
+
+    def list(self):
+        self.close_idle()
+        with self.lock:
+            sessions = list(self.sessions.values())
+        return [session.metrics() for session in sessions]
+
+
+def format_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
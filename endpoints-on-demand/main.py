@@ -2,38 +2,102 @@ import os
 import time
 import json
 import base64
-from flask import Flask, request, jsonify
-from google.cloud import aiplatform
-from google.protobuf import json_format
-from google.protobuf.struct_pb2 import Value
-import google.auth
-import google.auth.transport.requests
+import hashlib
+from flask import Flask, Response, request, jsonify, stream_with_context
 import threading
 import logging
-from collections import defaultdict
-from datetime import datetime
+import mimetypes
+from datetime import datetime, timezone
+from batch_jobs import (
+    SUCCEEDED,
+    BatchJobManager,
+    GCSBatchStore,
+    LocalBatchRunner,
+    LocalBatchStore,
+    VertexBatchRunner,
+)
+from canary import (
+    PRIMARY,
+    ShadowMirror,
+    VersionStats,
+    choose_version,
+    find_candidate,
+    load_candidates,
+    top_label,
+)
+from cine_clips import MAX_CLIP_BYTES, MAX_FRAME_BYTES, ClipFrames, classify_clip
+from deploy_jobs import DeployJobManager, DeployJobStore, VertexDeployRunner
+from doppler import DopplerPreclassifier
+from frames import Frame
+from inference_backends import LocalBackend, VertexBackend
+from lazy_imports import lazy_import
+from live_sessions import LiveSessionManager, SessionLimitError
+from near_duplicates import NearDuplicateCache, load_max_distances
+from result_rollups import INTERVALS, ResultRollups, histogram_bounds
+from result_store import RESULT_UPLOAD_URI, ResultStore, result_records, uploader_for
+from roi_crop import ROICropper
+from structured_logging import LogPipeline
+import endpoint_pool
+from endpoint_pool import (
+    HIBERNATED_DELETE_MINUTES,
+    TIER_HIBERNATED,
+    EndpointPool,
+    endpoints,
+    hibernated,
+    calculate_adaptive_timeout,
+    deployment_ready,
+    endpoint_expired,
+    deployment_state,
+    endpoint_tier,
+    get_deployment_state,
+    reaper,
+    record_time_to_ready,
+    record_usage,
+    sweep_idle,
+    time_to_ready_summary,
+)
+from readiness import ReadinessTracker
+from region_router import RegionRouter, load_regions
+from reconciler import EndpointReconciler
+
+# The Google SDKs take seconds to import; they load on first use, or during
+# warm_up() in the gunicorn master (see gunicorn.conf.py), not on import
+aiplatform = lazy_import("google.cloud.aiplatform")
+google_auth = lazy_import("google.auth")
+google_auth_requests = lazy_import("google.auth.transport.requests")
 
 app = Flask(__name__)
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
+# Configure logging: JSON records written by a background thread, never on the request thread
+log_pipeline = LogPipeline().start()
 logger = logging.getLogger(__name__)
 
 # Global variables
 PROJECT_ID = os.environ.get("PROJECT_ID", "plucky-weaver-450819-k7")
 LOCATION = os.environ.get("LOCATION", "us-central1")
-DEFAULT_TIMEOUT_MINUTES = int(os.environ.get("TIMEOUT_MINUTES", "15"))  # Default time before endpoint deletion
-MIN_TIMEOUT_MINUTES = 5  # Minimum timeout for rarely used endpoints
-MAX_TIMEOUT_MINUTES = 20  # Maximum timeout for frequently used endpoints
-MAX_ENDPOINTS_PER_TYPE = 2  # Maximum number of endpoints to maintain per model type
 
-# Dictionary to store endpoint data with creation timestamp
-# Structure: {model_type: {endpoint_id: {endpoint_obj, created_at, in_use}}}
-endpoints = {}
+# When set, every /predict and /ping request is appended to this JSONL file as
+# {"ts", "vein_type", "route"} so it can be replayed by simulator.py
+TRACE_CAPTURE_PATH = os.environ.get("TRACE_CAPTURE_PATH")
+trace_lock = threading.Lock()
+
+# Batch prediction: "vertex" runs Vertex AI batch jobs over Cloud Storage,
+# "local" uses a filesystem stand-in that predicts through the online endpoints
+BATCH_BACKEND = os.environ.get("BATCH_BACKEND", "vertex")
+BATCH_BUCKET = os.environ.get("BATCH_BUCKET", "vexus_images")
+BATCH_LOCAL_DIR = os.environ.get("BATCH_LOCAL_DIR", "/tmp/vexus-batch")
+batch_manager = None
+batch_manager_lock = threading.Lock()
 
-# Track usage patterns for adaptive timeouts
-usage_history = defaultdict(list)  # {model_type: [timestamp1, timestamp2, ...]}
-usage_window = 24 * 60 * 60  # 24 hours window for usage analysis
+# Deploy jobs are persisted here so a restarted worker can report and resume them
+DEPLOY_JOBS_DIR = os.environ.get("DEPLOY_JOBS_DIR", "/tmp/vexus-deploy-jobs")
+# How often idle endpoints are stepped down a lifecycle tier (warm -> hibernated -> deleted).
+# Each worker only sees its own traffic, so it could hibernate an endpoint another
+# instance is busy with; the sweep is opt-in, for deployments served by one instance
+LIFECYCLE_SWEEP = os.environ.get("LIFECYCLE_SWEEP", "false").lower() == "true"
+LIFECYCLE_SWEEP_SECONDS = int(os.environ.get("LIFECYCLE_SWEEP_SECONDS", "60"))
+# How many models the project's serving quota allows to be deployed (or deploying) at once
+MAX_DEPLOYED_MODELS = int(os.environ.get("MAX_DEPLOYED_MODELS", "3"))
 
 # Model and endpoint information
 MODELS = {
@@ -54,102 +118,200 @@ MODELS = {
     }
 }
 
-class EndpointPool:
-    """Manages a pool of endpoints for more efficient resource usage."""
-    
-    @staticmethod
-    def get_available_endpoint(model_type):
-        """Get an available endpoint for the specified model type."""
-        if model_type not in endpoints:
-            endpoints[model_type] = {}
-            return None
-        
-        # Look for an existing endpoint that's not in use
-        available_endpoints = [
-            endpoint_id for endpoint_id, info in endpoints[model_type].items()
-            if not info.get('in_use', False)
-        ]
-        
-        if available_endpoints:
-            # Get the most recently used endpoint
-            endpoint_id = max(
-                available_endpoints,
-                key=lambda eid: endpoints[model_type][eid]['created_at']
-            )
-            
-            # Mark as in use
-            endpoints[model_type][endpoint_id]['in_use'] = True
-            return endpoint_id
-        
-        return None
-    
-    @staticmethod
-    def release_endpoint(model_type, endpoint_id):
-        """Release an endpoint back to the pool."""
-        if model_type in endpoints and endpoint_id in endpoints[model_type]:
-            # Update timestamp and mark as not in use
-            endpoints[model_type][endpoint_id]['created_at'] = time.time()
-            endpoints[model_type][endpoint_id]['in_use'] = False
-            logger.info(f"Released endpoint {endpoint_id} back to the pool")
-    
-    @staticmethod
-    def add_endpoint(model_type, endpoint_id, endpoint_obj):
-        """Add a new endpoint to the pool."""
-        if model_type not in endpoints:
-            endpoints[model_type] = {}
-        
-        endpoints[model_type][endpoint_id] = {
-            "endpoint_obj": endpoint_obj,
-            "created_at": time.time(),
-            "in_use": True
+# Candidate model versions per vein for canary routing and shadow evaluation,
+# from the MODEL_CANDIDATES environment variable (see canary.py)
+load_candidates(MODELS)
+
+def candidate_endpoint_ids(vein_type):
+    return {candidate['endpoint_id'] for candidate in MODELS[vein_type]['candidates']}
+
+# Endpoints of each vein in other regions, from the MODEL_REGIONS environment
+# variable; requests go to the best healthy region (see region_router.py)
+load_regions(MODELS, LOCATION)
+ENDPOINT_LOCATIONS = {
+    region['endpoint_id']: region['location'] for info in MODELS.values() for region in info['regions']
+}
+region_router = RegionRouter()
+# Longest one region may take to answer a prediction; a slow or hung region then counts as an
+# error and the request fails over, instead of waiting for gunicorn's timeout
+REGION_PREDICT_TIMEOUT_SECONDS = float(os.environ.get("REGION_PREDICT_TIMEOUT_SECONDS", "30"))
+
+# Every regional and candidate endpoint of a vein may be warm at once; the pool
+# must not evict one of them to make room for another
+endpoint_pool.MAX_ENDPOINTS_PER_TYPE = max(
+    endpoint_pool.MAX_ENDPOINTS_PER_TYPE,
+    max(len(info['regions']) + len(info['candidates']) for info in MODELS.values())
+)
+
+def endpoint_location(endpoint_id):
+    """The region an endpoint lives in; endpoints not configured per region are in LOCATION."""
+    return ENDPOINT_LOCATIONS.get(endpoint_id, LOCATION)
+
+def regional_endpoint(endpoint_id, credentials=None):
+    """An aiplatform.Endpoint handle in the endpoint's own region."""
+    location = endpoint_location(endpoint_id)
+    return aiplatform.Endpoint(
+        endpoint_name=f"projects/{PROJECT_ID}/locations/{location}/endpoints/{endpoint_id}",
+        location=location,
+        credentials=credentials
+    )
+
+def deploy_endpoint_id(vein_type):
+    """Endpoint a vein's model is deployed to on demand: its first healthy region."""
+    return region_router.deploy_region(MODELS, vein_type)['endpoint_id']
+
+def serving_endpoint_id(vein_type):
+    """The first region with the vein's model deployed, else the one it would be deployed to."""
+    for region in MODELS[vein_type]['regions']:
+        if deployment_ready(vein_type, region['endpoint_id']):
+            return region['endpoint_id']
+    return deploy_endpoint_id(vein_type)
+
+def fetch_endpoint_state(endpoint_id):
+    """Fetch an endpoint and its deployed models from Vertex AI. Only the reconciler calls this."""
+    aiplatform.init(project=PROJECT_ID, location=LOCATION)
+    endpoint = regional_endpoint(endpoint_id)
+    endpoint_info = endpoint.gca_resource
+    deployed_models = [
+        {
+            'id': model.id,
+            'model': model.model,
+            'display_name': model.display_name
         }
-        
-        # Check if we have too many endpoints of this type
-        if len(endpoints[model_type]) > MAX_ENDPOINTS_PER_TYPE:
-            # Find the oldest endpoint
-            oldest_endpoint_id = min(
-                endpoints[model_type].keys(),
-                key=lambda eid: endpoints[model_type][eid]['created_at']
-            )
-            
-            # If it's not the one we just added and not in use, delete it
-            if oldest_endpoint_id != endpoint_id and not endpoints[model_type][oldest_endpoint_id]['in_use']:
-                logger.info(f"Pool maintenance: removing oldest endpoint {oldest_endpoint_id}")
-                EndpointPool.delete_endpoint(model_type, oldest_endpoint_id)
-    
-    @staticmethod
-    def delete_endpoint(model_type, endpoint_id):
-        """Delete an endpoint from the pool."""
-        if model_type in endpoints and endpoint_id in endpoints[model_type]:
-            try:
-                endpoint_obj = endpoints[model_type][endpoint_id]['endpoint_obj']
-                endpoint_obj.undeploy_all()
-                endpoint_obj.delete()
-                logger.info(f"Deleted endpoint {endpoint_id} from pool")
-            except Exception as e:
-                logger.error(f"Error deleting endpoint {endpoint_id}: {str(e)}")
-            
-            # Remove from tracking regardless of success
-            del endpoints[model_type][endpoint_id]
-
-def calculate_adaptive_timeout(model_type):
-    """Calculate timeout based on usage patterns."""
-    now = time.time()
-    # Remove timestamps older than the window
-    usage_history[model_type] = [ts for ts in usage_history[model_type] if now - ts < usage_window]
-    
-    # Count usages in the past window
-    usage_count = len(usage_history[model_type])
-    
-    if usage_count < 5:
-        # Rarely used - shorter timeout to save costs
-        return MIN_TIMEOUT_MINUTES
-    elif usage_count > 20:
-        # Frequently used - longer timeout to reduce cold starts
-        return MAX_TIMEOUT_MINUTES
-    else:
-        # Moderate usage - use default timeout
-        return DEFAULT_TIMEOUT_MINUTES
+        for model in endpoint_info.deployed_models
+    ]
+    return endpoint, endpoint_info.display_name, deployed_models
+
+# Per-vein cold/deploying/warm/draining state, streamed to clients over SSE
+readiness = ReadinessTracker(MODELS.keys())
+
+# Each open SSE stream holds one of the worker's gthread threads for as long as it is open;
+# past MAX_STREAMS per worker new streams get a 503, so streams never take the threads /predict needs
+MAX_STREAMS = int(os.environ.get("MAX_STREAMS", str(max(1, int(os.environ.get("GUNICORN_THREADS", "16")) // 4))))
+stream_slots = threading.BoundedSemaphore(MAX_STREAMS)
+
+def event_stream(events):
+    """An SSE response for a generator of messages, holding a stream slot until the client goes away; 503 if none is free."""
+    if not stream_slots.acquire(blocking=False):
+        response = jsonify({
+            'error': 'Too many open streams',
+            'message': f'{MAX_STREAMS} streams are already open on this worker; retry shortly or poll instead',
+            'timestamp': datetime.now().isoformat()
+        })
+        response.status_code = 503
+        response.headers['Retry-After'] = '5'
+        return response
+    response = Response(
+        stream_with_context(events),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+    # Called when the response is closed, even if the stream was never started
+    response.call_on_close(stream_slots.release)
+    return response
+
+def update_readiness(model_type, endpoint_id):
+    """Feed the reconciler's latest view of a vein's endpoints into its readiness state."""
+    if model_type not in MODELS:
+        return
+    # Candidate versions have their own endpoints and do not make the vein ready;
+    # a model deployed in any region does
+    candidates = candidate_endpoint_ids(model_type)
+    synced = [
+        state for endpoint_id, state in deployment_state.get(model_type, {}).items()
+        if endpoint_id not in candidates
+    ]
+    readiness.observe(model_type, any(state['deployed_models'] for state in synced if not state['error']))
+
+# Keeps endpoint_pool.deployment_state current in the background
+reconciler = EndpointReconciler(
+    fetch_endpoint_state,
+    lambda: [
+        (model_type, endpoint_id)
+        for model_type, info in MODELS.items()
+        for endpoint_id in [region['endpoint_id'] for region in info['regions']]
+        + sorted(candidate_endpoint_ids(model_type))
+    ],
+    on_sync=update_readiness
+)
+def endpoint_reaped(model_type, endpoint_id, succeeded):
+    """Reaper callback: resync so readiness sees the endpoint go (or stay, if reaping failed)."""
+    reconciler.trigger()
+
+reaper.on_done = endpoint_reaped
+
+def deploy_finished(job):
+    """Deploy job callback: resync endpoint state, settle readiness and record time-to-ready."""
+    reconciler.trigger()
+    if job['state'] != SUCCEEDED:
+        if job['endpoint_id'] not in candidate_endpoint_ids(job['vein_type']):
+            readiness.deploy_failed(job['vein_type'])
+        if job['error'] and job['error'].startswith('Quota exceeded'):
+            # Deploy the next /ping or /warm to another region instead
+            region_router.mark_unhealthy(job['vein_type'], endpoint_location(job['endpoint_id']), job['error'])
+        return
+    if not job.get('already_deployed'):
+        # A job that found the model already served took no time to deploy and is no resume sample
+        record_time_to_ready(job['resumed_from'], job['finished_at'] - job['started_at'])
+    # Track the endpoint in the pool so the lifecycle sweep can hibernate it once idle
+    vein_type, endpoint_id = job['vein_type'], job['endpoint_id']
+    if vein_type not in endpoints or endpoint_id not in endpoints[vein_type]:
+        aiplatform.init(project=PROJECT_ID, location=LOCATION)
+        EndpointPool.add_endpoint(vein_type, endpoint_id, regional_endpoint(endpoint_id))
+        EndpointPool.release_endpoint(vein_type, endpoint_id)
+
+deploy_manager = DeployJobManager(
+    DeployJobStore(DEPLOY_JOBS_DIR),
+    VertexDeployRunner(PROJECT_ID, LOCATION, location_fn=endpoint_location, credentials_fn=lambda: get_credentials()),
+    on_finish=deploy_finished,
+    blocked_fn=reaper.pending
+)
+
+def run_lifecycle_sweep():
+    """Close idle live sessions and, with LIFECYCLE_SWEEP, hibernate idle warm endpoints and delete long-hibernated ones."""
+    while True:
+        time.sleep(LIFECYCLE_SWEEP_SECONDS)
+        try:
+            for model_type, endpoint_id, tier in (sweep_idle() if LIFECYCLE_SWEEP else []):
+                logger.info("Idle endpoint %s for %s moved to tier %s", endpoint_id, model_type, tier)
+                if model_type in MODELS and tier == TIER_HIBERNATED:
+                    readiness.draining(model_type)
+            live_sessions.close_idle()
+        except Exception as e:
+            logger.error("Lifecycle sweep failed: %s", e)
+background_started = False
+background_lock = threading.Lock()
+
+@app.before_request
+def start_background_tasks():
+    # Runs inside each gunicorn worker: from its post_worker_init hook, or else on the first request
+    global background_started
+    if background_started:
+        return
+    with background_lock:
+        if background_started:
+            return
+        background_started = True
+    load_sdk()
+    try:
+        result_store.uploader = uploader_for(RESULT_UPLOAD_URI, project=PROJECT_ID)
+    except Exception as e:
+        logger.error("Result segments will not be uploaded: %s", e)
+    result_store.start()
+    thread = threading.Thread(target=result_rollups.rebuild, args=(result_store,), name="rollup-rebuild")
+    thread.daemon = True
+    thread.start()
+    # Load the local model in this worker's process pool now, not on the first request
+    local_backend.start()
+    reconciler.start()
+    for job in deploy_manager.resume():
+        readiness.deploy_started(job['vein_type'])
+    thread = threading.Thread(target=resume_batch_jobs, name="batch-resume")
+    thread.daemon = True
+    thread.start()
+    thread = threading.Thread(target=run_lifecycle_sweep, name="lifecycle-sweep")
+    thread.daemon = True
+    thread.start()
 
 def authenticate():
     """Authenticate with Google Cloud."""
@@ -157,21 +319,21 @@ def authenticate():
         # Primary path - look for the mounted secret file at the exact Cloud Run mount path
         secret_path = '/secrets/KEY/KEY'
         if os.path.exists(secret_path):
-            logger.info(f"Found secret at {secret_path}")
+            logger.info("Found secret at %s", secret_path)
             try:
                 with open(secret_path, 'r') as f:
                     credentials_info = json.load(f)
                 
                 from google.oauth2 import service_account
                 credentials = service_account.Credentials.from_service_account_info(credentials_info)
-                auth_req = google.auth.transport.requests.Request()
+                auth_req = google_auth_requests.Request()
                 credentials.refresh(auth_req)
-                logger.info(f"Successfully loaded credentials from {secret_path}")
+                logger.info("Successfully loaded credentials from %s", secret_path)
                 return credentials
             except Exception as e:
-                logger.warning(f"Failed to load credentials from {secret_path}: {e}")
+                logger.warning("Failed to load credentials from %s: %s", secret_path, e)
         else:
-            logger.warning(f"Secret file not found at {secret_path}")
+            logger.warning("Secret file not found at %s", secret_path)
         
         # Fallback to environment variable if file not found
         if 'KEY' in os.environ:
@@ -180,27 +342,60 @@ def authenticate():
                 credentials_info = json.loads(os.environ['KEY'])
                 from google.oauth2 import service_account
                 credentials = service_account.Credentials.from_service_account_info(credentials_info)
-                auth_req = google.auth.transport.requests.Request()
+                auth_req = google_auth_requests.Request()
                 credentials.refresh(auth_req)
                 logger.info("Successfully authenticated using KEY environment variable")
                 return credentials
             except Exception as e:
-                logger.warning(f"Failed to use KEY environment variable: {e}")
+                logger.warning("Failed to use KEY environment variable: %s", e)
         
         # Fall back to default credentials as last resort
         logger.warning("No valid secret file or environment variable found, falling back to default credentials")
-        credentials, project = google.auth.default()
-        auth_req = google.auth.transport.requests.Request()
+        credentials, project = google_auth.default()
+        auth_req = google_auth_requests.Request()
         credentials.refresh(auth_req)
         return credentials
     except Exception as e:
-        logger.error(f"Authentication error: {str(e)}")
+        logger.error("Authentication error: %s", e)
         # Still try default credentials as last resort
-        credentials, project = google.auth.default()
-        auth_req = google.auth.transport.requests.Request()
+        credentials, project = google_auth.default()
+        auth_req = google_auth_requests.Request()
         credentials.refresh(auth_req)
         return credentials
 
+credentials_cache = None
+credentials_lock = threading.Lock()
+
+def get_credentials():
+    """Return cached credentials, authenticating again only once they have expired."""
+    global credentials_cache
+    with credentials_lock:
+        if credentials_cache is None or not credentials_cache.valid:
+            credentials_cache = authenticate()
+        return credentials_cache
+
+def load_sdk():
+    """Finish the deferred SDK imports now. Lazy modules must be loaded before
+    several threads can touch them at once."""
+    return aiplatform.Endpoint, google_auth.default, google_auth_requests.Request
+
+def warm_up():
+    """Load the Vertex AI SDK, authenticate and initialize it ahead of the first request.
+
+    Called from gunicorn's on_starting hook, in the master before it binds its
+    port, so forked workers inherit a loaded SDK and credentials.
+    """
+    start = time.perf_counter()
+    load_sdk()
+    logger.info("Vertex AI SDK loaded in %.2fs", time.perf_counter() - start)
+    try:
+        credentials = get_credentials()
+        aiplatform.init(project=PROJECT_ID, location=LOCATION, credentials=credentials)
+        logger.info("Warm-up finished in %.2fs", time.perf_counter() - start)
+    except Exception as e:
+        # Requests still authenticate on demand; a failed warm-up only costs the first one
+        logger.error("Warm-up failed after %.2fs: %s", time.perf_counter() - start, e)
+
 def check_quota_availability():
     """Check if we're approaching quota limits and take preemptive action."""
     try:
@@ -219,13 +414,13 @@ def check_quota_availability():
         ENDPOINT_QUOTA_THRESHOLD = 8  # If we have 8 or more endpoints, we might be approaching limits
         
         if endpoint_count >= ENDPOINT_QUOTA_THRESHOLD:
-            logger.warning(f"Approaching endpoint quota limit. Current count: {endpoint_count}")
+            logger.warning("Approaching endpoint quota limit. Current count: %s", endpoint_count)
             
             # Find and clean up oldest endpoints managed by this service
             if endpoints:
                 # Get the oldest managed endpoint
                 oldest_model_type = min(endpoints.items(), key=lambda x: x[1]['created_at'])[0]
-                logger.info(f"Preemptively cleaning up oldest endpoint: {oldest_model_type}")
+                logger.info("Preemptively cleaning up oldest endpoint: %s", oldest_model_type)
                 delete_endpoint(oldest_model_type)
                 return True
             
@@ -239,124 +434,245 @@ def check_quota_availability():
             if old_temp_endpoints:
                 # Delete the oldest temporary endpoint
                 oldest = old_temp_endpoints[0]
-                logger.info(f"Preemptively cleaning up old temporary endpoint: {oldest.display_name}")
+                logger.info("Preemptively cleaning up old temporary endpoint: %s", oldest.display_name)
                 oldest.delete()
                 return True
         
         return False
     except Exception as e:
-        logger.error(f"Error checking quota availability: {str(e)}")
+        logger.error("Error checking quota availability: %s", e)
         return False
 
-def create_endpoint(model_type):
-    """Create and deploy a new endpoint for the specified model type."""
-    logger.info(f"Creating endpoint for {model_type}")
+def create_endpoint(model_type, endpoint_id=None, version=None):
+    """Start deploying the model for a type without waiting for the deploy.
+
+    With version, the named candidate model is deployed to its own endpoint
+    instead. Returns the deploy job (see deploy_jobs.py), or None if the
+    endpoint already has a deployed model. Concurrent calls share one job.
+    """
+    logger.info("Creating endpoint for %s", model_type)
     
     if model_type not in MODELS:
         raise ValueError(f"Unknown model type: {model_type}")
     
-    try:
-        # Initialize Vertex AI
-        aiplatform.init(project=PROJECT_ID, location=LOCATION)
-        
-        model_info = MODELS[model_type]
-        model_id = model_info["model_id"]
-        endpoint_id = model_info["endpoint_id"]  # Use the fixed endpoint ID
-        endpoint_name = model_info["endpoint_name"]
-        
-        # Try to get the existing endpoint first
-        try:
-            endpoint = aiplatform.Endpoint(
-                endpoint_name=f"projects/{PROJECT_ID}/locations/{LOCATION}/endpoints/{endpoint_id}"
-            )
-            logger.info(f"Found existing endpoint {endpoint_id} for {model_type}")
-            
-            # Check if the endpoint has deployed models
-            if hasattr(endpoint.gca_resource, 'deployed_models') and endpoint.gca_resource.deployed_models:
-                logger.info(f"Endpoint {endpoint_id} already has deployed models")
-                return endpoint_id
-            
-            logger.info(f"Endpoint {endpoint_id} exists but has no deployed models. Deploying model...")
-        except Exception as e:
-            logger.info(f"Endpoint {endpoint_id} not found, creating it...")
-            endpoint = aiplatform.Endpoint.create(
-                display_name=endpoint_name,
-                endpoint_id=endpoint_id
-            )
-        
-        # Get the model
-        model = aiplatform.Model(model_name=f"projects/{PROJECT_ID}/locations/{LOCATION}/models/{model_id}")
-        
-        # Deploy the model to the endpoint
-        try:
-            model.deploy(
-                endpoint=endpoint,
-                machine_type="n1-standard-2",
-                min_replica_count=1,
-                max_replica_count=1
-            )
-            logger.info(f"Successfully deployed model to endpoint {endpoint_id}")
-        except Exception as deploy_error:
-            logger.error(f"Error deploying model to endpoint: {str(deploy_error)}")
-            
-            # Check for quota error
-            error_msg = str(deploy_error).lower()
-            if "quota" in error_msg or "exceeded" in error_msg or "limit" in error_msg:
-                raise ValueError(f"Quota exceeded: {str(deploy_error)}. Please request a quota increase or clean up unused endpoints.")
-            
-            raise deploy_error
-        
-        # Add to the endpoint pool
-        EndpointPool.add_endpoint(model_type, endpoint_id, endpoint)
-        
-        return endpoint_id
-    except Exception as e:
-        logger.error(f"Error creating endpoint for {model_type}: {str(e)}")
-        raise
+    model_info = MODELS[model_type]
+    model_id = model_info["model_id"]
+    display_name = model_info["endpoint_name"]
+    if version:
+        candidate = find_candidate(MODELS, model_type, version)
+        if candidate is None:
+            raise ValueError(f"Unknown {model_type} model version: {version}")
+        endpoint_id = candidate["endpoint_id"]
+        model_id = candidate["model_id"]
+        display_name = f"{display_name} ({version})"
+    endpoint_id = endpoint_id or deploy_endpoint_id(model_type)
+    if not version:
+        # Model IDs are regional: deploy the copy of the model in the endpoint's own region
+        model_id = next(
+            (region['model_id'] for region in model_info['regions'] if region['endpoint_id'] == endpoint_id),
+            model_id
+        )
+    
+    if deployment_ready(model_type, endpoint_id):
+        logger.info("Endpoint %s already has deployed models", endpoint_id)
+        return None
+    
+    # A hibernated endpoint resumes on the fast path: deploy only, no endpoint to create
+    tier = endpoint_tier(model_type, endpoint_id)
+    resume_from = tier if tier == TIER_HIBERNATED else None
+    EndpointPool.resume_endpoint(model_type, endpoint_id)
+    job = deploy_manager.submit(model_type, endpoint_id, model_id, display_name, resume_from=resume_from)
+    if endpoint_id not in candidate_endpoint_ids(model_type):
+        readiness.deploy_started(model_type)
+    return job
 
 def schedule_cleanup(model_type, endpoint_id):
-    """Schedule cleanup of an endpoint after the timeout period."""
+    """Hibernate an endpoint once it has been idle for its adaptive timeout."""
     # Calculate adaptive timeout based on usage patterns
     timeout_minutes = calculate_adaptive_timeout(model_type)
     timeout_seconds = timeout_minutes * 60
     
-    logger.info(f"Scheduling cleanup for {model_type} in {timeout_minutes} minutes")
+    logger.info("Scheduling cleanup for %s in %s minutes", model_type, timeout_minutes)
     
     time.sleep(timeout_seconds)
     
     # Check if endpoint still exists and hasn't been used recently
-    if model_type in endpoints and endpoint_id in endpoints[model_type]:
-        current_time = time.time()
-        created_at = endpoints[model_type][endpoint_id]['created_at']
-        
-        if current_time - created_at >= timeout_seconds:
-            delete_endpoint(model_type, endpoint_id)
+    if endpoint_expired(model_type, endpoint_id, timeout_seconds):
+        readiness.draining(model_type)
+        EndpointPool.hibernate_endpoint(model_type, endpoint_id)
 
 def delete_endpoint(model_type, endpoint_id):
     """Delete an endpoint."""
     if model_type not in endpoints or endpoint_id not in endpoints[model_type]:
-        logger.info(f"No endpoint to delete for {model_type}")
+        logger.info("No endpoint to delete for %s", model_type)
         return
     
-    logger.info(f"Deleting endpoint for {model_type}")
+    logger.info("Deleting endpoint for %s", model_type)
+    readiness.draining(model_type)
     
+    # The reaper undeploys and deletes in the background
+    EndpointPool.delete_endpoint(model_type, endpoint_id)
+
+def capture_trace(vein_type, route):
+    """Append a request record to the trace capture file when capture mode is on."""
+    if not TRACE_CAPTURE_PATH:
+        return
+    record = json.dumps({'ts': time.time(), 'vein_type': vein_type, 'route': route})
     try:
-        endpoint_obj = endpoints[model_type][endpoint_id]['endpoint_obj']
-        endpoint_obj.undeploy_all()
-        endpoint_obj.delete()
+        with trace_lock:
+            with open(TRACE_CAPTURE_PATH, 'a') as f:
+                f.write(record + '\n')
+    except OSError as e:
+        logger.warning("Failed to write trace record: %s", e)
+
+def candidate_ready(vein_type, candidate):
+    """True if a candidate version's endpoint is known to have a model deployed."""
+    return bool(deployment_ready(vein_type, candidate['endpoint_id'])) and not reaper.pending(candidate['endpoint_id'])
+
+def predict_candidate(candidate, instances, parameters):
+    """Shadow prediction on a candidate's endpoint; runs on the shadow pool only."""
+    aiplatform.init(project=PROJECT_ID, location=LOCATION, credentials=get_credentials())
+    endpoint = regional_endpoint(candidate['endpoint_id'])
+    response = endpoint.predict(instances=instances, parameters=parameters)
+    return [dict(prediction) for prediction in response.predictions]
+
+# Results for near-identical frames (re-captures, re-encoded screenshots), by perceptual hash
+frame_cache = NearDuplicateCache(load_max_distances(MODELS.keys()))
+
+# VExUS grades read from the Doppler waveform itself, tracked against the model and
+# trusted to answer alone only in DOPPLER_PRECLASSIFY=answer mode
+preclassifier = DopplerPreclassifier()
+
+# Frames cropped to the ultrasound image before they are sent to a model; the box is cached per frame size
+cropper = ROICropper()
+
+# Every prediction served, batched into local SQLite segments that are shipped to RESULT_UPLOAD_URI when full
+result_store = ResultStore()
+
+# Counts and histograms per hour, vein, label and backend, added to as each batch of results is written
+# and rebuilt at startup from the segments this instance has not counted, including uploaded ones
+result_rollups = ResultRollups(result_store.root)
+result_store.add_listener(result_rollups.add)
+result_store.add_segment_listener(result_rollups.segment_opened)
+
+# Latency and label agreement per model version, and the shadow traffic mirror
+version_stats = VersionStats()
+shadow = ShadowMirror(version_stats, predict_candidate, ready_fn=candidate_ready)
+
+def region_available(vein_type, region):
+    """True if a region may serve the vein: a model is deployed there and it is not being removed.
+
+    The vein's first region is also tried before the reconciler has synced it.
+    """
+    endpoint_id = region['endpoint_id']
+    if reaper.pending(endpoint_id):
+        return False
+    ready = deployment_ready(vein_type, endpoint_id)
+    return ready or (ready is None and endpoint_id == MODELS[vein_type]['endpoint_id'])
+
+def pooled_endpoint(vein_type, endpoint_id):
+    """Get or create the endpoint using EndpointPool, marking it in use."""
+    if vein_type not in endpoints or endpoint_id not in endpoints[vein_type]:
+        # Initialize the endpoint pool for this type if needed
+        if vein_type not in endpoints:
+            endpoints[vein_type] = {}
         
-        logger.info(f"Endpoint {endpoint_id} for {model_type} deleted")
+        # Reuse the reconciler's endpoint object; only look it up if it has not synced yet
+        state = get_deployment_state(vein_type, endpoint_id)
+        if state and state['endpoint_obj'] is not None:
+            endpoint = state['endpoint_obj']
+        else:
+            endpoint = regional_endpoint(endpoint_id, credentials=get_credentials())
+            reconciler.trigger()
         
-        # Remove from tracking
-        del endpoints[model_type][endpoint_id]
-    except Exception as e:
-        logger.error(f"Error deleting endpoint for {model_type}: {str(e)}")
+        # Add to pool
+        EndpointPool.add_endpoint(vein_type, endpoint_id, endpoint)
+        return endpoint
+    # Get existing endpoint from pool
+    return endpoints[vein_type][endpoint_id]['endpoint_obj']
+
+def predict_in_region(vein_type, region, instances, parameters):
+    """Predict on one region's endpoint, holding it in the pool for the call."""
+    endpoint = pooled_endpoint(vein_type, region['endpoint_id'])
+    try:
+        return endpoint.predict(instances=instances, parameters=parameters, timeout=REGION_PREDICT_TIMEOUT_SECONDS)
+    finally:
+        # Release endpoint back to pool
+        EndpointPool.release_endpoint(vein_type, region['endpoint_id'])
+
+def predict_routed(vein_type, instances, parameters):
+    """Predict on the vein's best available region, failing over to the next; returns (region, response)."""
+    return region_router.call(
+        MODELS, vein_type,
+        lambda region: predict_in_region(vein_type, region, instances, parameters),
+        available_fn=lambda region: region_available(vein_type, region)
+    )
+
+def session_predictor(vein_type, parameters):
+    """Predict function for a live session: it keeps one region until a frame fails there."""
+    session_region = {}
+    
+    def predict(content):
+        instances = [{'content': content}]
+        region = session_region.get('region')
+        if region is not None:
+            start = time.perf_counter()
+            try:
+                response = predict_in_region(vein_type, region, instances, parameters)
+                region_router.record(vein_type, region['location'], time.perf_counter() - start)
+                return dict(response.predictions[0]), region['location']
+            except Exception as e:
+                region_router.record(vein_type, region['location'], error=e)
+                session_region.pop('region', None)
+        region, response = predict_routed(vein_type, instances, parameters)
+        session_region['region'] = region
+        return dict(response.predictions[0]), region['location']
+    return predict
+
+# Live scanning sessions: the newest frame is classified, older waiting ones are dropped
+live_sessions = LiveSessionManager()
+
+def predict_pinned(vein_type, endpoint_id, instances, parameters):
+    """Predict on one given endpoint, without failover; returns (region, response)."""
+    region = {'location': endpoint_location(endpoint_id), 'endpoint_id': endpoint_id}
+    return region, predict_in_region(vein_type, region, instances, parameters)
+
+# "vertex" serves from Vertex AI and uses the local CPU model only for low-priority requests,
+# while no endpoint is ready or when the Vertex AI call fails; "local" serves everything locally
+INFERENCE_BACKEND = os.environ.get("INFERENCE_BACKEND", "vertex")
+vertex_backend = VertexBackend(
+    predict_routed,
+    predict_pinned,
+    lambda vein_type: any(region_available(vein_type, region) for region in MODELS[vein_type]['regions'])
+)
+local_backend = LocalBackend()
+# Side-by-side latency and errors per vein and backend
+backend_stats = VersionStats()
+
+def select_backend(vein_type, metadata, vertex_ready, pinned):
+    """The backend for a request, or None if none can serve it.
+
+    A request pinned to an endpoint always goes to Vertex AI.
+    """
+    if not pinned and local_backend.available(vein_type):
+        if INFERENCE_BACKEND == 'local' or metadata.get('priority') == 'low' or not vertex_ready:
+            return local_backend
+    return vertex_backend if vertex_ready else None
+
+def instance_shape(instance):
+    """An instance's keys and approximate size, for logs; the instance itself may hold a whole image."""
+    if not isinstance(instance, dict):
+        return {'instance_type': type(instance).__name__}
+    return {
+        'keys': sorted(map(str, instance))[:20],
+        'bytes': sum(len(value) if isinstance(value, (str, bytes)) else 0 for value in instance.values()),
+    }
 
 def get_prediction(endpoint_id, instances):
     """Get prediction from an endpoint."""
-    logger.info(f"Getting prediction from endpoint {endpoint_id}")
+    logger.info("Getting prediction from endpoint %s", endpoint_id, extra={'sample': True, 'endpoint_id': endpoint_id})
     
-    endpoint = aiplatform.Endpoint(endpoint_name=f"projects/{PROJECT_ID}/locations/{LOCATION}/endpoints/{endpoint_id}")
+    endpoint = regional_endpoint(endpoint_id)
     
     # Process instances to ensure correct format
     processed_instances = []
@@ -371,15 +687,15 @@ def get_prediction(endpoint_id, instances):
                     'content': clean_content
                 })
             else:
-                logger.error(f"Unsupported content format: {json.dumps(instance)[:100]}...")
+                logger.error("Unsupported content format", extra=instance_shape(instance))
                 raise ValueError("Unsupported content format. Expected {content: 'base64-encoded-image'}")
         else:
             # For any other format, log it and reject
-            logger.error(f"Unsupported instance format: {json.dumps(instance)[:100]}...")
+            logger.error("Unsupported instance format", extra=instance_shape(instance))
             raise ValueError("Unsupported instance format. Expected {content: 'base64-encoded-image'}")
     
     # Get prediction with properly formatted instances
-    prediction = endpoint.predict(instances=processed_instances)
+    prediction = endpoint.predict(instances=processed_instances, timeout=REGION_PREDICT_TIMEOUT_SECONDS)
     
     return prediction
 
@@ -412,33 +728,39 @@ def predict_endpoint(vein_type):
 
         # Get endpoint ID from metadata or config
         endpoint_id = metadata.get('endpointId') or MODELS[vein_type]['endpoint_id']
+        pinned = bool(metadata.get('endpointId'))
         
-        # Get authenticated credentials
-        credentials = authenticate()
+        # Fail fast when the reconciler already knows nothing is deployed, or it is being removed
+        if pinned:
+            vertex_ready = deployment_ready(vein_type, endpoint_id) is not False and not reaper.pending(endpoint_id)
+        else:
+            vertex_ready = vertex_backend.available(vein_type)
+        backend = select_backend(vein_type, metadata, vertex_ready, pinned)
+        if backend is None:
+            reconciler.trigger()
+            return jsonify({
+                'error': 'Endpoint not ready',
+                'status': 'warming',
+                'message': f'No model is deployed to endpoint {endpoint_id}. Call /ping/{vein_type} to warm it up.',
+                'timestamp': datetime.now().isoformat()
+            }), 503
+        if not vertex_ready:
+            # Served locally for now; get the endpoint state moving for the next requests
+            reconciler.trigger()
         
-        # Initialize Vertex AI with the authenticated credentials
-        aiplatform.init(project=PROJECT_ID, location=LOCATION, credentials=credentials)
+        # Canary routing: a weighted share of traffic goes to ready candidate versions
+        version = PRIMARY
+        if backend is vertex_backend and not pinned:
+            candidate = choose_version(MODELS, vein_type)
+            if candidate and candidate_ready(vein_type, candidate):
+                endpoint_id = candidate['endpoint_id']
+                version = candidate['name']
+                pinned = True
         
         try:
-            # Get or create endpoint using EndpointPool
-            if vein_type not in endpoints or endpoint_id not in endpoints[vein_type]:
-                # Initialize the endpoint pool for this type if needed
-                if vein_type not in endpoints:
-                    endpoints[vein_type] = {}
-                
-                # Create the endpoint if it doesn't exist
-                endpoint = aiplatform.Endpoint(
-                    endpoint_name=f"projects/{PROJECT_ID}/locations/{LOCATION}/endpoints/{endpoint_id}"
-                )
-                
-                # Add to pool
-                EndpointPool.add_endpoint(vein_type, endpoint_id, endpoint)
-            else:
-                # Get existing endpoint from pool
-                endpoint = endpoints[vein_type][endpoint_id]['endpoint_obj']
-            
             # Track usage for adaptive timeout
-            usage_history[vein_type].append(time.time())
+            record_usage(vein_type)
+            capture_trace(vein_type, 'predict')
             
             # Validate instances format
             instances = request_data['instances']
@@ -446,6 +768,9 @@ def predict_endpoint(vein_type):
                 raise ValueError("Instances must be a non-empty array")
                 
             processed_instances = []
+            image_hashes = []
+            crops = []
+            crop = cropper.enabled and request_data.get('crop', True)
             for instance in instances:
                 if not isinstance(instance, dict) or 'content' not in instance:
                     raise ValueError("Each instance must be an object with 'content' field")
@@ -460,9 +785,29 @@ def predict_endpoint(vein_type):
                 try:
                     # Decode base64 to check if it's valid
                     image_data = base64.b64decode(content)
+                    # Checked before anything decodes the image; over 1.5MB it is only accepted if its crop fits
+                    if not crop and len(image_data) > MAX_FRAME_BYTES:
+                        raise ValueError("Image size must be less than 1.5MB")
+                    if len(image_data) > MAX_CLIP_BYTES:
+                        raise ValueError(f"Image size must be less than {MAX_CLIP_BYTES // (1024 * 1024)}MB before cropping")
+                    if result_store.enabled:
+                        image_hashes.append(hashlib.sha256(image_data).hexdigest()[:32])
+                    # Decoded at most once, by whichever of the crop, hash and Doppler checks needs the pixels first
+                    frame = Frame(image_data)
+                    
+                    # Crop to the ultrasound image; the near-duplicate and Doppler checks below still see the full frame
+                    sent = image_data
+                    if crop:
+                        try:
+                            sent, crop_info = cropper.crop(frame)
+                            crops.append(crop_info)
+                        except Exception as e:
+                            logger.warning("Could not crop %s frame, sending it whole: %s", vein_type, e)
+                        if sent is not image_data:
+                            content = base64.b64encode(sent).decode('ascii')
                     
-                    # Check file size (1.5MB limit)
-                    if len(image_data) > 1.5 * 1024 * 1024:
+                    # Check file size (1.5MB limit), after cropping
+                    if len(sent) > 1.5 * 1024 * 1024:
                         raise ValueError("Image size must be less than 1.5MB")
                     
                     # Add processed instance
@@ -472,66 +817,154 @@ def predict_endpoint(vein_type):
                 except Exception as e:
                     raise ValueError(f"Invalid base64 image content: {str(e)}")
             
+            # A single frame near-identical to one the primary model already classified is answered from cache
+            fingerprint = None
+            if backend is vertex_backend and not pinned and len(processed_instances) == 1 \
+                    and frame_cache.enabled(vein_type):
+                fingerprint = frame_cache.fingerprint(frame)
+                cached = fingerprint and frame_cache.lookup(vein_type, fingerprint, parameters)
+                if cached:
+                    result, distance = cached
+                    result_store.add(result_records(
+                        vein_type, result['predictions'], image_hashes, result['backend'],
+                        model_version=result.get('modelVersion'), region=result.get('region'), cached=True
+                    ))
+                    return jsonify(dict(
+                        result,
+                        nearDuplicate=True,
+                        hashDistance=distance,
+                        timestamp=datetime.now().isoformat(),
+                        status='success'
+                    ))
+            
+            # Grade a single frame from its Doppler waveform; in answer mode a confident grade skips the model.
+            # Track mode grades it in the background after the model answers, below, so nothing waits on it
+            doppler = None
+            if preclassifier.mode == 'answer' and len(processed_instances) == 1:
+                doppler_start = time.perf_counter()
+                doppler = preclassifier.classify(vein_type, frame)
+                if not pinned and preclassifier.should_answer(doppler):
+                    preclassifier.answered(vein_type)
+                    doppler_elapsed = time.perf_counter() - doppler_start
+                    backend_stats.record(vein_type, 'doppler', doppler_elapsed)
+                    prediction = {'displayNames': [doppler['label']], 'confidences': [doppler['confidence']]}
+                    result_store.add(result_records(
+                        vein_type, [prediction], image_hashes, 'doppler', latency_ms=round(doppler_elapsed * 1000, 1)
+                    ))
+                    return jsonify(dict(
+                        prediction,
+                        backend='doppler',
+                        predictions=[prediction],
+                        doppler=doppler,
+                        timestamp=datetime.now().isoformat(),
+                        status='success'
+                    ))
+            
+            # Make prediction with processed instances; on Vertex AI this fails over between regions
+            predict_start = time.perf_counter()
             try:
-                # Make prediction with processed instances
-                response = endpoint.predict(
-                    instances=processed_instances,
-                    parameters=parameters
+                if backend is vertex_backend:
+                    # Initialize Vertex AI with the authenticated credentials
+                    aiplatform.init(project=PROJECT_ID, location=LOCATION, credentials=get_credentials())
+                predictions, details = backend.predict(
+                    vein_type, processed_instances, parameters, endpoint_id if pinned else None
                 )
-                
-                # Extract predictions from response
-                if not response.predictions or not response.predictions[0]:
-                    raise ValueError("No predictions returned from model")
-                
-                prediction = response.predictions[0]
-                
-                # Format response
-                result = {
-                    'displayNames': prediction.get('displayNames', []),
-                    'confidences': prediction.get('confidences', []),
-                    'deployedModelId': response.deployed_model_id,
+            except Exception as e:
+                backend_stats.record(vein_type, backend.name, 0.0, error=True)
+                if backend is not vertex_backend:
+                    raise
+                version_stats.record(vein_type, version, 0.0, error=True)
+                if pinned or not local_backend.available(vein_type):
+                    raise
+                logger.warning("Vertex AI prediction for %s failed, serving locally: %s", vein_type, e)
+                backend, version, fingerprint = local_backend, PRIMARY, None
+                predict_start = time.perf_counter()
+                predictions, details = backend.predict(vein_type, processed_instances, parameters)
+            elapsed = time.perf_counter() - predict_start
+            backend_stats.record(vein_type, backend.name, elapsed)
+            if backend is vertex_backend:
+                version_stats.record(vein_type, version, elapsed)
+            endpoint_id = details.get('endpointId', endpoint_id)
+            
+            # Extract predictions from response
+            if not predictions or not predictions[0]:
+                raise ValueError("No predictions returned from model")
+            
+            prediction = predictions[0]
+            
+            # Format response
+            result = {
+                'displayNames': prediction.get('displayNames', []),
+                'confidences': prediction.get('confidences', []),
+                'backend': backend.name,
+                'modelVersion': version,
+                # One entry per instance, in request order, for batched callers
+                'predictions': [
+                    {
+                        'displayNames': p.get('displayNames', []),
+                        'confidences': p.get('confidences', [])
+                    }
+                    for p in predictions
+                ],
+            }
+            
+            # Region, deployed model and other fields the backend reports
+            result.update(details)
+            
+            if fingerprint:
+                frame_cache.store(vein_type, fingerprint, parameters, dict(result))
+                result['nearDuplicate'] = False
+            
+            if doppler:
+                preclassifier.record(vein_type, doppler, top_label(result['predictions']))
+                result['doppler'] = doppler
+            elif preclassifier.mode == 'track' and len(processed_instances) == 1:
+                preclassifier.track(vein_type, frame, top_label(result['predictions']))
+            
+            if crops:
+                result['preprocessing'] = {
+                    'cropped': sum(1 for info in crops if info['box']),
+                    'bytesSaved': sum(info['bytesIn'] - info['bytesOut'] for info in crops),
+                    'preprocessMs': round(sum(info['preprocessMs'] for info in crops), 1),
+                    'boxes': [info['box'] for info in crops],
                 }
-                
-                # Add optional fields if they exist
-                if hasattr(response, 'model'):
-                    result['model'] = response.model
-                if hasattr(response, 'model_display_name'):
-                    result['modelDisplayName'] = response.model_display_name
-                if hasattr(response, 'model_version_id'):
-                    result['modelVersionId'] = response.model_version_id
-                
-                # Add remaining fields
-                result.update({
-                    'timestamp': datetime.now().isoformat(),
-                    'status': 'success'
-                })
-                
-                # Release endpoint back to pool
-                EndpointPool.release_endpoint(vein_type, endpoint_id)
-                
-                return jsonify(result)
             
-            except Exception as predict_error:
-                # Release endpoint on error
-                EndpointPool.release_endpoint(vein_type, endpoint_id)
-                raise predict_error
+            # Add remaining fields
+            result.update({
+                'timestamp': datetime.now().isoformat(),
+                'status': 'success'
+            })
+            
+            # Mirror a sample of primary traffic to candidates; this never waits on them
+            if backend is vertex_backend and version == PRIMARY and MODELS[vein_type]['candidates']:
+                shadow.mirror(MODELS, vein_type, processed_instances, parameters,
+                              top_label(result['predictions']))
+            
+            result_store.add(result_records(
+                vein_type, result['predictions'], image_hashes, backend.name, model_version=version,
+                region=result.get('region'), latency_ms=round(elapsed * 1000, 1)
+            ))
+            
+            # Sampled: at full traffic one record per prediction would cost more than it tells
+            logger.info("Prediction served for %s", vein_type, extra={
+                'sample': True,
+                'vein_type': vein_type,
+                'backend': backend.name,
+                'model_version': version,
+                'instances': len(processed_instances),
+                'latency_ms': round(elapsed * 1000, 1),
+                'top_label': top_label(result['predictions']),
+            })
+            
+            return jsonify(result)
             
         except Exception as e:
-            logger.error(f"Prediction error for {vein_type} with endpoint {endpoint_id}: {str(e)}")
-            logger.error(f"Error type: {type(e).__name__}")
-            if hasattr(e, 'code'):
-                logger.error(f"Error code: {e.code}")
-            if hasattr(e, 'details'):
-                logger.error(f"Error details: {e.details}")
-            if hasattr(e, 'metadata'):
-                logger.error(f"Error metadata: {e.metadata}")
-            logger.error(f"Error type: {type(e).__name__}")
-            if hasattr(e, 'code'):
-                logger.error(f"Error code: {e.code}")
-            if hasattr(e, 'details'):
-                logger.error(f"Error details: {e.details}")
-            if hasattr(e, 'metadata'):
-                logger.error(f"Error metadata: {e.metadata}")
+            # One record, with the API error's code, details and metadata as fields
+            error = {'vein_type': vein_type, 'endpoint_id': endpoint_id, 'error_type': type(e).__name__}
+            for attribute in ('code', 'details', 'metadata'):
+                if hasattr(e, attribute):
+                    error[f'error_{attribute}'] = getattr(e, attribute)
+            logger.error("Prediction error for %s with endpoint %s: %s", vein_type, endpoint_id, e, extra=error)
             return jsonify({
                 'error': 'Prediction failed',
                 'message': f'Failed to process request. endpoint_id: {endpoint_id}, error: {str(e)}',
@@ -540,13 +973,201 @@ def predict_endpoint(vein_type):
             }), 500
 
     except Exception as e:
-        logger.error(f"Error in predict_endpoint for {vein_type}: {str(e)}")
+        logger.error("Error in predict_endpoint for %s: %s", vein_type, e)
+        return jsonify({
+            'error': 'Prediction failed',
+            'message': str(e),
+            'veinType': vein_type,
+            'timestamp': datetime.now().isoformat()
+        }), 500
+
+@app.route('/predict/<vein_type>/clip', methods=['POST'])
+def predict_clip(vein_type):
+    """Classify a cine loop: sampled frames in batches, until the aggregate confidence is stable.
+
+    The body has one instance holding an animated GIF or multi-frame TIFF,
+    or one instance per frame of a sequence.
+    """
+    if vein_type not in MODELS:
+        return jsonify({
+            'error': 'Invalid vein type',
+            'message': f'Vein type must be one of: {", ".join(MODELS.keys())}',
+            'timestamp': datetime.now().isoformat()
+        }), 400
+    
+    request_data = request.get_json(silent=True) or {}
+    instances = request_data.get('instances')
+    if not isinstance(instances, list) or not instances or \
+            not all(isinstance(i, dict) and isinstance(i.get('content'), str) for i in instances):
+        return jsonify({
+            'error': 'Invalid request format',
+            'message': "Request must include instances with base64 'content': one multi-frame image or one per frame",
+            'timestamp': datetime.now().isoformat()
+        }), 400
+    parameters = request_data.get('parameters', {
+        'confidenceThreshold': 0.0,
+        'maxPredictions': 5
+    })
+    
+    # Fail fast when the reconciler already knows nothing is deployed
+    if not any(region_available(vein_type, region) for region in MODELS[vein_type]['regions']):
+        reconciler.trigger()
+        return jsonify({
+            'error': 'Endpoint not ready',
+            'status': 'warming',
+            'message': f'No {vein_type} model is deployed. Call /ping/{vein_type} to warm it up.',
+            'timestamp': datetime.now().isoformat()
+        }), 503
+    
+    try:
+        contents = [instance['content'].strip().replace('\n', '').replace('\r', '') for instance in instances]
+        if len(contents) == 1:
+            clip_bytes = base64.b64decode(contents[0])
+            if len(clip_bytes) > MAX_CLIP_BYTES:
+                raise ValueError(f"Clip must be smaller than {MAX_CLIP_BYTES // (1024 * 1024)}MB")
+            clip = ClipFrames(image_bytes=clip_bytes)
+        else:
+            for content in contents:
+                if len(base64.b64decode(content)) > MAX_FRAME_BYTES:
+                    raise ValueError("Each frame must be smaller than 1.5MB")
+            clip = ClipFrames(frames=contents)
+    except Exception as e:
+        return jsonify({
+            'error': 'Invalid clip',
+            'message': str(e),
+            'timestamp': datetime.now().isoformat()
+        }), 400
+    
+    start = time.perf_counter()
+    regions = []
+    
+    def predict_batch(frame_contents):
+        region, response = predict_routed(
+            vein_type, [{'content': content} for content in frame_contents], parameters
+        )
+        regions.append(region['location'])
+        return [dict(prediction) for prediction in response.predictions]
+    
+    try:
+        aiplatform.init(project=PROJECT_ID, location=LOCATION, credentials=get_credentials())
+        record_usage(vein_type)
+        capture_trace(vein_type, 'clip')
+        frames, aggregate, stopped_early, batches = classify_clip(clip, predict_batch)
+    except Exception as e:
+        logger.error("Clip prediction error for %s: %s", vein_type, e)
         return jsonify({
             'error': 'Prediction failed',
             'message': str(e),
             'veinType': vein_type,
             'timestamp': datetime.now().isoformat()
         }), 500
+    finally:
+        clip.close()
+    
+    return jsonify({
+        'veinType': vein_type,
+        'frameCount': clip.count,
+        'framesClassified': len(frames),
+        'batches': batches,
+        'stoppedEarly': stopped_early,
+        'aggregate': aggregate,
+        'frames': frames,
+        'regions': sorted(set(regions)),
+        'elapsedSeconds': round(time.perf_counter() - start, 3),
+        'timestamp': datetime.now().isoformat(),
+        'status': 'success'
+    })
+
+@app.route('/sessions/<vein_type>', methods=['POST'])
+def open_session(vein_type):
+    """Open a live scanning session; frames are then posted to it and results streamed back."""
+    if vein_type not in MODELS:
+        return jsonify({
+            'error': 'Invalid vein type',
+            'message': f'Vein type must be one of: {", ".join(MODELS.keys())}',
+            'timestamp': datetime.now().isoformat()
+        }), 400
+    if not any(region_available(vein_type, region) for region in MODELS[vein_type]['regions']):
+        reconciler.trigger()
+        return jsonify({
+            'error': 'Endpoint not ready',
+            'status': 'warming',
+            'message': f'No {vein_type} model is deployed. Call /ping/{vein_type} to warm it up.',
+            'timestamp': datetime.now().isoformat()
+        }), 503
+    request_data = request.get_json(silent=True) or {}
+    parameters = request_data.get('parameters', {
+        'confidenceThreshold': 0.0,
+        'maxPredictions': 5
+    })
+    try:
+        # Authenticate once for the whole session
+        aiplatform.init(project=PROJECT_ID, location=LOCATION, credentials=get_credentials())
+        session = live_sessions.create(vein_type, session_predictor(vein_type, parameters))
+    except SessionLimitError as e:
+        return jsonify({'error': str(e), 'timestamp': datetime.now().isoformat()}), 429
+    except Exception as e:
+        logger.error("Error opening live session for %s: %s", vein_type, e)
+        return jsonify({'error': str(e), 'timestamp': datetime.now().isoformat()}), 500
+    record_usage(vein_type)
+    return jsonify({
+        'session_id': session.session_id,
+        'vein_type': vein_type,
+        'frames_url': f'/sessions/{session.session_id}/frames',
+        'stream_url': f'/sessions/{session.session_id}/stream',
+        'timestamp': datetime.now().isoformat()
+    }), 201
+
+@app.route('/sessions/<session_id>/frames', methods=['POST'])
+def session_frame(session_id):
+    """Hand a frame to a session: the raw image as the body, or JSON {"content": base64}."""
+    session = live_sessions.get(session_id)
+    if session is None:
+        return jsonify({'error': f'Unknown session: {session_id}'}), 404
+    if request.mimetype == 'application/json':
+        content = (request.get_json(silent=True) or {}).get('content')
+        if not isinstance(content, str) or not content:
+            return jsonify({'error': "JSON frames need a base64 'content' field"}), 400
+        content = content.strip().replace('\n', '').replace('\r', '')
+    else:
+        image_data = request.get_data()
+        if not image_data:
+            return jsonify({'error': 'Frame body is empty'}), 400
+        if len(image_data) > 1.5 * 1024 * 1024:
+            return jsonify({'error': 'Image size must be less than 1.5MB'}), 400
+        content = base64.b64encode(image_data).decode('ascii')
+    try:
+        sequence = session.submit(content)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 410
+    return jsonify({'session_id': session_id, 'sequence': sequence}), 202
+
+@app.route('/sessions/<session_id>/stream', methods=['GET'])
+def session_stream(session_id):
+    """Server-Sent Events: each frame's classification as it completes."""
+    session = live_sessions.get(session_id)
+    if session is None:
+        return jsonify({'error': f'Unknown session: {session_id}'}), 404
+    return event_stream(session.stream())
+
+@app.route('/sessions/<session_id>', methods=['GET', 'DELETE'])
+def session_status(session_id):
+    """A session's frame rates, dropped frames and end-to-end latency; DELETE closes it."""
+    if request.method == 'DELETE':
+        session = live_sessions.close(session_id)
+    else:
+        session = live_sessions.get(session_id)
+    if session is None:
+        return jsonify({'error': f'Unknown session: {session_id}'}), 404
+    return jsonify(session.metrics())
+
+@app.route('/sessions', methods=['GET'])
+def list_sessions():
+    """Metrics of every open live session."""
+    return jsonify({
+        'sessions': live_sessions.list(),
+        'timestamp': datetime.now().isoformat()
+    })
 
 @app.route('/test', methods=['POST'])
 def test_endpoint():
@@ -561,8 +1182,11 @@ def test_endpoint():
                 'timestamp': datetime.now().isoformat()
             }), 400
         
-        # Log the request data for debugging
-        logger.info(f"Test endpoint request data: {json.dumps(request_data)[:1000]}")
+        # Log the request's shape for debugging; the body itself may hold whole images
+        logger.debug("Test endpoint request", extra={
+            'keys': sorted(request_data)[:20] if isinstance(request_data, dict) else None,
+            'bytes': request.content_length,
+        })
         
         # Return success
         return jsonify({
@@ -572,7 +1196,7 @@ def test_endpoint():
             'request_data': request_data
         })
     except Exception as e:
-        logger.error(f"Error in test endpoint: {str(e)}")
+        logger.error("Error in test endpoint: %s", e)
         return jsonify({
             'error': 'Test failed',
             'message': str(e),
@@ -584,10 +1208,10 @@ def health_check():
     """Health check endpoint."""
     try:
         # Try to authenticate using our new function
-        credentials = authenticate()
+        credentials = get_credentials()
         
         # Check if credentials are valid by getting token
-        auth_req = google.auth.transport.requests.Request()
+        auth_req = google_auth_requests.Request()
         credentials.refresh(auth_req)
         token = credentials.token
         
@@ -598,7 +1222,7 @@ def health_check():
             'timestamp': datetime.now().isoformat()
         })
     except Exception as e:
-        logger.error(f"Health check failed: {str(e)}")
+        logger.error("Health check failed: %s", e)
         return jsonify({
             'status': 'error',
             'message': f'Service health check failed: {str(e)}',
@@ -639,7 +1263,7 @@ def auth_debug():
         credentials = authenticate()
         
         # Check if credentials are valid
-        auth_req = google.auth.transport.requests.Request()
+        auth_req = google_auth_requests.Request()
         credentials.refresh(auth_req)
         
         # Get token info
@@ -664,7 +1288,7 @@ def auth_debug():
             'timestamp': datetime.now().isoformat()
         })
     except Exception as e:
-        logger.error(f"Auth debug failed: {str(e)}")
+        logger.error("Auth debug failed: %s", e)
         return jsonify({
             'status': 'error',
             'authentication': 'failed',
@@ -754,11 +1378,15 @@ def cleanup_all():
                 # Skip endpoints that are in use
                 if endpoints[model_type][endpoint_id].get("in_use", False):
                     continue
+                if model_type in MODELS:
+                    readiness.draining(model_type)
+                # Only marks the endpoint; the reaper removes it in the background
                 EndpointPool.delete_endpoint(model_type, endpoint_id)
                 cleanup_count += 1
     return jsonify({
         "status": "success",
-        "message": f"Cleaned up {cleanup_count} endpoints",
+        "message": f"Marked {cleanup_count} endpoints for removal",
+        "removals": reaper.status(),
         "remaining_endpoints": {
             model_type: [
                 {"id": endpoint_id, "in_use": info.get("in_use", False)}
@@ -777,74 +1405,467 @@ def ping_endpoint(vein_type):
                 'error': f'Invalid vein type. Must be one of: {", ".join(MODELS.keys())}'
             }), 400
         request_data = request.get_json() or {}
-        endpoint_id = request_data.get('endpointId') or MODELS[vein_type]['endpoint_id']
-        logger.info(f"Pinging endpoint {endpoint_id} for {vein_type}")
-        now = time.time()
-        usage_history[vein_type].append(now)
-        aiplatform.init(project=PROJECT_ID, location=LOCATION)
-        try:
-            endpoint = aiplatform.Endpoint(
-                endpoint_name=f"projects/{PROJECT_ID}/locations/{LOCATION}/endpoints/{endpoint_id}"
-            )
-            endpoint_info = endpoint.gca_resource
-            has_models = (
-                hasattr(endpoint_info, 'deployed_models') and 
-                endpoint_info.deployed_models and 
-                len(endpoint_info.deployed_models) > 0
-            )
-            if has_models:
-                return jsonify({
-                    'status': 'ready',
-                    'endpoint_id': endpoint_id,
-                    'display_name': endpoint_info.display_name,
-                    'model_type': vein_type,
-                    'deployed_models': [
-                        {
-                            'id': model.id,
-                            'model': model.model,
-                            'display_name': model.display_name
-                        }
-                        for model in endpoint_info.deployed_models
-                    ]
-                })
-            else:
-                def deploy_model_background():
-                    try:
-                        model_id = MODELS[vein_type]['model_id']
-                        model = aiplatform.Model(model_name=f"projects/{PROJECT_ID}/locations/{LOCATION}/models/{model_id}")
-                        model.deploy(
-                            endpoint=endpoint,
-                            machine_type="n1-standard-2",
-                            min_replica_count=1,
-                            max_replica_count=1
-                        )
-                        logger.info(f"Successfully deployed model to endpoint {endpoint_id}")
-                    except Exception as e:
-                        logger.error(f"Background model deployment failed: {str(e)}")
-                thread = threading.Thread(target=deploy_model_background)
-                thread.daemon = True
-                thread.start()
-                return jsonify({
-                    'status': 'warming',
-                    'message': 'Endpoint exists but has no deployed models. Deploying model...',
-                    'endpoint_id': endpoint_id,
-                    'model_type': vein_type
-                }), 202
-        except Exception as e:
-            logger.error(f"Error checking endpoint {endpoint_id}: {str(e)}")
+        endpoint_id = request_data.get('endpointId') or serving_endpoint_id(vein_type)
+        logger.info("Pinging endpoint %s for %s", endpoint_id, vein_type)
+        record_usage(vein_type)
+        capture_trace(vein_type, 'ping')
+        # Readiness comes from the reconciler's state; Vertex AI is never queried here
+        state = get_deployment_state(vein_type, endpoint_id)
+        if state is None:
+            reconciler.trigger()
+            return jsonify({
+                'status': 'warming',
+                'message': 'Endpoint state is being synced. Retry shortly.',
+                'endpoint_id': endpoint_id,
+                'model_type': vein_type
+            }), 202
+        if state['error']:
             return jsonify({
                 'status': 'not_ready',
-                'error': f'Failed to access endpoint: {str(e)}',
+                'error': f'Failed to access endpoint: {state["error"]}',
                 'endpoint_id': endpoint_id,
                 'model_type': vein_type
             }), 404
+        if state['deployed_models']:
+            return jsonify({
+                'status': 'ready',
+                'endpoint_id': endpoint_id,
+                'display_name': state['display_name'],
+                'model_type': vein_type,
+                'deployed_models': state['deployed_models']
+            })
+
+        job = create_endpoint(vein_type, endpoint_id)
+        return jsonify({
+            'status': 'warming',
+            'message': 'Endpoint exists but has no deployed models. Deploying model...',
+            'endpoint_id': endpoint_id,
+            'model_type': vein_type,
+            'job_id': job['job_id'] if job else None,
+            'readiness': readiness.get(vein_type)
+        }), 202
     except Exception as e:
-        logger.error(f"Error in ping endpoint: {str(e)}")
+        logger.error("Error in ping endpoint: %s", e)
         return jsonify({
             'error': str(e),
             'model_type': vein_type
         }), 500
 
+@app.route('/deploy/<vein_type>', methods=['POST'])
+def deploy_vein(vein_type):
+    """Start deploying a vein's model; returns a job id to poll at /jobs/<id> instead of waiting."""
+    if vein_type not in MODELS:
+        return jsonify({
+            'error': f'Invalid vein type. Must be one of: {", ".join(MODELS.keys())}'
+        }), 400
+    request_data = request.get_json(silent=True) or {}
+    version = request_data.get('version')
+    endpoint_id = request_data.get('endpointId') or deploy_endpoint_id(vein_type)
+    if request_data.get('region'):
+        regions = {region['location']: region['endpoint_id'] for region in MODELS[vein_type]['regions']}
+        if request_data['region'] not in regions:
+            return jsonify({'error': f'No {vein_type} endpoint in region {request_data["region"]}'}), 400
+        endpoint_id = regions[request_data['region']]
+    if version:
+        candidate = find_candidate(MODELS, vein_type, version)
+        if candidate is None:
+            return jsonify({'error': f'Unknown {vein_type} model version: {version}'}), 400
+        endpoint_id = candidate['endpoint_id']
+    try:
+        job = create_endpoint(vein_type, endpoint_id, version=version)
+    except Exception as e:
+        logger.error("Error starting deploy for %s: %s", vein_type, e)
+        return jsonify({'error': str(e), 'model_type': vein_type}), 500
+    if job is None:
+        return jsonify({
+            'status': 'ready',
+            'endpoint_id': endpoint_id,
+            'model_type': vein_type
+        })
+    return jsonify(job), 202
+
+@app.route('/warm', methods=['POST'])
+def warm_all():
+    """Deploy every configured model that is not deployed yet, concurrently and within quota."""
+    request_data = request.get_json(silent=True) or {}
+    vein_types = request_data.get('veins') or list(MODELS.keys())
+    invalid = [vein_type for vein_type in vein_types if vein_type not in MODELS]
+    if invalid:
+        return jsonify({
+            'error': f'Invalid vein types: {", ".join(invalid)}. Must be one of: {", ".join(MODELS.keys())}'
+        }), 400
+    
+    try:
+        # Check every model at once; only endpoints the reconciler has not synced yet are fetched
+        targets = [(vein_type, serving_endpoint_id(vein_type)) for vein_type in vein_types]
+        reconciler.sync_many([target for target in targets if get_deployment_state(*target) is None])
+        
+        # Models already deployed or deploying anywhere count against the quota
+        slots = MAX_DEPLOYED_MODELS - sum(
+            1 for vein_type, info in MODELS.items() for region in info['regions']
+            if deployment_ready(vein_type, region['endpoint_id'])
+            or deploy_manager.active_job(region['endpoint_id'])
+        )
+        
+        models = {}
+        for vein_type, endpoint_id in targets:
+            result = {'endpoint_id': endpoint_id}
+            job = deploy_manager.active_job(endpoint_id)
+            if deployment_ready(vein_type, endpoint_id):
+                result['status'] = 'ready'
+            elif job:
+                result.update(status='deploying', job_id=job['job_id'])
+            elif slots > 0:
+                # Deploy jobs run in the background, so the missing models deploy concurrently
+                job = create_endpoint(vein_type, endpoint_id)
+                slots -= 1
+                result.update(status='deploying', job_id=job['job_id'])
+            else:
+                result['status'] = 'quota_exhausted'
+            result['readiness'] = readiness.get(vein_type)
+            models[vein_type] = result
+    except Exception as e:
+        logger.error("Error warming endpoints: %s", e)
+        return jsonify({'error': str(e)}), 500
+    
+    all_ready = all(result['status'] == 'ready' for result in models.values())
+    return jsonify({
+        'status': 'ready' if all_ready else 'warming',
+        'models': models,
+        'timestamp': datetime.now().isoformat()
+    }), 200 if all_ready else 202
+
+@app.route('/jobs/<job_id>', methods=['GET', 'DELETE'])
+def deploy_job_status(job_id):
+    """Report a deploy job's state, phase, elapsed time and error; DELETE cancels it."""
+    if request.method == 'DELETE':
+        job = deploy_manager.cancel(job_id)
+    else:
+        job = deploy_manager.get(job_id)
+    if job is None:
+        return jsonify({'error': f'Unknown job: {job_id}'}), 404
+    return jsonify(job)
+
+@app.route('/lifecycle', methods=['GET'])
+def lifecycle_status():
+    """Each vein's lifecycle tier and idle thresholds, plus recent time-to-ready by tier."""
+    veins = {}
+    for vein_type, info in MODELS.items():
+        endpoint_id = info['endpoint_id']
+        veins[vein_type] = {
+            'endpoint_id': endpoint_id,
+            'tier': endpoint_tier(vein_type, endpoint_id),
+            'hibernated_at': hibernated.get(vein_type, {}).get(endpoint_id, {}).get('hibernated_at'),
+            'thresholds': {
+                'warm_idle_minutes': calculate_adaptive_timeout(vein_type),
+                'hibernated_idle_minutes': HIBERNATED_DELETE_MINUTES
+            }
+        }
+    return jsonify({
+        'veins': veins,
+        'sweep_enabled': LIFECYCLE_SWEEP,
+        'time_to_ready': time_to_ready_summary(),
+        'timestamp': datetime.now().isoformat()
+    })
+
+@app.route('/backends', methods=['GET'])
+def backend_report():
+    """Which backends can serve each vein, with side-by-side latency and errors per backend."""
+    return jsonify({
+        'default': INFERENCE_BACKEND,
+        'available': {
+            vein_type: [backend.name for backend in (vertex_backend, local_backend) if backend.available(vein_type)]
+            for vein_type in MODELS
+        },
+        'stats': backend_stats.report(),
+        'timestamp': datetime.now().isoformat()
+    })
+
+@app.route('/cache', methods=['GET'])
+def cache_status():
+    """Near-duplicate frame cache size, thresholds and hit rate."""
+    return jsonify({
+        'near_duplicates': frame_cache.stats(),
+        'timestamp': datetime.now().isoformat()
+    })
+
+@app.route('/doppler', methods=['GET'])
+def doppler_report():
+    """How often each vein's frames had a readable waveform, and how often its rule-based grade agreed with the model."""
+    return jsonify(dict(preclassifier.report(), timestamp=datetime.now().isoformat()))
+
+@app.route('/preprocessing', methods=['GET'])
+def preprocessing_report():
+    """How many frames were cropped to the ultrasound image, the bytes it saved and the time it took."""
+    return jsonify(dict(cropper.stats(), timestamp=datetime.now().isoformat()))
+
+@app.route('/logging', methods=['GET'])
+def logging_report():
+    """Log level, records waiting for the writer thread, and records sampled out, rate-limited or dropped."""
+    return jsonify(dict(log_pipeline.stats(), timestamp=datetime.now().isoformat()))
+
+def time_range():
+    """The since and until query arguments, ISO timestamps, as epoch seconds or None."""
+    return tuple(
+        datetime.fromisoformat(request.args[name]).timestamp() if request.args.get(name) else None
+        for name in ('since', 'until')
+    )
+
+@app.route('/results', methods=['GET'])
+def stored_results():
+    """Stored prediction results, newest first, filtered by vein, label, time range or image hash.
+
+    since and until are ISO timestamps; image_hash is the first 32 hex digits
+    of the frame's SHA-256. Results from the last few seconds may still be buffered.
+    """
+    try:
+        since, until = time_range()
+        limit = min(int(request.args.get('limit', 100)), 1000)
+    except ValueError as e:
+        return jsonify({
+            'error': 'Invalid query',
+            'message': str(e),
+            'timestamp': datetime.now().isoformat()
+        }), 400
+    results = result_store.query(
+        vein_type=request.args.get('vein'),
+        label=request.args.get('label'),
+        since=since,
+        until=until,
+        image_hash=request.args.get('image_hash'),
+        limit=limit
+    )
+    for result in results:
+        result['ts'] = datetime.fromtimestamp(result['ts']).isoformat()
+    return jsonify({
+        'results': results,
+        'store': result_store.stats(),
+        'timestamp': datetime.now().isoformat()
+    })
+
+@app.route('/stats', methods=['GET'])
+def result_stats():
+    """Per vein over a time range: result count, label distribution, confidence histogram and latency.
+
+    Read from the rollups, so since and until are widened to whole hours.
+    """
+    try:
+        since, until = time_range()
+    except ValueError as e:
+        return jsonify({
+            'error': 'Invalid query',
+            'message': str(e),
+            'timestamp': datetime.now().isoformat()
+        }), 400
+    return jsonify({
+        'veins': result_rollups.summary(request.args.get('vein'), since, until),
+        'bounds': histogram_bounds(),
+        # complete is false while the startup rebuild still has segments to count
+        'rollups': result_rollups.progress(),
+        'timestamp': datetime.now().isoformat()
+    })
+
+@app.route('/stats/<vein_type>/series', methods=['GET'])
+def result_stats_series(vein_type):
+    """The same summary for one vein per hour or day, for trends over time."""
+    interval = request.args.get('interval', 'hour')
+    try:
+        if vein_type not in MODELS:
+            raise ValueError(f'Vein type must be one of: {", ".join(MODELS.keys())}')
+        if interval not in INTERVALS:
+            raise ValueError(f'Interval must be one of: {", ".join(INTERVALS)}')
+        since, until = time_range()
+    except ValueError as e:
+        return jsonify({
+            'error': 'Invalid query',
+            'message': str(e),
+            'timestamp': datetime.now().isoformat()
+        }), 400
+    series = result_rollups.series(vein_type, interval, since, until)
+    for point in series:
+        # Days are UTC days
+        point['start'] = datetime.fromtimestamp(point['start'], timezone.utc).isoformat()
+    return jsonify({
+        'vein_type': vein_type,
+        'interval': interval,
+        'series': series,
+        'bounds': histogram_bounds(),
+        'rollups': result_rollups.progress(),
+        'timestamp': datetime.now().isoformat()
+    })
+
+@app.route('/regions', methods=['GET'])
+def region_report():
+    """Each vein's regions with their latency and error EWMAs, health and deployment state."""
+    veins = {}
+    stats = region_router.report()
+    for vein_type, info in MODELS.items():
+        veins[vein_type] = {
+            'deploy_region': region_router.deploy_region(MODELS, vein_type)['location'],
+            'regions': [
+                dict(
+                    region,
+                    deployed=deployment_ready(vein_type, region['endpoint_id']),
+                    **stats.get(vein_type, {}).get(region['location'], {'requests': 0, 'healthy': True})
+                )
+                for region in region_router.rank(MODELS, vein_type)
+            ]
+        }
+    return jsonify({
+        'veins': veins,
+        'timestamp': datetime.now().isoformat()
+    })
+
+@app.route('/versions', methods=['GET'])
+def version_report():
+    """Configured candidate versions and side-by-side latency and label agreement per version."""
+    return jsonify({
+        'candidates': {vein_type: info['candidates'] for vein_type, info in MODELS.items()},
+        'stats': version_stats.report(),
+        'shadow_dropped': shadow.dropped,
+        'timestamp': datetime.now().isoformat()
+    })
+
+@app.route('/readiness', methods=['GET'])
+def readiness_snapshot():
+    """Current readiness state of every vein type."""
+    return jsonify({
+        'veins': readiness.snapshot(),
+        'timestamp': datetime.now().isoformat()
+    })
+
+@app.route('/readiness/stream', methods=['GET'])
+def readiness_stream():
+    """Server-Sent Events: every vein's state on connect, then each transition as it happens."""
+    return event_stream(readiness.stream())
+
+def predict_with_online_endpoint(vein_type, instances):
+    """Predict a list of instances on the vein's best online region; used by the local batch stand-in."""
+    credentials = get_credentials()
+    aiplatform.init(project=PROJECT_ID, location=LOCATION, credentials=credentials)
+    _, response = region_router.call(
+        MODELS, vein_type,
+        lambda region: get_prediction(region['endpoint_id'], instances),
+        available_fn=lambda region: region_available(vein_type, region)
+    )
+    return [dict(prediction) for prediction in response.predictions]
+
+def get_batch_manager():
+    """Create the batch job manager for the configured backend on first use."""
+    global batch_manager
+    with batch_manager_lock:
+        if batch_manager is None:
+            if BATCH_BACKEND == "local":
+                batch_manager = BatchJobManager(
+                    LocalBatchStore(BATCH_LOCAL_DIR),
+                    LocalBatchRunner(predict_with_online_endpoint),
+                    poll_interval=2
+                )
+            else:
+                credentials = get_credentials()
+                aiplatform.init(project=PROJECT_ID, location=LOCATION, credentials=credentials)
+                batch_manager = BatchJobManager(
+                    GCSBatchStore(BATCH_BUCKET, project=PROJECT_ID),
+                    VertexBatchRunner(PROJECT_ID, LOCATION, MODELS)
+                )
+        return batch_manager
+
+def resume_batch_jobs():
+    """Track the batch jobs still running after a restart; Vertex AI keeps running them either way."""
+    try:
+        resumed = get_batch_manager().resume()
+        if resumed:
+            logger.info("Resumed tracking %s batch jobs", len(resumed))
+    except Exception as e:
+        logger.error("Could not resume batch jobs: %s", e)
+
+def public_job(job):
+    """Job fields safe to return to clients."""
+    return {
+        'job_id': job['job_id'],
+        'vein_type': job['vein_type'],
+        'state': job['state'],
+        'error': job['error'],
+        'instance_count': job['instance_count'],
+        'shards_completed': len(job['shards']),
+        'created_at': job['created_at'],
+        'updated_at': job['updated_at'],
+    }
+
+@app.route('/batch/<vein_type>', methods=['POST'])
+def submit_batch(vein_type):
+    """Submit a batch prediction job over a manifest of image URIs."""
+    if vein_type not in MODELS:
+        return jsonify({
+            'error': 'Invalid vein type',
+            'message': f'Vein type must be one of: {", ".join(MODELS.keys())}',
+            'timestamp': datetime.now().isoformat()
+        }), 400
+
+    request_data = request.get_json() or {}
+    instances = request_data.get('instances') or [{'content': uri} for uri in request_data.get('uris', [])]
+    if not instances or not all(isinstance(i, dict) and isinstance(i.get('content'), str) for i in instances):
+        return jsonify({
+            'error': 'Invalid request format',
+            'message': 'Request must include a non-empty uris array or instances with content URIs',
+            'timestamp': datetime.now().isoformat()
+        }), 400
+
+    for instance in instances:
+        if 'mimeType' not in instance:
+            instance['mimeType'] = mimetypes.guess_type(instance['content'])[0] or 'image/jpeg'
+
+    try:
+        job = get_batch_manager().submit(vein_type, instances)
+        return jsonify(dict(public_job(job), timestamp=datetime.now().isoformat())), 202
+    except Exception as e:
+        logger.error("Error submitting batch job for %s: %s", vein_type, e)
+        return jsonify({
+            'error': 'Batch submission failed',
+            'message': str(e),
+            'veinType': vein_type,
+            'timestamp': datetime.now().isoformat()
+        }), 500
+
+@app.route('/batch/jobs/<job_id>', methods=['GET', 'DELETE'])
+def batch_job_status(job_id):
+    """Report a batch job's state, or cancel it with DELETE."""
+    manager = get_batch_manager()
+    job = manager.cancel(job_id) if request.method == 'DELETE' else manager.get(job_id)
+    if not job:
+        return jsonify({
+            'error': 'Unknown job',
+            'job_id': job_id,
+            'timestamp': datetime.now().isoformat()
+        }), 404
+    return jsonify(dict(public_job(job), timestamp=datetime.now().isoformat()))
+
+@app.route('/batch/jobs/<job_id>/results', methods=['GET'])
+def batch_job_results(job_id):
+    """Stream the results written so far as NDJSON, after the first `skip` shards, then close.
+
+    Vertex AI batch jobs run for hours, so the response never waits for more shards;
+    X-Job-State and X-Shards-Completed tell the client whether, and from where, to come back.
+    """
+    manager = get_batch_manager()
+    job, shards = manager.completed_shards(job_id)
+    if not job:
+        return jsonify({
+            'error': 'Unknown job',
+            'job_id': job_id,
+            'timestamp': datetime.now().isoformat()
+        }), 404
+    skip = max(0, request.args.get('skip', 0, type=int))
+
+    def generate():
+        for record in manager.stream_results(shards[skip:]):
+            yield json.dumps(record) + '\n'
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson', headers={
+        'X-Job-State': job['state'],
+        'X-Shards-Completed': str(len(shards)),
+    })
+
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 8080))
     app.run(host="0.0.0.0", port=port)
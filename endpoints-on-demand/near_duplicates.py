@@ -0,0 +1,234 @@
+import io
+import os
+import json
+import time
+import logging
+import threading
+from collections import OrderedDict
+
+from frames import Frame
+
+logger = logging.getLogger(__name__)
+
+# Ultrasound frames share so much layout (dark background, sector fan, scale
+# bars) that 64-bit hashes put different views a few bits apart; 256 bits
+# keep re-encoded or rescaled copies within ~12 bits and distinct views 20+ apart
+HASH_SIDE = 16
+HASH_BITS = HASH_SIDE * HASH_SIDE
+DEFAULT_MAX_DISTANCE = 12  # Hamming distance (of 256 bits) still counted as the same frame
+CACHE_SIZE = int(os.environ.get("NEAR_DUPLICATE_CACHE_SIZE", "2048"))  # Entries kept across all veins
+CACHE_TTL_SECONDS = int(os.environ.get("NEAR_DUPLICATE_TTL_SECONDS", "1800"))
+
+
+def load_max_distances(vein_types, config=None):
+    """Per-vein Hamming distance thresholds; 0 turns the cache off for a vein.
+
+    config (default: the NEAR_DUPLICATE_DISTANCE environment variable) is
+    JSON mapping a vein type to its threshold; other veins use
+    DEFAULT_MAX_DISTANCE.
+    """
+    config = config if config is not None else os.environ.get("NEAR_DUPLICATE_DISTANCE", "")
+    distances = json.loads(config) if config else {}
+    return {vein_type: int(distances.get(vein_type, DEFAULT_MAX_DISTANCE)) for vein_type in vein_types}
+
+
+def decode_grayscale(image_bytes):
+    """Decode an image to grayscale; only as much resolution as the hashes need is decoded."""
+    # Imported here, off the startup path
+    from PIL import Image
+    with Image.open(io.BytesIO(image_bytes)) as image:
+        image.draft("L", (256, 256))  # Lets JPEG decode at a fraction of full size
+        return image.convert("L")
+
+
+def thumbnail(image, size):
+    """A size (width, height) float array of a grayscale image."""
+    import numpy as np
+    from PIL import Image
+    return np.asarray(image.resize(size, Image.BILINEAR), dtype=np.float32)
+
+
+def bits_to_int(bits):
+    import numpy as np
+    return int.from_bytes(np.packbits(bits.ravel()).tobytes(), "big")
+
+
+def dhash(image):
+    """Difference hash: whether each pixel is brighter than its right neighbour on a 17x16 thumbnail."""
+    pixels = thumbnail(image, (HASH_SIDE + 1, HASH_SIDE))
+    return bits_to_int(pixels[:, 1:] > pixels[:, :-1])
+
+
+_dct_matrices = {}
+
+
+def dct_matrix(n):
+    """Orthonormal DCT-II basis, so a 2-D DCT is two matrix products."""
+    if n not in _dct_matrices:
+        import numpy as np
+        k = np.arange(n)[:, None]
+        matrix = np.cos(np.pi * (2 * np.arange(n)[None, :] + 1) * k / (2 * n)) * np.sqrt(2.0 / n)
+        matrix[0] /= np.sqrt(2.0)
+        _dct_matrices[n] = matrix
+    return _dct_matrices[n]
+
+
+def phash(image, size=64, low=HASH_SIDE):
+    """Perceptual hash: the 16x16 lowest-frequency DCT coefficients of a 64x64 thumbnail, above their median."""
+    import numpy as np
+    pixels = thumbnail(image, (size, size))
+    matrix = dct_matrix(size)
+    coefficients = (matrix @ pixels @ matrix.T)[:low, :low]
+    # The DC term only carries overall brightness
+    return bits_to_int(coefficients > np.median(coefficients.ravel()[1:]))
+
+
+def hamming(a, b):
+    return bin(a ^ b).count("1")
+
+
+class MultiIndexHashTable:
+    """Finds every stored hash within a Hamming radius without comparing against all of them.
+
+    Hashes are split into radius + 1 chunks. Two hashes within the radius
+    differ in at most radius bits, so they share at least one chunk exactly.
+    Only the entries filed under a matching chunk are compared in full.
+    """
+
+    def __init__(self, max_radius, bits=HASH_BITS):
+        self.max_radius = max_radius
+        chunks = max_radius + 1
+        width, extra = divmod(bits, chunks)
+        self.spans = []  # (shift, mask) per chunk
+        shift = bits
+        for index in range(chunks):
+            size = width + (1 if index < extra else 0)
+            shift -= size
+            self.spans.append((shift, (1 << size) - 1))
+        self.tables = [{} for _ in self.spans]  # [{chunk value: {key}}]
+
+    def _chunks(self, value):
+        return [(value >> shift) & mask for shift, mask in self.spans]
+
+    def add(self, key, value):
+        for table, chunk in zip(self.tables, self._chunks(value)):
+            table.setdefault(chunk, set()).add(key)
+
+    def remove(self, key, value):
+        for table, chunk in zip(self.tables, self._chunks(value)):
+            keys = table.get(chunk)
+            if keys:
+                keys.discard(key)
+                if not keys:
+                    del table[chunk]
+
+    def candidates(self, value):
+        """Keys sharing at least one chunk with value; a superset of those within max_radius."""
+        found = set()
+        for table, chunk in zip(self.tables, self._chunks(value)):
+            found.update(table.get(chunk, ()))
+        return found
+
+
+class NearDuplicateCache:
+    """Prediction results keyed by perceptual hash, so near-identical frames skip the model.
+
+    A frame matches a cached one of the same vein and request parameters when
+    both its pHash and dHash are within the vein's Hamming distance. pHash is
+    robust to re-encoding and rescaling, dHash to brightness shifts. Entries
+    expire after ttl seconds, and past capacity the least recently used are
+    evicted.
+    """
+
+    def __init__(self, max_distances, capacity=CACHE_SIZE, ttl=CACHE_TTL_SECONDS, clock=time.time):
+        self.max_distances = max_distances
+        self.capacity = capacity
+        self.ttl = ttl
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # {key: {vein_type, signature, phash, dhash, result, stored_at}}
+        self.index = MultiIndexHashTable(max(max_distances.values(), default=0))
+        self.next_key = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def enabled(self, vein_type):
+        return self.max_distances.get(vein_type, 0) > 0
+
+    @staticmethod
+    def fingerprint(image):
+        """(pHash, dHash) of encoded bytes or a Frame, or None if it cannot be decoded."""
+        try:
+            frame = Frame.of(image)
+            # A frame something else already decoded is reused; otherwise only the resolution the hashes need is decoded
+            image = frame.gray() if frame.decoded else decode_grayscale(frame.data)
+            return phash(image), dhash(image)
+        except Exception as e:
+            logger.warning(f"Could not hash image: {str(e)}")
+            return None
+
+    @staticmethod
+    def signature(parameters):
+        return json.dumps(parameters, sort_keys=True)
+
+    def lookup(self, vein_type, fingerprint, parameters):
+        """Return (result, distance) for the closest cached near-duplicate, or None."""
+        max_distance = self.max_distances.get(vein_type, 0)
+        signature = self.signature(parameters)
+        now = self.clock()
+        with self.lock:
+            best = None
+            for key in self.index.candidates(fingerprint[0]):
+                entry = self.entries[key]
+                if entry["vein_type"] != vein_type or entry["signature"] != signature:
+                    continue
+                if now - entry["stored_at"] > self.ttl:
+                    self._remove(key)
+                    continue
+                distance = hamming(entry["phash"], fingerprint[0])
+                if distance > max_distance or hamming(entry["dhash"], fingerprint[1]) > max_distance:
+                    continue
+                if best is None or distance < best[1]:
+                    best = (key, distance)
+            if best is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.entries.move_to_end(best[0])
+            return self.entries[best[0]]["result"], best[1]
+
+    def store(self, vein_type, fingerprint, parameters, result):
+        with self.lock:
+            key = self.next_key
+            self.next_key += 1
+            self.entries[key] = {
+                "vein_type": vein_type,
+                "signature": self.signature(parameters),
+                "phash": fingerprint[0],
+                "dhash": fingerprint[1],
+                "result": result,
+                "stored_at": self.clock(),
+            }
+            self.index.add(key, fingerprint[0])
+            while len(self.entries) > self.capacity:
+                self._remove(next(iter(self.entries)))
+                self.evictions += 1
+
+    def _remove(self, key):
+        entry = self.entries.pop(key)
+        self.index.remove(key, entry["phash"])
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "capacity": self.capacity,
+                "ttl_seconds": self.ttl,
+                "max_distance": self.max_distances,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+                "evictions": self.evictions,
+            }
@@ -0,0 +1,186 @@
+import os
+import json
+import time
+import queue
+import logging
+import threading
+from collections import deque
+from statistics import median
+
+logger = logging.getLogger(__name__)
+
+# Per-vein lifecycle: cold -> deploying -> warm -> draining -> cold
+COLD = "cold"
+DEPLOYING = "deploying"
+WARM = "warm"
+DRAINING = "draining"
+
+DEFAULT_DEPLOY_SECONDS = int(os.environ.get("DEFAULT_DEPLOY_SECONDS", "900"))  # ETA before any deploy was timed
+DRAIN_TIMEOUT_SECONDS = 600  # Give up on a drain whose models are still deployed after this long
+DEPLOY_HISTORY_SIZE = 20  # Recent deploy durations kept per vein for the ETA
+DEPLOY_HISTORY_PATH = os.environ.get("DEPLOY_HISTORY_PATH")  # Optional JSON file so durations survive restarts
+SUBSCRIBER_QUEUE_SIZE = 100
+
+
+class ReadinessTracker:
+    """Explicit readiness state per vein type, with deploy ETAs and change subscribers.
+
+    Deploy durations are measured from deploy_started() to the first sync that
+    shows a deployed model, and the median of recent durations is the ETA for
+    the next deploy. Every transition is pushed to subscriber queues so the SSE
+    route can stream it.
+    """
+
+    def __init__(self, vein_types, history_path=DEPLOY_HISTORY_PATH, clock=time.time):
+        self.clock = clock
+        self.history_path = history_path
+        self.lock = threading.Lock()
+        self.durations = {vein_type: deque(maxlen=DEPLOY_HISTORY_SIZE) for vein_type in vein_types}
+        self.states = {
+            vein_type: {"state": COLD, "since": clock(), "deploy_started_at": None}
+            for vein_type in vein_types
+        }
+        self.subscribers = set()
+        self._load_history()
+
+    def _load_history(self):
+        if not self.history_path or not os.path.exists(self.history_path):
+            return
+        try:
+            with open(self.history_path, "r") as f:
+                for vein_type, durations in json.load(f).items():
+                    if vein_type in self.durations:
+                        self.durations[vein_type].extend(durations)
+        except Exception as e:
+            logger.warning(f"Could not load deploy history from {self.history_path}: {str(e)}")
+
+    def _save_history(self):
+        if not self.history_path:
+            return
+        try:
+            tmp_path = f"{self.history_path}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump({vein_type: list(d) for vein_type, d in self.durations.items()}, f)
+            os.replace(tmp_path, self.history_path)
+        except Exception as e:
+            logger.warning(f"Could not save deploy history to {self.history_path}: {str(e)}")
+
+    def estimated_deploy_seconds(self, vein_type):
+        durations = self.durations[vein_type]
+        return round(median(durations)) if durations else DEFAULT_DEPLOY_SECONDS
+
+    def _describe(self, vein_type):
+        entry = self.states[vein_type]
+        now = self.clock()
+        status = {
+            "vein_type": vein_type,
+            "state": entry["state"],
+            "since": entry["since"],
+            "seconds_in_state": round(now - entry["since"], 1),
+        }
+        if entry["state"] == DEPLOYING:
+            estimate = self.estimated_deploy_seconds(vein_type)
+            elapsed = now - entry["deploy_started_at"]
+            status.update(
+                deploy_estimate_seconds=estimate,
+                eta_seconds=max(0, round(estimate - elapsed)),
+                eta_samples=len(self.durations[vein_type]),
+            )
+        return status
+
+    def _transition(self, vein_type, new_state):
+        """Move to new_state under the lock; return the status to publish, or None if unchanged."""
+        entry = self.states[vein_type]
+        if entry["state"] == new_state:
+            return None
+        now = self.clock()
+        if new_state == WARM and entry["state"] == DEPLOYING:
+            self.durations[vein_type].append(round(now - entry["deploy_started_at"], 1))
+            self._save_history()
+        logger.info(f"{vein_type} readiness: {entry['state']} -> {new_state}")
+        entry["state"] = new_state
+        entry["since"] = now
+        entry["deploy_started_at"] = now if new_state == DEPLOYING else None
+        return self._describe(vein_type)
+
+    def _set(self, vein_type, new_state):
+        with self.lock:
+            status = self._transition(vein_type, new_state)
+        if status:
+            self._publish(status)
+
+    def deploy_started(self, vein_type):
+        self._set(vein_type, DEPLOYING)
+
+    def deploy_failed(self, vein_type):
+        self._set(vein_type, COLD)
+
+    def draining(self, vein_type):
+        self._set(vein_type, DRAINING)
+
+    def observe(self, vein_type, has_deployed_models):
+        """Apply a synced observation of whether any model is deployed for the vein."""
+        with self.lock:
+            current = self.states[vein_type]["state"]
+            if has_deployed_models:
+                # Models still listed while draining means the undeploy has not finished,
+                # unless it has taken so long that it must have failed
+                draining = current == DRAINING and \
+                    self.clock() - self.states[vein_type]["since"] < DRAIN_TIMEOUT_SECONDS
+                status = None if draining else self._transition(vein_type, WARM)
+            else:
+                # A deploy in progress has no deployed model yet; that is not cold
+                status = None if current == DEPLOYING else self._transition(vein_type, COLD)
+        if status:
+            self._publish(status)
+
+    def snapshot(self):
+        with self.lock:
+            return [self._describe(vein_type) for vein_type in self.states]
+
+    def get(self, vein_type):
+        with self.lock:
+            return self._describe(vein_type)
+
+    def subscribe(self):
+        subscriber = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        with self.lock:
+            self.subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self.lock:
+            self.subscribers.discard(subscriber)
+
+    def _publish(self, status):
+        with self.lock:
+            subscribers = list(self.subscribers)
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(status)
+            except queue.Full:
+                # A stalled client must not hold up transitions; drop it and let it reconnect
+                self.unsubscribe(subscriber)
+
+    def stream(self, heartbeat_seconds=15):
+        """Yield SSE messages: the current state of every vein, then each transition."""
+        subscriber = self.subscribe()
+        try:
+            for status in self.snapshot():
+                yield format_event(status)
+            while True:
+                try:
+                    status = subscriber.get(timeout=heartbeat_seconds)
+                except queue.Empty:
+                    if subscriber not in self.subscribers:
+                        return
+                    # Comment line keeps proxies from closing an idle connection
+                    yield ": keep-alive\n\n"
+                    continue
+                yield format_event(status)
+        finally:
+            self.unsubscribe(subscriber)
+
+
+def format_event(status):
+    return f"event: readiness\ndata: {json.dumps(status)}\n\n"
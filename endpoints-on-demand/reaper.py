@@ -0,0 +1,144 @@
+import time
+import queue
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+REAPER_WORKERS = 2
+MAX_ATTEMPTS = 4
+RETRY_BACKOFF_SECONDS = 5  # Doubles after every failed attempt
+
+
+class EndpointReaper:
+    """Undeploys (and, unless hibernating, deletes) endpoints on a small background worker pool.
+
+    Request handlers only call mark(); the slow control-plane calls happen on
+    the workers, in parallel and with retries. Marking an endpoint that is
+    already queued is a no-op, and an endpoint that is already gone counts as
+    reaped. With workers=0 the work runs inline in mark(), which the
+    simulator uses to keep its virtual clock deterministic. on_done, if set,
+    is called as on_done(model_type, endpoint_id, succeeded).
+    """
+
+    def __init__(self, workers=REAPER_WORKERS, max_attempts=MAX_ATTEMPTS, backoff=RETRY_BACKOFF_SECONDS,
+                 on_done=None):
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.on_done = on_done
+        self.queue = queue.Queue()
+        self.lock = threading.Lock()
+        self.tasks = {}  # {endpoint_id: {model_type, state, delete, attempts, error}}
+        self.started = False
+
+    def mark(self, model_type, endpoint_id, endpoint_obj, delete=True):
+        """Queue an endpoint for undeploy and, if delete, deletion; return False if already queued.
+
+        Asking to delete an endpoint that is queued or running as a
+        hibernation upgrades that task to a delete.
+        """
+        with self.lock:
+            task = self.tasks.get(endpoint_id)
+            if task and task["state"] in ("queued", "running"):
+                if delete and not task["delete"]:
+                    task["delete"] = True
+                    return True
+                return False
+            self.tasks[endpoint_id] = {
+                "model_type": model_type,
+                "state": "queued",
+                "delete": delete,
+                "attempts": 0,
+                "error": None
+            }
+        logger.info(f"Marked endpoint {endpoint_id} for {'removal' if delete else 'hibernation'}")
+        if self.workers == 0:
+            self._reap(model_type, endpoint_id, endpoint_obj)
+            return True
+        self._start()
+        self.queue.put((model_type, endpoint_id, endpoint_obj))
+        return True
+
+    def pending(self, endpoint_id):
+        """True while an endpoint is queued or being reaped."""
+        with self.lock:
+            task = self.tasks.get(endpoint_id)
+            return bool(task) and task["state"] in ("queued", "running")
+
+    def status(self):
+        with self.lock:
+            return {endpoint_id: dict(task) for endpoint_id, task in self.tasks.items()}
+
+    def _start(self):
+        with self.lock:
+            if self.started:
+                return
+            self.started = True
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"endpoint-reaper-{index}")
+            thread.daemon = True
+            thread.start()
+
+    def _work(self):
+        while True:
+            model_type, endpoint_id, endpoint_obj = self.queue.get()
+            try:
+                self._reap(model_type, endpoint_id, endpoint_obj)
+            finally:
+                self.queue.task_done()
+
+    def _set(self, endpoint_id, **fields):
+        with self.lock:
+            self.tasks[endpoint_id].update(fields)
+
+    def _reap(self, model_type, endpoint_id, endpoint_obj):
+        for attempt in range(1, self.max_attempts + 1):
+            self._set(endpoint_id, state="running", attempts=attempt)
+            try:
+                while True:
+                    with self.lock:
+                        delete = self.tasks[endpoint_id]["delete"]
+                    self._undeploy_and_delete(endpoint_obj, delete)
+                    with self.lock:
+                        if self.tasks[endpoint_id]["delete"] == delete:
+                            break
+                    # Upgraded to a delete while hibernating; go round again to delete too
+                self._set(endpoint_id, state="done", error=None)
+                logger.info(f"{'Deleted' if delete else 'Hibernated'} endpoint {endpoint_id}")
+                self._notify(model_type, endpoint_id, True)
+                return
+            except Exception as e:
+                logger.error(f"Error deleting endpoint {endpoint_id} (attempt {attempt}/{self.max_attempts}): {str(e)}")
+                self._set(endpoint_id, error=str(e))
+                if attempt < self.max_attempts and self.workers:
+                    time.sleep(self.backoff * 2 ** (attempt - 1))
+        self._set(endpoint_id, state="failed")
+        self._notify(model_type, endpoint_id, False)
+
+    @staticmethod
+    def _undeploy_and_delete(endpoint_obj, delete):
+        # Either step may already have happened on an earlier attempt or elsewhere
+        steps = (endpoint_obj.undeploy_all, endpoint_obj.delete) if delete else (endpoint_obj.undeploy_all,)
+        for step in steps:
+            try:
+                step()
+            except Exception as e:
+                if not _is_not_found(e):
+                    raise
+
+    def _notify(self, model_type, endpoint_id, succeeded):
+        if self.on_done:
+            try:
+                self.on_done(model_type, endpoint_id, succeeded)
+            except Exception as e:
+                logger.error(f"Reaper callback failed for {endpoint_id}: {str(e)}")
+
+
+def _is_not_found(error):
+    # Imported here, off the startup path; the simulator runs without the Google client libraries
+    try:
+        from google.api_core.exceptions import NotFound
+    except ImportError:
+        return False
+    return isinstance(error, NotFound)
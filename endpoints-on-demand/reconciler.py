@@ -0,0 +1,101 @@
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from endpoint_pool import endpoints, set_deployment_state
+
+logger = logging.getLogger(__name__)
+
+MIN_INTERVAL_SECONDS = 15  # Sync interval right after a change
+MAX_INTERVAL_SECONDS = 300  # Sync interval once nothing has changed for a while
+SYNC_WORKERS = 4  # Endpoints fetched concurrently per pass
+
+
+class EndpointReconciler:
+    """Periodically syncs the deployed-model state of every managed endpoint into the pool.
+
+    fetch_fn(endpoint_id) returns (endpoint_obj, display_name, deployed_models)
+    and is the only place Vertex AI is queried for endpoint state. The interval
+    doubles while nothing changes and resets on any change. trigger() wakes the
+    loop at once, e.g. right after a deploy or undeploy. If given,
+    on_sync(model_type, endpoint_id) is called after every endpoint sync.
+    """
+
+    def __init__(self, fetch_fn, managed_fn, min_interval=MIN_INTERVAL_SECONDS, max_interval=MAX_INTERVAL_SECONDS,
+                 on_sync=None):
+        self.fetch_fn = fetch_fn
+        self.managed_fn = managed_fn
+        self.on_sync = on_sync
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.interval = min_interval
+        self.wake = threading.Event()
+        self.started = False
+        self.start_lock = threading.Lock()
+        self.last_run = None
+
+    def start(self):
+        """Start the background loop once per process."""
+        with self.start_lock:
+            if self.started:
+                return
+            self.started = True
+        thread = threading.Thread(target=self._loop, name="endpoint-reconciler")
+        thread.daemon = True
+        thread.start()
+        logger.info("Endpoint reconciler started")
+
+    def trigger(self):
+        """Request an immediate sync."""
+        self.interval = self.min_interval
+        self.wake.set()
+
+    def managed_endpoints(self):
+        """(model_type, endpoint_id) pairs from the configured models plus anything in the pool."""
+        managed = set(self.managed_fn())
+        for model_type, model_endpoints in list(endpoints.items()):
+            for endpoint_id in list(model_endpoints):
+                managed.add((model_type, endpoint_id))
+        return sorted(managed)
+
+    def sync_endpoint(self, model_type, endpoint_id):
+        """Fetch and record one endpoint's state; return True if it changed."""
+        try:
+            endpoint_obj, display_name, deployed_models = self.fetch_fn(endpoint_id)
+            changed = set_deployment_state(model_type, endpoint_id, endpoint_obj, display_name, deployed_models)
+        except Exception as e:
+            logger.warning(f"Reconciler could not sync endpoint {endpoint_id}: {str(e)}")
+            changed = set_deployment_state(model_type, endpoint_id, None, None, [], error=str(e))
+        if self.on_sync:
+            try:
+                self.on_sync(model_type, endpoint_id)
+            except Exception as e:
+                logger.error(f"Reconciler sync callback failed for {endpoint_id}: {str(e)}")
+        return changed
+
+    def sync_many(self, pairs):
+        """Sync (model_type, endpoint_id) pairs concurrently; return True if any state changed."""
+        pairs = list(pairs)
+        if not pairs:
+            return False
+        with ThreadPoolExecutor(max_workers=min(SYNC_WORKERS, len(pairs))) as executor:
+            results = list(executor.map(lambda pair: self.sync_endpoint(*pair), pairs))
+        return any(results)
+
+    def reconcile_once(self):
+        """Sync every managed endpoint; return True if any state changed."""
+        changed = self.sync_many(self.managed_endpoints())
+        self.last_run = time.time()
+        return changed
+
+    def _loop(self):
+        while True:
+            self.wake.clear()
+            try:
+                changed = self.reconcile_once()
+            except Exception as e:
+                logger.error(f"Reconciler pass failed: {str(e)}")
+                changed = False
+            self.interval = self.min_interval if changed else min(self.interval * 2, self.max_interval)
+            self.wake.wait(self.interval)
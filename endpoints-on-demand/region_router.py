@@ -0,0 +1,184 @@
+import os
+import json
+import time
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+EWMA_ALPHA = float(os.environ.get("REGION_EWMA_ALPHA", "0.3"))  # Weight of the newest sample
+ERROR_RATE_THRESHOLD = 0.5  # A region whose error EWMA reaches this is taken out of rotation
+UNHEALTHY_COOLDOWN_SECONDS = int(os.environ.get("REGION_COOLDOWN_SECONDS", "60"))
+ERROR_PENALTY_SECONDS = 10  # Added to a region's score per unit of error EWMA
+
+
+def load_regions(models, default_location, config=None):
+    """Attach the regional endpoints of each vein to models[vein_type]['regions'].
+
+    The vein's own endpoint_id and model_id are always the first region, in
+    default_location. config (default: the MODEL_REGIONS environment variable)
+    maps a vein type to a list of extra {location, endpoint_id, model_id}.
+    Model IDs are regional, so each region names the copy of the model it
+    deploys. The list order is the order regions are preferred in when deploying.
+    """
+    config = config if config is not None else os.environ.get("MODEL_REGIONS", "")
+    regions = json.loads(config) if config else {}
+    for vein_type, info in models.items():
+        info["regions"] = [
+            {"location": default_location, "endpoint_id": info["endpoint_id"], "model_id": info["model_id"]}
+        ]
+        for region in regions.get(vein_type, []):
+            if region["location"] in (existing["location"] for existing in info["regions"]):
+                raise ValueError(f"Region {region['location']} is listed twice for {vein_type}")
+            if not region.get("model_id"):
+                raise ValueError(f"Region {region['location']} of {vein_type} needs the model_id of its copy of the model")
+            info["regions"].append({
+                "location": region["location"],
+                "endpoint_id": region["endpoint_id"],
+                "model_id": region["model_id"],
+            })
+
+
+class RegionRouter:
+    """Picks the region to serve each vein from, using EWMAs of its latency and error rate.
+
+    Healthy regions are ranked by latency EWMA plus a penalty for their error
+    EWMA; a region not measured yet ranks first so it gets probed. When a
+    region's error EWMA reaches ERROR_RATE_THRESHOLD it is unhealthy for the
+    cooldown, then gets traffic again on probation. The error EWMA also
+    halves every cooldown without traffic, so a region that lost requests to
+    a faster one is eventually probed again. Unhealthy regions are still
+    tried last rather than failing a request outright.
+    """
+
+    def __init__(self, alpha=EWMA_ALPHA, error_threshold=ERROR_RATE_THRESHOLD,
+                 cooldown=UNHEALTHY_COOLDOWN_SECONDS, clock=time.monotonic):
+        self.alpha = alpha
+        self.error_threshold = error_threshold
+        self.cooldown = cooldown
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.stats = {}  # {(vein_type, location): {latency_ewma, error_ewma, requests, errors, ...}}
+
+    def _entry(self, vein_type, location):
+        key = (vein_type, location)
+        if key not in self.stats:
+            self.stats[key] = {
+                "latency_ewma": None,
+                "error_ewma": 0.0,
+                "error_updated_at": self.clock(),
+                "requests": 0,
+                "errors": 0,
+                "last_error": None,
+                "unhealthy_until": None,
+            }
+        return self.stats[key]
+
+    def record(self, vein_type, location, seconds=None, error=None):
+        """Fold one request's outcome into the region's EWMAs; error is the failure, if any."""
+        with self.lock:
+            entry = self._entry(vein_type, location)
+            entry["requests"] += 1
+            entry["error_ewma"] = (1 - self.alpha) * self._error_rate(entry) + (self.alpha if error else 0.0)
+            entry["error_updated_at"] = self.clock()
+            if error:
+                entry["errors"] += 1
+                entry["last_error"] = str(error)
+                if entry["error_ewma"] >= self.error_threshold:
+                    self._mark_unhealthy(vein_type, location, entry)
+                return
+            if entry["latency_ewma"] is None:
+                entry["latency_ewma"] = seconds
+            else:
+                entry["latency_ewma"] = (1 - self.alpha) * entry["latency_ewma"] + self.alpha * seconds
+
+    def mark_unhealthy(self, vein_type, location, reason):
+        """Take a region out of rotation now, e.g. when it has no quota left to deploy."""
+        with self.lock:
+            entry = self._entry(vein_type, location)
+            entry["last_error"] = reason
+            self._mark_unhealthy(vein_type, location, entry)
+
+    def _mark_unhealthy(self, vein_type, location, entry):
+        if not self._healthy(entry):
+            return
+        entry["unhealthy_until"] = self.clock() + self.cooldown
+        logger.warning(f"Region {location} unhealthy for {vein_type} for {self.cooldown}s: {entry['last_error']}")
+
+    def _error_rate(self, entry):
+        idle = self.clock() - entry["error_updated_at"]
+        return entry["error_ewma"] * 0.5 ** (idle / self.cooldown)
+
+    def _healthy(self, entry):
+        return entry["unhealthy_until"] is None or self.clock() >= entry["unhealthy_until"]
+
+    def healthy(self, vein_type, location):
+        with self.lock:
+            return self._healthy(self._entry(vein_type, location))
+
+    def rank(self, models, vein_type, available_fn=None):
+        """Regions to try for a request, best first; available_fn(region) filters out undeployed ones."""
+        regions = [
+            region for region in models[vein_type]["regions"]
+            if available_fn is None or available_fn(region)
+        ]
+        with self.lock:
+            def score(indexed):
+                index, region = indexed
+                entry = self._entry(vein_type, region["location"])
+                latency = entry["latency_ewma"] or 0.0
+                # Unhealthy regions last, then lowest score; config order breaks ties
+                return (not self._healthy(entry), latency + self._error_rate(entry) * ERROR_PENALTY_SECONDS, index)
+            return [region for _, region in sorted(enumerate(regions), key=score)]
+
+    def deploy_region(self, models, vein_type):
+        """The first healthy region in config order, or the first region if none is healthy."""
+        regions = models[vein_type]["regions"]
+        for region in regions:
+            if self.healthy(vein_type, region["location"]):
+                return region
+        return regions[0]
+
+    def call(self, models, vein_type, attempt_fn, available_fn=None, clock=time.perf_counter):
+        """Run attempt_fn(region) on the best region, failing over to the next on error.
+
+        Returns (region, result). Raises LookupError if no region is available,
+        or the last region's error if every one failed. attempt_fn must bound
+        its own time, e.g. with a call timeout: a timed-out attempt raises and
+        counts as an error like any other.
+        """
+        regions = self.rank(models, vein_type, available_fn)
+        if not regions:
+            raise LookupError(f"No region has a {vein_type} model deployed")
+        last_error = None
+        for region in regions:
+            start = clock()
+            try:
+                result = attempt_fn(region)
+            except Exception as e:
+                self.record(vein_type, region["location"], error=e)
+                logger.warning(f"{vein_type} prediction failed in {region['location']}: {str(e)}")
+                last_error = e
+                continue
+            self.record(vein_type, region["location"], clock() - start)
+            return region, result
+        raise last_error
+
+    def report(self):
+        """{vein_type: {location: {latency_ewma_ms, error_rate, requests, errors, healthy, ...}}}"""
+        with self.lock:
+            now = self.clock()
+            report = {}
+            for (vein_type, location), entry in self.stats.items():
+                latency = entry["latency_ewma"]
+                report.setdefault(vein_type, {})[location] = {
+                    "latency_ewma_ms": round(latency * 1000, 1) if latency is not None else None,
+                    "error_rate": round(self._error_rate(entry), 4),
+                    "requests": entry["requests"],
+                    "errors": entry["errors"],
+                    "healthy": self._healthy(entry),
+                    "unhealthy_for_seconds": max(0, round(entry["unhealthy_until"] - now))
+                    if not self._healthy(entry) else 0,
+                    "last_error": entry["last_error"],
+                }
+            return report
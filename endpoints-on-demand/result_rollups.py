@@ -0,0 +1,328 @@
+import os
+import sqlite3
+import logging
+import tempfile
+import threading
+
+from result_store import ACTIVE_SUFFIX, segment_name
+
+logger = logging.getLogger(__name__)
+
+CONFIDENCE_BINS = 10  # Equal-width confidence buckets over [0, 1]
+LATENCY_BOUNDS_MS = (50, 100, 200, 400, 800, 1600, 3200, 6400, 12800)  # Upper bounds; one more bucket above the last
+INTERVALS = {"hour": 3600, "day": 86400}
+ROLLUP_FILE = "rollups.sqlite"
+
+CONFIDENCE_COLUMNS = [f"confidence_{index}" for index in range(CONFIDENCE_BINS)]
+LATENCY_COLUMNS = [f"latency_{index}" for index in range(len(LATENCY_BOUNDS_MS) + 1)]
+COUNTERS = ["count", "cached", "confidence_sum", "latency_count", "latency_sum"] + CONFIDENCE_COLUMNS + LATENCY_COLUMNS
+KEY = ["start", "vein_type", "label", "backend"]
+TABLES = {3600: "hourly", 86400: "daily"}  # Rollup tables by the seconds each row covers
+
+SCHEMA = "".join(f"""
+CREATE TABLE IF NOT EXISTS {table} (
+    start INTEGER NOT NULL,
+    vein_type TEXT NOT NULL,
+    label TEXT NOT NULL,
+    backend TEXT NOT NULL,
+    {", ".join(f"{column} REAL NOT NULL DEFAULT 0" for column in COUNTERS)},
+    PRIMARY KEY (start, vein_type, label, backend)
+);
+CREATE INDEX IF NOT EXISTS {table}_vein_start ON {table} (vein_type, start);
+""" for table in TABLES.values()) + """
+CREATE TABLE IF NOT EXISTS segments (
+    name TEXT PRIMARY KEY
+);
+"""
+SEGMENT_COLUMNS = ("ts", "vein_type", "label", "confidence", "backend", "latency_ms", "cached")
+UPSERT = (
+    f"INSERT INTO {{table}} ({', '.join(KEY + COUNTERS)}) VALUES ({', '.join('?' * len(KEY + COUNTERS))}) "
+    f"ON CONFLICT ({', '.join(KEY)}) DO UPDATE SET "
+    + ", ".join(f"{column} = {column} + excluded.{column}" for column in COUNTERS)
+)
+
+
+def confidence_bin(confidence):
+    return min(int(confidence * CONFIDENCE_BINS), CONFIDENCE_BINS - 1)
+
+
+def latency_bin(latency_ms):
+    for index, bound in enumerate(LATENCY_BOUNDS_MS):
+        if latency_ms <= bound:
+            return index
+    return len(LATENCY_BOUNDS_MS)
+
+
+def latency_percentile(histogram, fraction):
+    """Upper bound of the latency bucket holding the fraction-th result; None past the last bound."""
+    total = sum(histogram)
+    if not total:
+        return None
+    seen = 0
+    for index, count in enumerate(histogram):
+        seen += count
+        if seen >= fraction * total:
+            return LATENCY_BOUNDS_MS[index] if index < len(LATENCY_BOUNDS_MS) else None
+    return None
+
+
+class ResultRollups:
+    """Counts per hour and per day, vein, top label and backend, kept up to date as results are written.
+
+    add() is given each batch the result store writes: every record adds to
+    one in-memory row per table, O(1), and the batch's rows are upserted in
+    one transaction. Each row holds counts, sums and confidence and latency
+    histograms, so a range is summarized by adding rows up: daily rows for
+    its whole days, hourly rows for the hours at either end, however many
+    results it covers. Every worker adds to the same file. Days are UTC.
+
+    The file lives next to the segments, so a new instance starts without it.
+    rebuild() counts every segment not counted yet, including those other
+    instances uploaded; the segments table names the ones already counted,
+    whether as they were written or by an earlier rebuild.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.path = os.path.join(root, ROLLUP_FILE) if root else None
+        self.lock = threading.Lock()
+        self.connection = None
+        self.pid = None
+        # Without a root there is nothing to rebuild
+        self.progress_state = {"complete": not root, "running": False, "pending_segments": 0, "added": 0, "failed": 0}
+        if root:
+            os.makedirs(root, exist_ok=True)
+
+    @property
+    def enabled(self):
+        return bool(self.root)
+
+    def _connect(self):
+        # A connection from before a fork belongs to the parent
+        if self.connection is None or self.pid != os.getpid():
+            self.connection = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.executescript(SCHEMA)
+            self.pid = os.getpid()
+        return self.connection
+
+    def add(self, records):
+        if not records:
+            return
+        tables = tally(records)
+        with self.lock:
+            connection = self._connect()
+            with connection:
+                self._upsert(connection, tables)
+
+    def _upsert(self, connection, tables):
+        for seconds, rows in tables.items():
+            connection.executemany(UPSERT.format(table=TABLES[seconds]), [
+                key + tuple(row[column] for column in COUNTERS) for key, row in rows.items()
+            ])
+
+    def segment_opened(self, name):
+        """Mark a segment as counted: its results are added as they are written, so rebuild() skips it."""
+        with self.lock:
+            connection = self._connect()
+            with connection:
+                connection.execute("INSERT OR IGNORE INTO segments (name) VALUES (?)", (name,))
+
+    def counted(self, name):
+        with self.lock:
+            return self._connect().execute("SELECT 1 FROM segments WHERE name = ?", (name,)).fetchone() is not None
+
+    def add_segment(self, name, path):
+        """Add the results in a segment file, unless that segment is already counted; True if they were added."""
+        segment = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        try:
+            records = [dict(zip(SEGMENT_COLUMNS, row))
+                       for row in segment.execute(f"SELECT {', '.join(SEGMENT_COLUMNS)} FROM results")]
+        finally:
+            segment.close()
+        tables = tally(records)
+        with self.lock:
+            connection = self._connect()
+            try:
+                # Marked in the same transaction, so another worker's rebuild cannot count it twice
+                with connection:
+                    connection.execute("INSERT INTO segments (name) VALUES (?)", (name,))
+                    self._upsert(connection, tables)
+            except sqlite3.IntegrityError:
+                return False
+        return True
+
+    def rebuild(self, store):
+        """Count the segments not counted yet: sealed ones on local disk, then every one the uploader holds.
+
+        Runs in the background at startup. A new instance downloads each
+        uploaded segment once; later only what other instances have uploaded
+        since. progress() reports how far it has got.
+        """
+        if not self.enabled:
+            return 0
+        # Active segments are being written, and are counted as they are
+        local = [path for path in store.segments()
+                 if not path.endswith(ACTIVE_SUFFIX) and not self.counted(segment_name(path))]
+        uploaded = []
+        if store.uploader:
+            try:
+                uploaded = [file_name for file_name in sorted(store.uploader.list())
+                            if not self.counted(segment_name(file_name))]
+            except Exception as e:
+                logger.warning(f"Could not list uploaded result segments: {str(e)}")
+        with self.lock:
+            self.progress_state.update(running=True, pending_segments=len(local) + len(uploaded), added=0, failed=0)
+        for path in local:
+            self._rebuild_one(segment_name(path), path)
+        with tempfile.TemporaryDirectory() as directory:
+            for file_name in uploaded:
+                path = os.path.join(directory, file_name)
+                try:
+                    self._rebuild_one(segment_name(file_name), path,
+                                      lambda: store.uploader.download(file_name, path))
+                finally:
+                    if os.path.exists(path):
+                        os.remove(path)
+        with self.lock:
+            self.progress_state.update(running=False, complete=True)
+            added = self.progress_state["added"]
+        if added:
+            logger.info(f"Added {added} result segments to the rollups")
+        return added
+
+    def _rebuild_one(self, name, path, fetch=None):
+        """Add one segment during rebuild(); fetch(), if given, first downloads it to path."""
+        added = failed = 0
+        try:
+            # Another worker may have counted it since the list was made
+            if not self.counted(name):
+                if fetch:
+                    fetch()
+                added = int(self.add_segment(name, path))
+        except Exception as e:
+            failed = 1
+            logger.warning(f"Could not add result segment {name} to the rollups: {str(e)}")
+        with self.lock:
+            self.progress_state["pending_segments"] -= 1
+            self.progress_state["added"] += added
+            self.progress_state["failed"] += failed
+
+    def progress(self):
+        """{complete, running, pending_segments, added, failed} for this process's rebuild().
+
+        Until it is complete, summaries leave out the segments still pending.
+        """
+        with self.lock:
+            return dict(self.progress_state)
+
+    def _rows(self, seconds, vein_type, since, until, bucket_seconds=None):
+        """Rows of one table with start in [since, until), summed by SQLite per vein, label, backend and bucket."""
+        clauses, args = [], []
+        for clause, value in (("vein_type = ?", vein_type), ("start >= ?", since), ("start < ?", until)):
+            if value is not None:
+                clauses.append(clause)
+                args.append(value)
+        bucket = f"start / {int(bucket_seconds)} * {int(bucket_seconds)}" if bucket_seconds else "0"
+        sql = (f"SELECT {bucket}, vein_type, label, backend, {', '.join(f'SUM({column})' for column in COUNTERS)} "
+               f"FROM {TABLES[seconds]}")
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " GROUP BY 1, vein_type, label, backend"
+        with self.lock:
+            if not self.enabled or not os.path.exists(self.path):
+                return []
+            return [dict(zip(["bucket"] + KEY[1:] + COUNTERS, row)) for row in self._connect().execute(sql, args)]
+
+    def _range_rows(self, vein_type, since, until, bucket_seconds=None):
+        """Rows covering [since, until), widened to whole hours: whole days from the daily table, the rest hourly."""
+        since = since and int(since // 3600 * 3600)
+        first_day = since and -(-since // 86400) * 86400
+        last_day = until and int(until // 86400 * 86400)
+        if bucket_seconds == 3600 or (first_day is not None and last_day is not None and first_day >= last_day):
+            return self._rows(3600, vein_type, since, until, bucket_seconds)
+        rows = self._rows(86400, vein_type, first_day, last_day, bucket_seconds)
+        if since is not None and since < first_day:
+            rows += self._rows(3600, vein_type, since, first_day, bucket_seconds)
+        if until is not None and last_day < until:
+            rows += self._rows(3600, vein_type, last_day, until, bucket_seconds)
+        return rows
+
+    def summary(self, vein_type=None, since=None, until=None):
+        """Per vein: result count, label distribution, confidence histogram and latency, over [since, until)."""
+        groups = {}
+        for row in self._range_rows(vein_type, since, until):
+            summarize(groups.setdefault(row["vein_type"], new_summary()), row)
+        return {vein: finish(summary) for vein, summary in sorted(groups.items())}
+
+    def series(self, vein_type, interval="hour", since=None, until=None):
+        """summary() for one vein per hour or day, oldest first; intervals without results are left out."""
+        seconds = INTERVALS[interval]
+        buckets = {}
+        for row in self._range_rows(vein_type, since, until, bucket_seconds=seconds):
+            summarize(buckets.setdefault(int(row["bucket"]), new_summary()), row)
+        return [dict(finish(summary), start=start) for start, summary in sorted(buckets.items())]
+
+
+def tally(records):
+    """One row of counters per table and (start, vein, label, backend) key, summed over records."""
+    tables = {seconds: {} for seconds in TABLES}
+    for record in records:
+        for seconds, rows in tables.items():
+            key = (int(record["ts"] // seconds * seconds), record["vein_type"], record.get("label") or "",
+                   record.get("backend") or "")
+            row = rows.get(key)
+            if row is None:
+                row = rows[key] = dict.fromkeys(COUNTERS, 0)
+            row["count"] += 1
+            row["cached"] += bool(record.get("cached"))
+            if record.get("confidence") is not None:
+                row["confidence_sum"] += record["confidence"]
+                row[CONFIDENCE_COLUMNS[confidence_bin(record["confidence"])]] += 1
+            # Cache hits report no latency
+            if record.get("latency_ms") is not None:
+                row["latency_count"] += 1
+                row["latency_sum"] += record["latency_ms"]
+                row[LATENCY_COLUMNS[latency_bin(record["latency_ms"])]] += 1
+    return tables
+
+
+def new_summary():
+    return {"counters": dict.fromkeys(COUNTERS, 0), "labels": {}, "backends": {}}
+
+
+def summarize(summary, row):
+    for column in COUNTERS:
+        summary["counters"][column] += row[column]
+    if row["label"]:
+        summary["labels"][row["label"]] = summary["labels"].get(row["label"], 0) + row["count"]
+    summary["backends"][row["backend"]] = summary["backends"].get(row["backend"], 0) + row["count"]
+
+
+def finish(summary):
+    counters = summary["counters"]
+    count = int(counters["count"])
+    confidences = [int(counters[column]) for column in CONFIDENCE_COLUMNS]
+    latencies = [int(counters[column]) for column in LATENCY_COLUMNS]
+    return {
+        "count": count,
+        "cached": int(counters["cached"]),
+        "labels": {label: int(n) for label, n in sorted(summary["labels"].items(), key=lambda item: -item[1])},
+        "label_share": {label: round(n / count, 4) for label, n in summary["labels"].items()} if count else {},
+        "backends": {backend: int(n) for backend, n in summary["backends"].items()},
+        "mean_confidence": round(counters["confidence_sum"] / sum(confidences), 4) if sum(confidences) else None,
+        "confidence_histogram": confidences,
+        "mean_latency_ms": round(counters["latency_sum"] / counters["latency_count"], 1)
+        if counters["latency_count"] else None,
+        "latency_histogram": latencies,
+        "latency_p50_ms": latency_percentile(latencies, 0.5),
+        "latency_p90_ms": latency_percentile(latencies, 0.9),
+    }
+
+
+def histogram_bounds():
+    """Edges of the confidence buckets and upper bounds of the latency buckets, for reading the histograms."""
+    return {
+        "confidence": [round(index / CONFIDENCE_BINS, 2) for index in range(CONFIDENCE_BINS + 1)],
+        "latency_ms": list(LATENCY_BOUNDS_MS) + [None],
+    }
@@ -0,0 +1,440 @@
+import os
+import json
+import atexit
+import time
+import shutil
+import logging
+import sqlite3
+import threading
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+RESULT_STORE_DIR = os.environ.get("RESULT_STORE_DIR", "/tmp/vexus-results")  # Empty to keep no results
+RESULT_UPLOAD_URI = os.environ.get("RESULT_UPLOAD_URI")  # gs://bucket/prefix, or a directory, for sealed segments
+RESULT_FLUSH_RECORDS = int(os.environ.get("RESULT_FLUSH_RECORDS", "200"))  # Buffered records that trigger a write
+RESULT_FLUSH_SECONDS = float(os.environ.get("RESULT_FLUSH_SECONDS", "2"))  # Longest a record waits to be written
+RESULT_SEGMENT_RECORDS = int(os.environ.get("RESULT_SEGMENT_RECORDS", "50000"))  # Records per segment before it is sealed
+RESULT_KEEP_SEGMENTS = int(os.environ.get("RESULT_KEEP_SEGMENTS", "20"))  # Sealed segments kept on local disk
+BUFFER_LIMIT = 20000  # Records waiting to be written; more are dropped, not waited on
+TIMING_HISTORY = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    vein_type TEXT NOT NULL,
+    label TEXT,
+    confidence REAL,
+    backend TEXT,
+    model_version TEXT,
+    region TEXT,
+    latency_ms REAL,
+    cached INTEGER NOT NULL DEFAULT 0,
+    image_hash TEXT,
+    predictions TEXT
+);
+CREATE INDEX IF NOT EXISTS results_vein_ts ON results (vein_type, ts);
+CREATE INDEX IF NOT EXISTS results_label_ts ON results (label, ts);
+CREATE INDEX IF NOT EXISTS results_ts ON results (ts);
+CREATE INDEX IF NOT EXISTS results_image_hash ON results (image_hash);
+"""
+COLUMNS = ("ts", "vein_type", "label", "confidence", "backend", "model_version", "region",
+           "latency_ms", "cached", "image_hash", "predictions")
+ACTIVE_SUFFIX = ".active.sqlite"
+SEALED_SUFFIX = ".sealed.sqlite"
+UPLOADED_SUFFIX = ".uploaded.sqlite"
+
+
+def segment_name(path):
+    """A segment's name without its directory or state suffix, the same whether active, sealed or uploaded."""
+    name = os.path.basename(path)
+    for suffix in (ACTIVE_SUFFIX, SEALED_SUFFIX, UPLOADED_SUFFIX):
+        if name.endswith(suffix):
+            return name[:-len(suffix)]
+    return None
+
+
+class SegmentUploader:
+    """Ships sealed result segments to object storage."""
+
+    def upload(self, path):
+        """Copy the segment file at path and return where it went."""
+        raise NotImplementedError
+
+    def list(self):
+        """File names of every segment uploaded, by any instance."""
+        raise NotImplementedError
+
+    def download(self, name, path):
+        """Copy the uploaded segment called name to path."""
+        raise NotImplementedError
+
+
+class GCSSegmentUploader(SegmentUploader):
+    """Uploads segments to a Cloud Storage bucket under prefix."""
+
+    def __init__(self, bucket_name, prefix="results", project=None):
+        from google.cloud import storage
+        self.client = storage.Client(project=project)
+        self.bucket_name = bucket_name
+        self.prefix = prefix.strip("/")
+
+    def upload(self, path):
+        blob_name = f"{self.prefix}/{os.path.basename(path)}" if self.prefix else os.path.basename(path)
+        self.client.bucket(self.bucket_name).blob(blob_name).upload_from_filename(
+            path, content_type="application/vnd.sqlite3"
+        )
+        return f"gs://{self.bucket_name}/{blob_name}"
+
+    def list(self):
+        prefix = f"{self.prefix}/" if self.prefix else None
+        return [
+            os.path.basename(blob.name)
+            for blob in self.client.list_blobs(self.bucket_name, prefix=prefix)
+            if segment_name(blob.name)
+        ]
+
+    def download(self, name, path):
+        blob_name = f"{self.prefix}/{name}" if self.prefix else name
+        self.client.bucket(self.bucket_name).blob(blob_name).download_to_filename(path)
+
+
+class LocalSegmentUploader(SegmentUploader):
+    """Filesystem stand-in for Cloud Storage."""
+
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def upload(self, path):
+        destination = os.path.join(self.root, os.path.basename(path))
+        shutil.copyfile(path, destination)
+        return destination
+
+    def list(self):
+        return [name for name in os.listdir(self.root) if segment_name(name)]
+
+    def download(self, name, path):
+        shutil.copyfile(os.path.join(self.root, name), path)
+
+
+def uploader_for(uri, project=None):
+    """The uploader for RESULT_UPLOAD_URI: gs://bucket/prefix or a local directory; None if unset."""
+    if not uri:
+        return None
+    if uri.startswith("gs://"):
+        bucket_name, _, prefix = uri[len("gs://"):].partition("/")
+        return GCSSegmentUploader(bucket_name, prefix, project=project)
+    return LocalSegmentUploader(uri)
+
+
+def connect(path, readonly=False):
+    if readonly:
+        return sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+    connection = sqlite3.connect(path, check_same_thread=False)
+    # WAL lets /results read the segment while the writer appends to it
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    connection.executescript(SCHEMA)
+    return connection
+
+
+class ResultStore:
+    """Every prediction served, appended in batches to local SQLite segments.
+
+    add() only appends to an in-memory buffer. A writer thread inserts the
+    buffer in one transaction once it holds RESULT_FLUSH_RECORDS records or
+    its oldest record is RESULT_FLUSH_SECONDS old. Each process writes its
+    own segment, so gunicorn workers never wait on each other's locks. A
+    segment that reaches RESULT_SEGMENT_RECORDS is sealed into a compacted
+    copy, handed to the uploader and replaced by a new one. Queries read
+    every segment in the directory, indexed by vein, label, time and image hash.
+    """
+
+    def __init__(self, root=RESULT_STORE_DIR, uploader=None, flush_records=RESULT_FLUSH_RECORDS,
+                 flush_seconds=RESULT_FLUSH_SECONDS, segment_records=RESULT_SEGMENT_RECORDS,
+                 keep_segments=RESULT_KEEP_SEGMENTS, clock=time.time):
+        self.root = root
+        self.uploader = uploader
+        self.flush_records = flush_records
+        self.flush_seconds = flush_seconds
+        self.segment_records = segment_records
+        self.keep_segments = keep_segments
+        self.clock = clock
+        self.condition = threading.Condition()
+        self.buffer = deque()
+        self.write_lock = threading.Lock()
+        self.connection = None
+        self.segment_path = None
+        self.segment_count = 0
+        self.thread = None
+        self.pid = None
+        self.written = 0
+        self.dropped = 0
+        self.flushes = 0
+        self.sealed = 0
+        self.uploaded = 0
+        self.upload_errors = 0
+        self.pruned = 0
+        self.flush_timings = deque(maxlen=TIMING_HISTORY)
+        self.listeners = []
+        self.segment_listeners = []
+        if root:
+            os.makedirs(root, exist_ok=True)
+
+    @property
+    def enabled(self):
+        return bool(self.root)
+
+    def add_listener(self, listener):
+        """Call listener(records) on the writer thread with each batch once it is written."""
+        self.listeners.append(listener)
+
+    def add_segment_listener(self, listener):
+        """Call listener(name) on the writer thread when a segment is opened, before any result is written to it."""
+        self.segment_listeners.append(listener)
+
+    def add(self, records):
+        """Buffer result records, dicts with the COLUMNS fields; never blocks on disk."""
+        if not self.enabled:
+            return
+        with self.condition:
+            room = BUFFER_LIMIT - len(self.buffer)
+            if room < len(records):
+                self.dropped += len(records) - max(room, 0)
+                records = records[:max(room, 0)]
+            self.buffer.extend(records)
+            if len(self.buffer) >= self.flush_records:
+                self.condition.notify()
+
+    def start(self):
+        """Start the writer thread; in each worker process, since threads do not survive fork."""
+        if not self.enabled:
+            return
+        with self.condition:
+            if self.thread is not None and self.pid == os.getpid():
+                return
+            self.pid = os.getpid()
+            # A segment opened before a fork belongs to the parent
+            self.connection = None
+            self.thread = threading.Thread(target=self._work, name="result-store-writer")
+            self.thread.daemon = True
+            self.thread.start()
+        # Whatever is still buffered at shutdown is written, not lost
+        atexit.register(self.flush)
+        # Segments sealed before a restart whose upload never finished
+        self._upload_in_background()
+
+    def _work(self):
+        while True:
+            with self.condition:
+                if len(self.buffer) < self.flush_records:
+                    self.condition.wait(self.flush_seconds)
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error("Could not write prediction results: %s", e)
+                time.sleep(self.flush_seconds)
+
+    def flush(self):
+        """Write everything buffered in one transaction, sealing the segment when it is full."""
+        with self.write_lock:
+            with self.condition:
+                batch = list(self.buffer)
+                self.buffer.clear()
+            if not batch:
+                return 0
+            start = time.perf_counter()
+            if self.connection is None:
+                self._open_segment()
+            try:
+                with self.connection:
+                    self.connection.executemany(
+                        f"INSERT INTO results ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})",
+                        [tuple(record.get(column) for column in COLUMNS) for record in batch]
+                    )
+            except sqlite3.Error:
+                # Keep the batch for the next flush rather than lose it
+                with self.condition:
+                    self.buffer.extendleft(reversed(batch))
+                raise
+            self.segment_count += len(batch)
+            self.written += len(batch)
+            self.flushes += 1
+            self.flush_timings.append(time.perf_counter() - start)
+            if self.segment_count >= self.segment_records:
+                self._seal_segment()
+        for listener in self.listeners:
+            try:
+                listener(batch)
+            except Exception as e:
+                logger.error("Result listener failed on %s results: %s", len(batch), e)
+        return len(batch)
+
+    def _open_segment(self):
+        name = f"results-{int(self.clock() * 1000)}-{os.getpid()}"
+        self.segment_path = os.path.join(self.root, name + ACTIVE_SUFFIX)
+        self.connection = connect(self.segment_path)
+        self.segment_count = 0
+        for listener in self.segment_listeners:
+            try:
+                listener(name)
+            except Exception as e:
+                logger.error("Segment listener failed on %s: %s", name, e)
+
+    def _seal_segment(self):
+        """Compact the full segment into its sealed file, drop the active one and start uploading."""
+        active = self.segment_path
+        sealed = active[:-len(ACTIVE_SUFFIX)] + SEALED_SUFFIX
+        self.connection.execute("VACUUM INTO ?", (sealed,))
+        self.connection.close()
+        self.connection = None
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(active + suffix):
+                os.remove(active + suffix)
+        self.sealed += 1
+        logger.info("Sealed result segment %s", os.path.basename(sealed))
+        self._upload_in_background()
+
+    def _upload_in_background(self):
+        if self.uploader:
+            thread = threading.Thread(target=self.upload_pending, name="result-store-upload")
+            thread.daemon = True
+            thread.start()
+        else:
+            self.prune()
+
+    def upload_pending(self):
+        """Upload sealed segments not yet uploaded, then drop the oldest uploaded ones beyond keep_segments."""
+        if not self.uploader:
+            return
+        for name in sorted(os.listdir(self.root)):
+            if not name.endswith(SEALED_SUFFIX):
+                continue
+            path = os.path.join(self.root, name)
+            try:
+                destination = self.uploader.upload(path)
+            except Exception as e:
+                self.upload_errors += 1
+                logger.warning("Could not upload result segment %s: %s", name, e)
+                continue
+            try:
+                os.replace(path, path[:-len(SEALED_SUFFIX)] + UPLOADED_SUFFIX)
+            except FileNotFoundError:
+                # Another worker uploaded and renamed it first
+                continue
+            self.uploaded += 1
+            logger.info("Uploaded result segment %s to %s", name, destination)
+        self.prune()
+
+    def prune(self):
+        """Drop the oldest segments beyond keep_segments, so the local disk (memory on Cloud Run) stays bounded.
+
+        With an uploader only uploaded segments are dropped; a segment still
+        waiting to be uploaded is kept. Without one, sealed segments have
+        nowhere else to go and the oldest are dropped.
+        """
+        suffixes = (UPLOADED_SUFFIX,) if self.uploader else (SEALED_SUFFIX, UPLOADED_SUFFIX)
+        # Names start with the time the segment was opened, so they sort oldest first
+        done = sorted(name for name in os.listdir(self.root) if name.endswith(suffixes))
+        for name in done[:max(0, len(done) - self.keep_segments)]:
+            try:
+                os.remove(os.path.join(self.root, name))
+                self.pruned += 1
+            except FileNotFoundError:
+                # Another worker dropped it first
+                pass
+
+    def segments(self):
+        """Paths of every segment on disk, from any worker, oldest first."""
+        if not self.enabled:
+            return []
+        return [
+            os.path.join(self.root, name)
+            for name in sorted(os.listdir(self.root))
+            if name.endswith((ACTIVE_SUFFIX, SEALED_SUFFIX, UPLOADED_SUFFIX))
+        ]
+
+    def query(self, vein_type=None, label=None, since=None, until=None, image_hash=None, limit=100):
+        """Stored results matching every filter given, newest first; records still buffered are not included."""
+        clauses, args = [], []
+        for clause, value in (("vein_type = ?", vein_type), ("label = ?", label), ("ts >= ?", since),
+                              ("ts < ?", until), ("image_hash = ?", image_hash)):
+            if value is not None:
+                clauses.append(clause)
+                args.append(value)
+        sql = f"SELECT {', '.join(COLUMNS)} FROM results"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY ts DESC LIMIT ?"
+        results = []
+        # Segments are named by when they were opened, so the newest are read first
+        for path in reversed(self.segments()):
+            try:
+                connection = connect(path, readonly=True)
+            except sqlite3.Error:
+                continue
+            try:
+                rows = connection.execute(sql, args + [limit]).fetchall()
+            except sqlite3.Error as e:
+                # A segment being sealed or removed by another worker
+                logger.debug("Skipped result segment %s: %s", path, e)
+                rows = []
+            finally:
+                connection.close()
+            results.extend(dict(zip(COLUMNS, row)) for row in rows)
+        results.sort(key=lambda record: record["ts"], reverse=True)
+        for record in results[:limit]:
+            record["cached"] = bool(record["cached"])
+            record["predictions"] = json.loads(record["predictions"]) if record["predictions"] else None
+        return results[:limit]
+
+    def stats(self):
+        with self.condition:
+            buffered = len(self.buffer)
+        timings = sorted(self.flush_timings)
+        stats = {
+            "enabled": self.enabled,
+            "buffered": buffered,
+            "written": self.written,
+            "dropped": self.dropped,
+            "flushes": self.flushes,
+            "segments": len(self.segments()),
+            "active_segment_records": self.segment_count,
+            "sealed": self.sealed,
+            "uploaded": self.uploaded,
+            "upload_errors": self.upload_errors,
+            "pruned": self.pruned,
+        }
+        if timings:
+            stats.update({
+                f"flush_p{int(fraction * 100)}_ms":
+                    round(timings[min(len(timings) - 1, int(fraction * len(timings)))] * 1000, 1)
+                for fraction in (0.5, 0.9)
+            })
+        return stats
+
+
+def result_records(vein_type, predictions, image_hashes, backend, model_version=None, region=None,
+                   latency_ms=None, cached=False, ts=None):
+    """One store record per instance from a /predict response's predictions."""
+    ts = ts or time.time()
+    records = []
+    for prediction, image_hash in zip(predictions, image_hashes):
+        names, confidences = prediction.get("displayNames", []), prediction.get("confidences", [])
+        top = max(zip(confidences, names)) if names and len(names) == len(confidences) else (None, None)
+        records.append({
+            "ts": ts,
+            "vein_type": vein_type,
+            "label": top[1],
+            "confidence": top[0],
+            "backend": backend,
+            "model_version": model_version,
+            "region": region,
+            "latency_ms": latency_ms,
+            "cached": int(cached),
+            "image_hash": image_hash,
+            "predictions": json.dumps({"displayNames": names, "confidences": confidences}),
+        })
+    return records
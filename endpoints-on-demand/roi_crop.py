@@ -0,0 +1,206 @@
+import io
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict, deque
+
+from frames import Frame
+
+logger = logging.getLogger(__name__)
+
+CROP_ENABLED = os.environ.get("ROI_CROP", "true").lower() == "true"
+LAYOUT_CACHE_SIZE = int(os.environ.get("ROI_LAYOUT_CACHE_SIZE", "64"))  # Device layouts (frame sizes) remembered
+BLOCK = 16  # Frames are classified in BLOCK x BLOCK pixel blocks
+IMAGE_LEVELS = (30, 220)  # Grey levels of image content; UI text and chrome are near black or white
+IMAGE_FILL = 0.3  # Share of a block at image levels for it to be image content
+MIN_TEXTURE = 8.0  # Grey-level standard deviation of a block; flat UI panels have less
+MIN_NEIGHBOURS = 4  # Of 8; isolated blocks are text, not image
+MIN_COMPONENT = 12  # Blocks in a connected group of image blocks for it to be part of the image
+MIN_SAVING = 0.1  # A box must leave out this share of the frame to be worth a re-encode
+MAX_OUTSIDE_GROWTH = 0.08  # A cached box is re-detected once this much more of a frame's image pixels fall outside it
+JPEG_QUALITY = 90
+TIMING_HISTORY = 500
+
+
+def image_blocks(gray):
+    """Boolean map of the BLOCK-sized blocks that hold ultrasound image rather than UI chrome.
+
+    B-mode and spectral Doppler blocks are mostly mid-grey and speckled;
+    text is black and white, and colour bars and panels are flat. Blocks
+    with fewer than MIN_NEIGHBOURS image neighbours are dropped as stray text.
+    """
+    import numpy as np
+    height, width = gray.shape[0] // BLOCK, gray.shape[1] // BLOCK
+    blocks = gray[:height * BLOCK, :width * BLOCK].reshape(height, BLOCK, width, BLOCK)
+    low, high = IMAGE_LEVELS
+    image = (((blocks > low) & (blocks < high)).mean(axis=(1, 3)) >= IMAGE_FILL) \
+        & (blocks.std(axis=(1, 3)) >= MIN_TEXTURE)
+    padded = np.pad(image, 1)
+    neighbours = sum(
+        padded[1 + dy:height + 1 + dy, 1 + dx:width + 1 + dx]
+        for dy in (-1, 0, 1) for dx in (-1, 0, 1) if dy or dx
+    )
+    return image & (neighbours >= MIN_NEIGHBOURS)
+
+
+def large_components(blocks, min_size):
+    """blocks with only the 8-connected groups of at least min_size blocks kept."""
+    import numpy as np
+    kept = np.zeros_like(blocks)
+    seen = np.zeros_like(blocks)
+    height, width = blocks.shape
+    for y, x in zip(*np.nonzero(blocks)):
+        if seen[y, x]:
+            continue
+        seen[y, x] = True
+        component, stack = [], [(y, x)]
+        while stack:
+            cy, cx = stack.pop()
+            component.append((cy, cx))
+            for ny in range(max(0, cy - 1), min(height, cy + 2)):
+                for nx in range(max(0, cx - 1), min(width, cx + 2)):
+                    if blocks[ny, nx] and not seen[ny, nx]:
+                        seen[ny, nx] = True
+                        stack.append((ny, nx))
+        if len(component) >= min_size:
+            kept[tuple(zip(*component))] = True
+    return kept
+
+
+def detect_box(gray):
+    """(left, top, right, bottom) around the B-mode image and Doppler strip, with a block of margin, or None.
+
+    Image blocks in groups smaller than MIN_COMPONENT, such as text on a
+    shaded header or a grey-scale bar, are left out.
+    """
+    import numpy as np
+    blocks = large_components(image_blocks(gray), MIN_COMPONENT)
+    # Row and column projections give the extent of the image blocks
+    rows, columns = np.flatnonzero(blocks.any(axis=1)), np.flatnonzero(blocks.any(axis=0))
+    if not len(rows):
+        return None
+    height, width = gray.shape
+    return (
+        max(0, (int(columns[0]) - 1) * BLOCK),
+        max(0, (int(rows[0]) - 1) * BLOCK),
+        min(width, (int(columns[-1]) + 2) * BLOCK),
+        min(height, (int(rows[-1]) + 2) * BLOCK),
+    )
+
+
+def outside_share(gray, box, step=4):
+    """Share of a frame's image-level pixels outside box, sampled every step pixels."""
+    import numpy as np
+    low, high = IMAGE_LEVELS
+    sample = gray[::step, ::step]
+    image = (sample > low) & (sample < high)
+    total = image.sum()
+    if not total:
+        return 0.0
+    left, top, right, bottom = (value // step for value in box)
+    return float(1 - image[top:bottom, left:right].sum() / total)
+
+
+class ROICropper:
+    """Crops frames to their ultrasound image before they are sent to a model.
+
+    Scanner captures include the UI around the image: patient and
+    acquisition text, scales, colour bars. The box around the B-mode image
+    and Doppler strip is found from block projections of the grey-level
+    frame. It is cached per device layout, keyed by frame size. When more
+    of a frame's image falls outside the cached box than did when it was
+    detected, it is re-detected and the layout's box grows to cover both.
+    """
+
+    def __init__(self, enabled=CROP_ENABLED, capacity=LAYOUT_CACHE_SIZE):
+        self.enabled = enabled
+        self.capacity = capacity
+        self.lock = threading.Lock()
+        self.layouts = OrderedDict()  # {(width, height): (box or None, outside share when detected)}
+        self.timings = deque(maxlen=TIMING_HISTORY)
+        self.frames = 0
+        self.cropped = 0
+        self.layout_hits = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def _cached_box(self, layout):
+        with self.lock:
+            if layout not in self.layouts:
+                return False, None, 0.0
+            self.layouts.move_to_end(layout)
+            return (True,) + self.layouts[layout]
+
+    def _store_box(self, layout, box, outside):
+        with self.lock:
+            self.layouts[layout] = (box, outside)
+            self.layouts.move_to_end(layout)
+            while len(self.layouts) > self.capacity:
+                self.layouts.popitem(last=False)
+
+    def crop(self, image):
+        """Return (bytes to send, details) for encoded bytes or a Frame; frames with nothing worth cropping are returned unchanged."""
+        # Imported here, off the startup path
+        import numpy as np
+        start = time.perf_counter()
+        frame = Frame.of(image)
+        image_bytes = frame.data
+        # The layout comes from the header; a layout known to have nothing to crop is never decoded
+        layout = frame.size
+        cached, box, outside = self._cached_box(layout)
+        gray = None if cached and box is None else np.asarray(frame.gray(), dtype=np.int16)
+        # UI text and bars always leave some image-level pixels outside; only a rise means the image moved
+        if not cached or (box is not None and outside_share(gray, box) > outside + MAX_OUTSIDE_GROWTH):
+            detected = detect_box(gray)
+            if cached and detected:
+                # Same layout, image reaching further (a taller spectrum, say): grow the layout's box
+                detected = (min(box[0], detected[0]), min(box[1], detected[1]),
+                            max(box[2], detected[2]), max(box[3], detected[3]))
+            area = (detected[2] - detected[0]) * (detected[3] - detected[1]) if detected else 0
+            box = detected if detected and area <= (1 - MIN_SAVING) * layout[0] * layout[1] else None
+            self._store_box(layout, box, outside_share(gray, box) if box else 0.0)
+            cached = False
+        output = image_bytes
+        if box is not None:
+            buffer = io.BytesIO()
+            frame.rgb().crop(box).save(buffer, "JPEG", quality=JPEG_QUALITY)
+            if buffer.tell() < len(image_bytes):
+                output = buffer.getvalue()
+        seconds = time.perf_counter() - start
+        with self.lock:
+            self.frames += 1
+            self.cropped += output is not image_bytes
+            self.layout_hits += cached
+            self.bytes_in += len(image_bytes)
+            self.bytes_out += len(output)
+            self.timings.append(seconds)
+        return output, {
+            "box": list(box) if output is not image_bytes else None,
+            "layoutCached": cached,
+            "bytesIn": len(image_bytes),
+            "bytesOut": len(output),
+            "preprocessMs": round(seconds * 1000, 1),
+        }
+
+    def stats(self):
+        with self.lock:
+            timings = sorted(self.timings)
+            stats = {
+                "enabled": self.enabled,
+                "frames": self.frames,
+                "cropped": self.cropped,
+                "layouts": len(self.layouts),
+                "layout_hit_rate": round(self.layout_hits / self.frames, 4) if self.frames else None,
+                "bytes_in": self.bytes_in,
+                "bytes_out": self.bytes_out,
+                "bytes_saved": self.bytes_in - self.bytes_out,
+                "saved_fraction": round(1 - self.bytes_out / self.bytes_in, 4) if self.bytes_in else None,
+            }
+            if timings:
+                stats.update({
+                    f"preprocess_p{int(fraction * 100)}_ms":
+                        round(timings[min(len(timings) - 1, int(fraction * len(timings)))] * 1000, 1)
+                    for fraction in (0.5, 0.9, 0.99)
+                })
+            return stats
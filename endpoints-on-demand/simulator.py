@@ -0,0 +1,436 @@
+#!/usr/bin/env python3
+"""Offline trace-replay simulator for the endpoint pool and timeout policy.
+
+Replays recorded request traces against the real EndpointPool, adaptive
+timeout and lifecycle sweep in endpoint_pool.py, driving them from a virtual
+clock with modeled deploy, hibernated-resume and prediction times. Idle
+endpoints are hibernated and later deleted by sweep_idle(), run as often as
+the service's lifecycle sweep; a request for a hibernated endpoint resumes it
+on the faster deploy-only path. Each policy candidate reports its
+cold-start rate, latency percentiles and endpoint-minutes, and a parameter
+sweep runs candidates in parallel across cores.
+
+Trace sources:
+  - JSONL with one request per line (`ts`/`timestamp` and `vein_type`/`veinType`),
+    including the capture file main.py writes when TRACE_CAPTURE_PATH is set.
+    Lines without a timestamp (e.g. plain prediction payloads) are spaced
+    --interarrival seconds apart.
+  - server.js logs (server.log / server_output.log).
+
+Usage:
+  python simulator.py trace.jsonl --min-timeout 3 5 10 --max-timeout 20 30 --max-endpoints 1 2 \
+      --hibernated-delete 60 1440
+"""
+
+import argparse
+import heapq
+import itertools
+import json
+import math
+import os
+import random
+import re
+import sys
+from collections import defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import endpoint_pool
+from endpoint_pool import (
+    TIER_DELETED,
+    TIER_HIBERNATED,
+    EndpointPool,
+    record_usage,
+    sweep_idle,
+)
+from reaper import EndpointReaper
+
+VEIN_TYPES = ("hepatic", "portal", "renal")
+
+# Policy knobs the simulator may override, mapped to endpoint_pool attributes
+POLICY_FIELDS = {
+    "min_timeout": "MIN_TIMEOUT_MINUTES",
+    "max_timeout": "MAX_TIMEOUT_MINUTES",
+    "default_timeout": "DEFAULT_TIMEOUT_MINUTES",
+    "max_endpoints": "MAX_ENDPOINTS_PER_TYPE",
+    "low_threshold": "LOW_USAGE_THRESHOLD",
+    "high_threshold": "HIGH_USAGE_THRESHOLD",
+    "hibernated_delete": "HIBERNATED_DELETE_MINUTES",
+}
+SWEEP_SECONDS = 60  # As the service's LIFECYCLE_SWEEP_SECONDS
+
+LOG_TIMESTAMP_RE = re.compile(r"^\[(\d{4}-\d{2}-\d{2}T[\d:.]+Z)\]")
+LOG_PREDICT_RE = re.compile(r"Prediction request for (\w+) vein", re.IGNORECASE)
+
+
+def parse_timestamp(value):
+    """Convert an epoch number or ISO-8601 string to epoch seconds."""
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    text = str(value).strip()
+    if text.endswith("Z"):
+        text = text[:-1] + "+00:00"
+    return datetime.fromisoformat(text).timestamp()
+
+
+def load_jsonl_trace(path, interarrival=60.0):
+    """Load (timestamp, vein_type) records from a JSONL file."""
+    records = []
+    synthetic_ts = 0.0
+    with open(path, "r") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            metadata = entry.get("metadata") or {}
+            vein_type = (entry.get("vein_type") or entry.get("veinType")
+                         or metadata.get("veinType") or "hepatic")
+            ts = parse_timestamp(entry.get("ts", entry.get("timestamp")))
+            if ts is None:
+                ts = synthetic_ts
+                synthetic_ts += interarrival
+            records.append((ts, vein_type.lower()))
+    return records
+
+
+def load_server_log(path):
+    """Load (timestamp, vein_type) records from a server.js log."""
+    records = []
+    last_ts = None
+    with open(path, "r", errors="replace") as f:
+        for line in f:
+            ts_match = LOG_TIMESTAMP_RE.match(line)
+            if ts_match:
+                last_ts = parse_timestamp(ts_match.group(1))
+                continue
+            predict_match = LOG_PREDICT_RE.search(line)
+            if predict_match and last_ts is not None:
+                records.append((last_ts, predict_match.group(1).lower()))
+    return records
+
+
+def load_trace(paths, interarrival=60.0):
+    """Load and merge traces, normalized so the first request is at t=0."""
+    records = []
+    for path in paths:
+        if path.endswith((".log", ".out")):
+            records.extend(load_server_log(path))
+        else:
+            records.extend(load_jsonl_trace(path, interarrival))
+    records = [r for r in records if r[1] in VEIN_TYPES]
+    records.sort()
+    if not records:
+        return []
+    start = records[0][0]
+    return [(ts - start, vein_type) for ts, vein_type in records]
+
+
+class DeployModel:
+    """Models deploy durations as log-normal, or resamples observed durations.
+
+    A cold deploy creates the endpoint and deploys the model; resuming a
+    hibernated endpoint only deploys the model, so it has its own median and
+    samples.
+    """
+
+    def __init__(self, median_minutes=8.0, sigma=0.25, samples=None, seed=0,
+                 resume_median_minutes=6.0, resume_samples=None):
+        self.median_seconds = median_minutes * 60
+        self.resume_median_seconds = resume_median_minutes * 60
+        self.sigma = sigma
+        self.samples = list(samples or [])
+        self.resume_samples = list(resume_samples or [])
+        self.rng = random.Random(seed)
+
+    def sample(self, tier=TIER_DELETED):
+        samples = self.resume_samples if tier == TIER_HIBERNATED else self.samples
+        if samples:
+            return self.rng.choice(samples)
+        median_seconds = self.resume_median_seconds if tier == TIER_HIBERNATED else self.median_seconds
+        return median_seconds * math.exp(self.rng.gauss(0.0, self.sigma))
+
+
+class SimEndpoint:
+    """Stand-in for aiplatform.Endpoint that records the spans a model was deployed (billed)."""
+
+    def __init__(self, sim, endpoint_id):
+        self.sim = sim
+        self.endpoint_id = endpoint_id
+        self.spans = [[sim.now, None]]
+
+    def redeploy(self):
+        """Start billing again when a hibernated endpoint is resumed."""
+        self.spans.append([self.sim.now, None])
+
+    def undeploy_all(self):
+        if self.spans[-1][1] is None:
+            self.spans[-1][1] = self.sim.now
+
+    def delete(self):
+        self.undeploy_all()
+
+    def billed_seconds(self, now):
+        return sum((end if end is not None else now) - start for start, end in self.spans)
+
+
+class Simulation:
+    """Discrete-event replay of one trace under one policy."""
+
+    def __init__(self, trace, policy, deploy_model, predict_seconds=1.5):
+        self.trace = trace
+        self.policy = policy
+        self.deploy_model = deploy_model
+        self.predict_seconds = predict_seconds
+        self.now = 0.0
+        self.events = []
+        self.seq = itertools.count()
+        self.waiting = defaultdict(deque)  # {vein_type: deque of (arrival, cold)}
+        self.deploying = defaultdict(int)  # {vein_type: deploys in flight}
+        self.all_endpoints = []
+        self.latencies = []
+        self.cold_starts = 0
+        self.resumes = 0
+        self.hibernations = 0
+        self.deletions = 0
+        self.arrivals_left = len(trace)
+        self.next_endpoint = itertools.count(1)
+
+    def schedule(self, at, kind, *payload):
+        heapq.heappush(self.events, (at, next(self.seq), kind, payload))
+
+    def reset_pool(self):
+        """Point the real pool at this simulation's clock and policy."""
+        endpoint_pool.endpoints.clear()
+        endpoint_pool.hibernated.clear()
+        endpoint_pool.usage_history.clear()
+        endpoint_pool.clock = lambda: self.now
+        # Reap inline so deletions land at the simulated time they are decided
+        endpoint_pool.reaper = EndpointReaper(workers=0)
+        for field, attr in POLICY_FIELDS.items():
+            if field in self.policy:
+                setattr(endpoint_pool, attr, self.policy[field])
+
+    def run(self):
+        self.reset_pool()
+        for ts, vein_type in self.trace:
+            self.schedule(ts, "arrival", vein_type)
+        if self.trace:
+            self.schedule(self.trace[0][0] + SWEEP_SECONDS, "sweep")
+
+        while self.events:
+            self.now, _, kind, payload = heapq.heappop(self.events)
+            getattr(self, f"on_{kind}")(*payload)
+
+        return self.report()
+
+    def on_arrival(self, vein_type):
+        self.arrivals_left -= 1
+        record_usage(vein_type)
+        endpoint_id = EndpointPool.get_available_endpoint(vein_type)
+        if endpoint_id:
+            self.start_prediction(vein_type, endpoint_id, self.now, cold=False)
+            return
+
+        pool_size = len(endpoint_pool.endpoints.get(vein_type, {})) + self.deploying[vein_type]
+        if self.deploying[vein_type] or pool_size >= endpoint_pool.MAX_ENDPOINTS_PER_TYPE:
+            # Wait for an in-flight deploy or for a busy endpoint to free up
+            cold = self.deploying[vein_type] > 0
+            self.waiting[vein_type].append((self.now, cold))
+            return
+
+        self.waiting[vein_type].append((self.now, True))
+        self.deploying[vein_type] += 1
+        hibernated = endpoint_pool.hibernated.get(vein_type)
+        if hibernated:
+            # Like create_endpoint: a hibernated endpoint resumes on the deploy-only path
+            endpoint = EndpointPool.resume_endpoint(vein_type, next(iter(hibernated)))
+            endpoint.redeploy()
+            self.resumes += 1
+            tier = TIER_HIBERNATED
+        else:
+            endpoint = SimEndpoint(self, f"{vein_type}-{next(self.next_endpoint)}")
+            self.all_endpoints.append(endpoint)
+            tier = TIER_DELETED
+        self.schedule(self.now + self.deploy_model.sample(tier), "deploy_done", vein_type, endpoint)
+
+    def on_deploy_done(self, vein_type, endpoint):
+        self.deploying[vein_type] -= 1
+        EndpointPool.add_endpoint(vein_type, endpoint.endpoint_id, endpoint)
+        if self.waiting[vein_type]:
+            arrival, cold = self.waiting[vein_type].popleft()
+            self.start_prediction(vein_type, endpoint.endpoint_id, arrival, cold)
+        else:
+            self.release(vein_type, endpoint.endpoint_id)
+
+    def on_predict_done(self, vein_type, endpoint_id, arrival, cold):
+        self.latencies.append(self.now - arrival)
+        if cold:
+            self.cold_starts += 1
+        self.release(vein_type, endpoint_id)
+        while self.waiting[vein_type]:
+            next_id = EndpointPool.get_available_endpoint(vein_type)
+            if not next_id:
+                break
+            arrival, cold = self.waiting[vein_type].popleft()
+            self.start_prediction(vein_type, next_id, arrival, cold)
+
+    def on_sweep(self):
+        """The service's lifecycle sweep: hibernate idle warm endpoints, delete long-hibernated ones."""
+        for _, _, tier in sweep_idle():
+            if tier == TIER_HIBERNATED:
+                self.hibernations += 1
+            else:
+                self.deletions += 1
+        # Keep sweeping until the trace is done and every endpoint has been deleted
+        if self.arrivals_left or any(self.deploying.values()) \
+                or any(endpoint_pool.endpoints.values()) or any(endpoint_pool.hibernated.values()):
+            self.schedule(self.now + SWEEP_SECONDS, "sweep")
+
+    def start_prediction(self, vein_type, endpoint_id, arrival, cold):
+        self.schedule(self.now + self.predict_seconds, "predict_done",
+                      vein_type, endpoint_id, arrival, cold)
+
+    def release(self, vein_type, endpoint_id):
+        """Release like the service does; the sweep hibernates the endpoint once it is idle."""
+        EndpointPool.release_endpoint(vein_type, endpoint_id)
+
+    def report(self):
+        endpoint_seconds = sum(e.billed_seconds(self.now) for e in self.all_endpoints)
+        total = len(self.latencies)
+        return {
+            "policy": self.policy,
+            "requests": total,
+            "cold_starts": self.cold_starts,
+            "cold_start_rate": self.cold_starts / total if total else 0.0,
+            "latency_p50": percentile(self.latencies, 50),
+            "latency_p90": percentile(self.latencies, 90),
+            "latency_p99": percentile(self.latencies, 99),
+            "deploys": len(self.all_endpoints),
+            "resumes": self.resumes,
+            "hibernations": self.hibernations,
+            "deletions": self.deletions,
+            "endpoint_minutes": endpoint_seconds / 60,
+        }
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile; 0.0 for an empty list."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, int(math.ceil(pct / 100 * len(ordered))))
+    return ordered[rank - 1]
+
+
+def run_policy(args):
+    """Worker entry point: simulate a single policy candidate."""
+    trace, policy, deploy_options, predict_seconds = args
+    return Simulation(trace, policy, DeployModel(**deploy_options), predict_seconds).run()
+
+
+def build_policies(grid):
+    """Expand {field: [values]} into a list of policy dicts."""
+    fields = [field for field, values in grid.items() if values]
+    combos = itertools.product(*(grid[field] for field in fields))
+    policies = [dict(zip(fields, combo)) for combo in combos]
+    # Skip incoherent candidates where the short timeout exceeds the long one
+    return [
+        p for p in policies
+        if p.get("min_timeout", 0) <= p.get("max_timeout", float("inf"))
+    ]
+
+
+def sweep(trace, policies, deploy_options, predict_seconds=1.5, workers=None):
+    """Run every policy candidate in parallel and return their reports."""
+    jobs = [(trace, policy, deploy_options, predict_seconds) for policy in policies]
+    if workers == 1 or len(jobs) <= 1:
+        return [run_policy(job) for job in jobs]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(run_policy, jobs))
+
+
+def print_reports(reports):
+    """Print reports as a table, cheapest endpoint-minutes first."""
+    header = f"{'policy':<60} {'cold%':>6} {'p50 s':>8} {'p90 s':>8} {'p99 s':>8} {'ep-min':>9}"
+    print(header)
+    print("-" * len(header))
+    for r in sorted(reports, key=lambda r: (r["endpoint_minutes"], r["cold_start_rate"])):
+        policy = ", ".join(f"{k}={v}" for k, v in r["policy"].items())
+        print(f"{policy:<60} {r['cold_start_rate'] * 100:>6.1f} {r['latency_p50']:>8.1f} "
+              f"{r['latency_p90']:>8.1f} {r['latency_p99']:>8.1f} {r['endpoint_minutes']:>9.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay request traces against endpoint pool policies")
+    parser.add_argument("traces", nargs="+", help="JSONL traces or server.js logs")
+    parser.add_argument("--interarrival", type=float, default=60.0,
+                        help="Seconds between JSONL records that carry no timestamp")
+    parser.add_argument("--min-timeout", type=int, nargs="*", default=[endpoint_pool.MIN_TIMEOUT_MINUTES])
+    parser.add_argument("--max-timeout", type=int, nargs="*", default=[endpoint_pool.MAX_TIMEOUT_MINUTES])
+    parser.add_argument("--default-timeout", type=int, nargs="*", default=[endpoint_pool.DEFAULT_TIMEOUT_MINUTES])
+    parser.add_argument("--max-endpoints", type=int, nargs="*", default=[endpoint_pool.MAX_ENDPOINTS_PER_TYPE])
+    parser.add_argument("--low-threshold", type=int, nargs="*", default=[endpoint_pool.LOW_USAGE_THRESHOLD])
+    parser.add_argument("--high-threshold", type=int, nargs="*", default=[endpoint_pool.HIGH_USAGE_THRESHOLD])
+    parser.add_argument("--hibernated-delete", type=int, nargs="*", default=[endpoint_pool.HIBERNATED_DELETE_MINUTES],
+                        help="Minutes a hibernated endpoint is kept before it is deleted")
+    parser.add_argument("--deploy-minutes", type=float, default=8.0, help="Median modeled deploy time")
+    parser.add_argument("--deploy-sigma", type=float, default=0.25, help="Log-normal spread of deploy time")
+    parser.add_argument("--deploy-samples", help="JSON file with a list of observed deploy durations (seconds)")
+    parser.add_argument("--resume-minutes", type=float, default=6.0,
+                        help="Median modeled time to redeploy the model onto a hibernated endpoint")
+    parser.add_argument("--resume-samples", help="JSON file with a list of observed hibernated-resume durations (seconds)")
+    parser.add_argument("--predict-seconds", type=float, default=1.5, help="Warm prediction latency")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--json", action="store_true", help="Print reports as JSON")
+    args = parser.parse_args()
+
+    trace = load_trace(args.traces, args.interarrival)
+    if not trace:
+        print("No requests found in the given traces")
+        sys.exit(1)
+
+    samples = resume_samples = None
+    if args.deploy_samples:
+        with open(args.deploy_samples, "r") as f:
+            samples = json.load(f)
+    if args.resume_samples:
+        with open(args.resume_samples, "r") as f:
+            resume_samples = json.load(f)
+
+    policies = build_policies({
+        "min_timeout": args.min_timeout,
+        "max_timeout": args.max_timeout,
+        "default_timeout": args.default_timeout,
+        "max_endpoints": args.max_endpoints,
+        "low_threshold": args.low_threshold,
+        "high_threshold": args.high_threshold,
+        "hibernated_delete": args.hibernated_delete,
+    })
+    deploy_options = {
+        "median_minutes": args.deploy_minutes,
+        "sigma": args.deploy_sigma,
+        "samples": samples,
+        "seed": args.seed,
+        "resume_median_minutes": args.resume_minutes,
+        "resume_samples": resume_samples,
+    }
+
+    print(f"Replaying {len(trace)} requests against {len(policies)} policies "
+          f"on {args.workers} workers", file=sys.stderr)
+    reports = sweep(trace, policies, deploy_options, args.predict_seconds, args.workers)
+
+    if args.json:
+        print(json.dumps(reports, indent=2))
+    else:
+        print_reports(reports)
+
+
+if __name__ == "__main__":
+    main()
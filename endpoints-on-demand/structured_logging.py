@@ -0,0 +1,189 @@
+import os
+import sys
+import atexit
+import json
+import time
+import queue
+import random
+import logging
+import threading
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.environ.get("LOG_FORMAT", "json").lower()  # json, or text for reading locally
+LOG_SAMPLE_RATE = float(os.environ.get("LOG_SAMPLE_RATE", "0.05"))  # Share of sampled success records kept
+LOG_ERROR_BURST = int(os.environ.get("LOG_ERROR_BURST", "5"))  # Warnings and errors kept per call site per window
+LOG_ERROR_WINDOW_SECONDS = float(os.environ.get("LOG_ERROR_WINDOW_SECONDS", "60"))
+LOG_QUEUE_SIZE = 10000  # Records waiting for the writer thread; more are dropped, not waited on
+
+# Attributes every LogRecord has; anything else was passed in extra=
+RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "taskName"}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, severity, logger, message and any extra= fields.
+
+    severity is the field Cloud Logging reads the level from.
+    """
+
+    def format(self, record):
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "severity": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in RECORD_ATTRIBUTES and key not in ("sample",):
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class SuccessSampler(logging.Filter):
+    """Keeps LOG_SAMPLE_RATE of the records logged with extra={"sample": True}.
+
+    Those are the per-request success records; warnings and errors are never sampled.
+    """
+
+    def __init__(self, rate=LOG_SAMPLE_RATE):
+        super().__init__()
+        self.rate = rate
+        self.dropped = 0
+
+    def filter(self, record):
+        if not getattr(record, "sample", False) or record.levelno >= logging.WARNING:
+            return True
+        if random.random() < self.rate:
+            record.sample_rate = self.rate
+            return True
+        self.dropped += 1
+        return False
+
+
+class ErrorRateLimiter(logging.Filter):
+    """Lets at most burst warnings and errors from one call site through per window.
+
+    A failing region or credential problem logs the same error on every
+    request; the first record of the next window carries how many were
+    suppressed in between.
+    """
+
+    def __init__(self, burst=LOG_ERROR_BURST, window=LOG_ERROR_WINDOW_SECONDS, clock=time.monotonic):
+        super().__init__()
+        self.burst = burst
+        self.window = window
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.sites = {}  # {(logger, path, line): [window start, count, suppressed]}
+        self.suppressed = 0
+
+    def filter(self, record):
+        if record.levelno < logging.WARNING:
+            return True
+        site = (record.name, record.pathname, record.lineno)
+        now = self.clock()
+        with self.lock:
+            state = self.sites.get(site)
+            if state is None or now - state[0] >= self.window:
+                suppressed = state[2] if state else 0
+                self.sites[site] = [now, 1, 0]
+                if suppressed:
+                    record.suppressed = suppressed
+                return True
+            if state[1] < self.burst:
+                state[1] += 1
+                return True
+            state[2] += 1
+            self.suppressed += 1
+            return False
+
+
+class DroppingQueueHandler(QueueHandler):
+    """Puts records on the queue without formatting them or waiting for room.
+
+    The message is only merged with its arguments here, so the writer thread
+    does the JSON encoding and the I/O. A full queue drops the record.
+    """
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            # Tracebacks hold frames of this thread; render them before it moves on
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class LogPipeline:
+    """Root logging that hands records to a background QueueListener.
+
+    Request threads only run the filters and a queue put; formatting and
+    writing to stderr happen on the listener's thread. After a fork (gunicorn
+    preloads the app in its master) the child gets a fresh queue and listener,
+    since the parent's thread does not survive it.
+    """
+
+    def __init__(self, level=LOG_LEVEL, fmt=LOG_FORMAT):
+        self.level = level
+        self.output = logging.StreamHandler(sys.stderr)
+        self.output.setFormatter(JsonFormatter() if fmt == "json"
+                                 else logging.Formatter("%(levelname)s:%(name)s:%(message)s"))
+        self.sampler = SuccessSampler()
+        self.limiter = ErrorRateLimiter()
+        self.handler = None
+        self.listener = None
+
+    def start(self):
+        root = logging.getLogger()
+        root.setLevel(self.level)
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        self.handler = DroppingQueueHandler(queue.Queue(LOG_QUEUE_SIZE))
+        self.handler.addFilter(self.sampler)
+        self.handler.addFilter(self.limiter)
+        root.addHandler(self.handler)
+        self._listen()
+        atexit.register(self.stop)
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._after_fork)
+        return self
+
+    def _listen(self):
+        self.listener = QueueListener(self.handler.queue, self.output)
+        self.listener.start()
+
+    def _after_fork(self):
+        self.handler.queue = queue.Queue(LOG_QUEUE_SIZE)
+        self._listen()
+
+    def stop(self):
+        """Write out what is still queued; for shutdown."""
+        if self.listener:
+            self.listener.stop()
+            self.listener = None
+
+    def stats(self):
+        return {
+            "level": logging.getLevelName(logging.getLogger().level),
+            "queued": self.handler.queue.qsize() if self.handler else 0,
+            "dropped_queue_full": self.handler.dropped if self.handler else 0,
+            "sampled_out": self.sampler.dropped,
+            "sample_rate": self.sampler.rate,
+            "errors_suppressed": self.limiter.suppressed,
+        }
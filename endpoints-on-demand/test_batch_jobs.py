@@ -0,0 +1,96 @@
+import os
+import threading
+import time
+
+from batch_jobs import (
+    CANCELLED,
+    SUCCEEDED,
+    TERMINAL_STATES,
+    BatchJobManager,
+    LocalBatchRunner,
+    LocalBatchStore,
+    is_shard,
+)
+
+
+def write_images(root, count):
+    paths = []
+    for index in range(count):
+        path = os.path.join(root, f"frame-{index}.png")
+        with open(path, "wb") as f:
+            f.write(bytes([index]))
+        paths.append(path)
+    return paths
+
+
+def wait_for(manager, job_id, timeout=5):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = manager.get(job_id)
+        if job["state"] in TERMINAL_STATES:
+            return job
+        time.sleep(0.02)
+    raise AssertionError(f"Job {job_id} still {manager.get(job_id)['state']}")
+
+
+def predict(vein_type, instances):
+    return [{"displayNames": [f"{vein_type.capitalize()} Vein: Normal"], "confidences": [0.9]} for _ in instances]
+
+
+def test_submit_writes_shards_and_streams_every_result(tmp_path):
+    images = write_images(str(tmp_path), 5)
+    manager = BatchJobManager(LocalBatchStore(str(tmp_path / "batch")), LocalBatchRunner(predict, shard_size=2),
+                              poll_interval=0.02)
+    job = manager.submit("hepatic", [{"content": f"file://{path}"} for path in images])
+    assert job["instance_count"] == 5
+
+    job = wait_for(manager, job["job_id"])
+    assert job["state"] == SUCCEEDED
+    _, shards = manager.completed_shards(job["job_id"])
+    # The AutoML layout: predictions_00001.jsonl, ... under prediction-<model>-<timestamp>/
+    assert [os.path.basename(shard) for shard in shards] == \
+        ["predictions_00001.jsonl", "predictions_00002.jsonl", "predictions_00003.jsonl"]
+    assert all(is_shard(shard) for shard in shards)
+
+    records = list(manager.stream_results(shards))
+    assert [record["instance"]["content"] for record in records] == [f"file://{path}" for path in images]
+    assert records[0]["prediction"]["displayNames"] == ["Hepatic Vein: Normal"]
+    assert len(list(manager.stream_results(shards[2:]))) == 1
+
+
+def test_job_records_are_read_back_by_another_manager(tmp_path):
+    images = write_images(str(tmp_path), 2)
+    store = LocalBatchStore(str(tmp_path / "batch"))
+    manager = BatchJobManager(store, LocalBatchRunner(predict), poll_interval=0.02)
+    job = wait_for(manager, manager.submit("portal", [{"content": path} for path in images])["job_id"])
+
+    other = BatchJobManager(LocalBatchStore(str(tmp_path / "batch")), LocalBatchRunner(predict))
+    assert other.get(job["job_id"])["state"] == SUCCEEDED
+    assert other.get(job["job_id"])["shards"] == job["shards"]
+    assert other.get("unknown") is None
+    # Local jobs end with their process, so there is nothing to resume
+    assert other.resume() == []
+
+
+def test_cancel_stops_before_the_next_shard(tmp_path):
+    images = write_images(str(tmp_path), 6)
+    started, release = threading.Event(), threading.Event()
+
+    def blocking_predict(vein_type, instances):
+        started.set()
+        release.wait(5)
+        return predict(vein_type, instances)
+
+    manager = BatchJobManager(LocalBatchStore(str(tmp_path / "batch")),
+                              LocalBatchRunner(blocking_predict, shard_size=2), poll_interval=0.02)
+    job = manager.submit("renal", [{"content": path} for path in images])
+    assert started.wait(5)
+    manager.cancel(job["job_id"])
+    release.set()
+
+    job = wait_for(manager, job["job_id"])
+    assert job["state"] == CANCELLED
+    # The shard in flight is finished; none after it is started
+    _, shards = manager.completed_shards(job["job_id"])
+    assert len(shards) == 1
+    assert len(list(manager.stream_results(shards))) == 2
@@ -0,0 +1,95 @@
+import os
+import threading
+import time
+
+from batch_jobs import RUNNING, SUCCEEDED, TERMINAL_STATES
+from deploy_jobs import DeployJobManager, DeployJobStore
+
+
+class FakeRunner:
+    """Deploys that stay RUNNING until done is set."""
+
+    def __init__(self, deployed=None):
+        self.deployed = deployed or []
+        self.done = threading.Event()
+        self.submitted = []
+
+    def deployed_models(self, endpoint_id):
+        return self.deployed
+
+    def ensure_endpoint(self, endpoint_id, display_name):
+        return False, self.deployed
+
+    def submit(self, endpoint_id, model_id, display_name):
+        self.submitted.append(endpoint_id)
+        return f"operations/{endpoint_id}"
+
+    def state(self, operation_name):
+        return (SUCCEEDED if self.done.is_set() else RUNNING), None
+
+    def cancel(self, operation_name):
+        self.done.set()
+
+
+def wait_for(manager, job_id, timeout=5):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = manager.get(job_id)
+        if job["state"] in TERMINAL_STATES:
+            return job
+        time.sleep(0.02)
+    raise AssertionError(f"Job {job_id} still {manager.get(job_id)['state']}")
+
+
+def test_active_job_follows_the_index_until_the_job_finishes(tmp_path):
+    store, runner = DeployJobStore(str(tmp_path)), FakeRunner()
+    manager = DeployJobManager(store, runner, poll_interval=0.02)
+    job = manager.submit("hepatic", "e-1", "m-1", "hepatic-endpoint")
+
+    assert manager.active_job("e-1")["job_id"] == job["job_id"]
+    assert manager.active_job("e-2") is None
+    # A second submit for the same endpoint joins the running job
+    assert manager.submit("hepatic", "e-1", "m-1", "hepatic-endpoint")["job_id"] == job["job_id"]
+
+    runner.done.set()
+    assert wait_for(manager, job["job_id"])["state"] == SUCCEEDED
+    assert manager.active_job("e-1") is None
+    while manager.tracking:
+        time.sleep(0.02)
+    assert store.active("e-1") is None
+    assert runner.submitted == ["e-1"]
+
+
+def test_expired_finished_jobs_are_pruned(tmp_path):
+    store, runner = DeployJobStore(str(tmp_path)), FakeRunner()
+    runner.done.set()
+    manager = DeployJobManager(store, runner, poll_interval=0.02, job_ttl=3600)
+    old = wait_for(manager, manager.submit("hepatic", "e-1", "m-1", "hepatic-endpoint")["job_id"])
+    runner.done.clear()
+    running = manager.submit("portal", "e-2", "m-2", "portal-endpoint")
+    while manager.get(running["job_id"])["operation"] is None:
+        time.sleep(0.02)
+
+    # Age both job files past the TTL; only the finished one goes
+    past = time.time() - 7200
+    for job in (old, running):
+        os.utime(os.path.join(str(tmp_path), f"{job['job_id']}.json"), (past, past))
+    assert manager.prune() == 1
+    assert manager.get(old["job_id"]) is None
+    assert manager.active_job("e-2")["job_id"] == running["job_id"]
+    runner.done.set()
+    wait_for(manager, running["job_id"])
+
+
+def test_a_deploy_that_finds_the_model_served_is_marked_already_deployed(tmp_path):
+    finished = []
+    manager = DeployJobManager(DeployJobStore(str(tmp_path)), FakeRunner(deployed=["dm-1"]), poll_interval=0.02,
+                               on_finish=finished.append)
+    job = wait_for(manager, manager.submit("hepatic", "e-1", "m-1", "hepatic-endpoint")["job_id"])
+
+    assert job["state"] == SUCCEEDED
+    assert job["already_deployed"] is True
+    assert manager.runner.submitted == []
+    while manager.tracking:
+        time.sleep(0.02)
+    assert finished[0]["already_deployed"] is True
@@ -0,0 +1,90 @@
+import io
+import json
+import base64
+
+import numpy as np
+import pytest
+from PIL import Image
+
+import main
+from inference_backends import LocalBackend
+
+LABELS = ["Hepatic Vein: Normal", "Hepatic Vein: Mild", "Hepatic Vein: Severe",
+          "Portal Vein: Normal", "Portal Vein: Severe"]
+PROBABILITIES = [0.1, 0.2, 0.3, 0.3, 0.1]  # Whatever the image: the weights are zero
+
+
+@pytest.fixture(scope="module")
+def model_path(tmp_path_factory):
+    root = tmp_path_factory.mktemp("model")
+    path = root / "model.npz"
+    image_size = 4
+    np.savez(path, weights=np.zeros((image_size * image_size * 3, len(LABELS))),
+             bias=np.log(PROBABILITIES), image_size=image_size)
+    (root / "metadata.json").write_text(json.dumps({"labels": LABELS}))
+    return str(path)
+
+
+@pytest.fixture(scope="module")
+def backend(model_path):
+    backend = LocalBackend(model_path, workers=1)
+    yield backend
+    if backend.pool:
+        backend.pool.shutdown()
+
+
+def image_content():
+    buffer = io.BytesIO()
+    Image.new("RGB", (8, 8), (128, 64, 32)).save(buffer, format="PNG")
+    return base64.b64encode(buffer.getvalue()).decode()
+
+
+def test_predict_ranks_only_the_veins_labels(backend):
+    predictions, details = backend.predict("hepatic", [{"content": image_content()}] * 2, {})
+    assert details == {"model": "model.npz"}
+    assert len(predictions) == 2
+    assert predictions[0]["displayNames"] == ["Hepatic Vein: Severe", "Hepatic Vein: Mild", "Hepatic Vein: Normal"]
+    assert predictions[0]["confidences"] == pytest.approx([0.5, 1 / 3, 1 / 6], abs=1e-5)
+
+
+def test_predict_honours_threshold_and_max_predictions(backend):
+    instances = [{"content": image_content()}]
+    predictions, _ = backend.predict("hepatic", instances, {"confidenceThreshold": 0.2})
+    assert predictions[0]["displayNames"] == ["Hepatic Vein: Severe", "Hepatic Vein: Mild"]
+    predictions, _ = backend.predict("portal", instances, {"maxPredictions": 1})
+    assert predictions[0]["displayNames"] == ["Portal Vein: Normal"]
+    assert predictions[0]["confidences"] == pytest.approx([0.75], abs=1e-5)
+
+
+def test_available_needs_the_veins_labels(model_path):
+    backend = LocalBackend(model_path)
+    assert backend.available("hepatic") and backend.available("portal")
+    assert not backend.available("renal")
+    assert not LocalBackend(None).available("hepatic")
+
+
+@pytest.fixture
+def local(model_path, monkeypatch):
+    backend = LocalBackend(model_path)
+    monkeypatch.setattr(main, "local_backend", backend)
+    monkeypatch.setattr(main, "INFERENCE_BACKEND", "vertex")
+    return backend
+
+
+def test_select_backend_low_priority_goes_local(local):
+    assert main.select_backend("hepatic", {"priority": "low"}, True, False) is local
+    assert main.select_backend("hepatic", {}, True, False) is main.vertex_backend
+
+
+def test_select_backend_not_ready_goes_local(local):
+    assert main.select_backend("hepatic", {}, False, False) is local
+    # No local labels for the vein and no Vertex endpoint: nothing can serve it
+    assert main.select_backend("renal", {}, False, False) is None
+
+
+def test_select_backend_pinned_goes_to_vertex(local, monkeypatch):
+    assert main.select_backend("hepatic", {"priority": "low"}, True, True) is main.vertex_backend
+    assert main.select_backend("hepatic", {}, False, True) is None
+    monkeypatch.setattr(main, "INFERENCE_BACKEND", "local")
+    assert main.select_backend("hepatic", {}, True, True) is main.vertex_backend
+    assert main.select_backend("hepatic", {}, True, False) is local
@@ -0,0 +1,122 @@
+import pytest
+
+from region_router import RegionRouter, load_regions
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+def make_models():
+    models = {"hepatic": {"endpoint_id": "e-us", "model_id": "m-us"}}
+    config = '{"hepatic": [{"location": "europe-west4", "endpoint_id": "e-eu", "model_id": "m-eu"},' \
+             ' {"location": "asia-east1", "endpoint_id": "e-asia", "model_id": "m-asia"}]}'
+    load_regions(models, "us-central1", config)
+    return models
+
+
+def locations(regions):
+    return [region["location"] for region in regions]
+
+
+def attempts(clock, latencies, failing=()):
+    """A fake attempt_fn: takes latencies[location] seconds on the clock, raises in failing regions."""
+    tried = []
+
+    def attempt(region):
+        tried.append(region["location"])
+        clock.advance(latencies.get(region["location"], 0.0))
+        if region["location"] in failing:
+            raise TimeoutError(f"{region['location']} timed out")
+        return f"answer from {region['location']}"
+    return attempt, tried
+
+
+def test_rank_probes_unmeasured_regions_then_orders_by_latency():
+    clock, models = Clock(), make_models()
+    router = RegionRouter(cooldown=60, clock=clock)
+    # Nothing measured yet: config order
+    assert locations(router.rank(models, "hepatic")) == ["us-central1", "europe-west4", "asia-east1"]
+
+    router.record("hepatic", "us-central1", 0.5)
+    router.record("hepatic", "europe-west4", 0.2)
+    # asia-east1 is unmeasured, so it goes first to get probed
+    assert locations(router.rank(models, "hepatic")) == ["asia-east1", "europe-west4", "us-central1"]
+    assert locations(router.rank(models, "hepatic", lambda region: region["location"] != "asia-east1")) == \
+        ["europe-west4", "us-central1"]
+
+
+def test_call_fails_over_and_records_the_error():
+    clock, models = Clock(), make_models()
+    router = RegionRouter(cooldown=60, clock=clock)
+    attempt, tried = attempts(clock, {"us-central1": 30.0, "europe-west4": 0.3}, failing={"us-central1"})
+
+    region, result = router.call(models, "hepatic", attempt, clock=clock)
+    assert region["location"] == "europe-west4"
+    assert result == "answer from europe-west4"
+    assert tried == ["us-central1", "europe-west4"]
+
+    report = router.report()["hepatic"]
+    assert report["us-central1"]["errors"] == 1
+    assert report["us-central1"]["last_error"] == "us-central1 timed out"
+    assert report["europe-west4"]["latency_ewma_ms"] == 300.0
+    # The failed region now ranks behind the one that answered
+    assert locations(router.rank(models, "hepatic"))[-1] == "us-central1"
+
+
+def test_call_raises_the_last_error_when_every_region_fails():
+    clock, models = Clock(), make_models()
+    router = RegionRouter(cooldown=60, clock=clock)
+    attempt, tried = attempts(clock, {}, failing={"us-central1", "europe-west4", "asia-east1"})
+
+    with pytest.raises(TimeoutError, match="asia-east1"):
+        router.call(models, "hepatic", attempt, clock=clock)
+    assert tried == ["us-central1", "europe-west4", "asia-east1"]
+    with pytest.raises(LookupError):
+        router.call(models, "hepatic", attempt, available_fn=lambda region: False, clock=clock)
+
+
+def test_unhealthy_region_is_skipped_for_the_cooldown_then_probed_again():
+    clock, models = Clock(), make_models()
+    router = RegionRouter(alpha=0.5, error_threshold=0.5, cooldown=60, clock=clock)
+    router.record("hepatic", "europe-west4", 0.2)
+    router.record("hepatic", "asia-east1", 0.4)
+
+    router.record("hepatic", "us-central1", error="quota")
+    assert not router.healthy("hepatic", "us-central1")
+    # Tried last while unhealthy, and not chosen for deploys
+    assert locations(router.rank(models, "hepatic"))[-1] == "us-central1"
+    assert router.deploy_region(models, "hepatic")["location"] == "europe-west4"
+    assert router.report()["hepatic"]["us-central1"]["unhealthy_for_seconds"] == 60
+
+    clock.advance(59)
+    assert not router.healthy("hepatic", "us-central1")
+    clock.advance(1)
+    assert router.healthy("hepatic", "us-central1")
+    assert router.deploy_region(models, "hepatic")["location"] == "us-central1"
+
+
+def test_error_rate_halves_every_idle_cooldown():
+    clock, models = Clock(), make_models()
+    router = RegionRouter(alpha=0.5, error_threshold=0.9, cooldown=60, clock=clock)
+    router.record("hepatic", "us-central1", 0.1)
+    router.record("hepatic", "europe-west4", 0.1)
+    router.record("hepatic", "europe-west4", error="timed out")
+    assert router.report()["hepatic"]["europe-west4"]["error_rate"] == 0.5
+    assert locations(router.rank(models, "hepatic", lambda region: region["location"] != "asia-east1")) == \
+        ["us-central1", "europe-west4"]
+
+    clock.advance(60)
+    assert router.report()["hepatic"]["europe-west4"]["error_rate"] == 0.25
+    clock.advance(120)
+    assert router.report()["hepatic"]["europe-west4"]["error_rate"] == 0.0625
+    # The next sample folds into the decayed rate, not the stale one
+    router.record("hepatic", "europe-west4", 0.1)
+    assert router.report()["hepatic"]["europe-west4"]["error_rate"] == 0.0312
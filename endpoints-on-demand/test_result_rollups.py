@@ -0,0 +1,22 @@
+from result_rollups import ResultRollups
+from result_store import LocalSegmentUploader, ResultStore
+from test_result_store import Clock, add_results
+
+
+def test_rebuild_counts_uploaded_segments_once_and_reports_progress(tmp_path):
+    store = ResultStore(str(tmp_path / "results"), uploader=LocalSegmentUploader(str(tmp_path / "uploaded")),
+                        segment_records=5, keep_segments=0, clock=Clock())
+    store._upload_in_background = lambda: None
+    add_results(store, 20)
+    store.upload_pending()
+
+    # A new instance: empty local disk and no rollups, the same uploads
+    fresh = ResultStore(str(tmp_path / "fresh"), uploader=LocalSegmentUploader(str(tmp_path / "uploaded")))
+    rollups = ResultRollups(fresh.root)
+    assert rollups.progress()["complete"] is False
+    assert rollups.rebuild(fresh) == 4
+    assert rollups.progress() == {"complete": True, "running": False, "pending_segments": 0, "added": 4, "failed": 0}
+    assert rollups.summary()["hepatic"]["count"] == 20
+
+    assert rollups.rebuild(fresh) == 0
+    assert rollups.summary()["hepatic"]["count"] == 20
@@ -0,0 +1,68 @@
+import os
+
+from result_store import SEALED_SUFFIX, UPLOADED_SUFFIX, LocalSegmentUploader, ResultStore, result_records
+
+
+class Clock:
+    """Advances a second per call, so each segment gets its own name."""
+
+    def __init__(self):
+        self.now = 1_700_000_000.0
+
+    def __call__(self):
+        self.now += 1
+        return self.now
+
+
+def prediction(label, confidence):
+    return {"displayNames": [label], "confidences": [confidence]}
+
+
+def add_results(store, count, vein_type="hepatic", label="Hepatic Vein: Mild", start=0):
+    for index in range(count):
+        store.add(result_records(vein_type, [prediction(label, 0.9)], [f"hash-{start + index}"], "vertex",
+                                 latency_ms=100, ts=1_700_000_000 + start + index))
+        store.flush()
+
+
+def names(store, suffix):
+    return sorted(name for name in os.listdir(store.root) if name.endswith(suffix))
+
+
+def test_sealed_segments_are_pruned_without_an_uploader(tmp_path):
+    store = ResultStore(str(tmp_path), segment_records=5, keep_segments=2, clock=Clock())
+    add_results(store, 50)
+    assert store.sealed == 10
+    assert len(names(store, SEALED_SUFFIX)) == 2
+    assert store.stats()["pruned"] == 8
+
+
+def test_only_uploaded_segments_are_pruned_with_an_uploader(tmp_path):
+    store = ResultStore(str(tmp_path / "results"), uploader=LocalSegmentUploader(str(tmp_path / "uploaded")),
+                        segment_records=5, keep_segments=2, clock=Clock())
+    # Sealing uploads in a background thread; upload inline instead
+    store._upload_in_background = lambda: None
+    add_results(store, 20)
+    assert len(names(store, SEALED_SUFFIX)) == 4
+    store.upload_pending()
+    assert names(store, SEALED_SUFFIX) == []
+    assert len(names(store, UPLOADED_SUFFIX)) == 2
+    assert len(os.listdir(tmp_path / "uploaded")) == 4
+
+
+def test_query_reads_every_segment_newest_first(tmp_path):
+    store = ResultStore(str(tmp_path), segment_records=5, keep_segments=10, clock=Clock())
+    add_results(store, 12)
+    add_results(store, 3, vein_type="portal", label="Portal Vein: Normal", start=12)
+    assert len(store.segments()) == 3
+
+    results = store.query(vein_type="hepatic", limit=100)
+    assert [record["image_hash"] for record in results] == [f"hash-{index}" for index in reversed(range(12))]
+    assert results[0]["predictions"] == prediction("Hepatic Vein: Mild", 0.9)
+    assert results[0]["cached"] is False
+
+    assert [record["image_hash"] for record in store.query(limit=4)] == ["hash-14", "hash-13", "hash-12", "hash-11"]
+    assert len(store.query(label="Portal Vein: Normal")) == 3
+    assert [record["image_hash"] for record in store.query(since=1_700_000_003, until=1_700_000_006)] == \
+        ["hash-5", "hash-4", "hash-3"]
+    assert [record["vein_type"] for record in store.query(image_hash="hash-13")] == ["portal"]
@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""Concurrent health probe for the Vertex endpoints, on-demand service and local server.
+
+All checks run at once on an asyncio event loop. They share one pooled
+keep-alive requests.Session and one cached access token, and each check has
+its own timeout. Results are plain dicts, so they can be printed as JSON or
+reused by other scripts.
+
+Usage:
+  python health_probe.py                 # single run, human-readable
+  python health_probe.py --json          # single run, JSON
+  python health_probe.py --watch 30      # probe every 30 seconds with latency history
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from collections import defaultdict, deque
+from datetime import datetime
+
+from vexus_tools import ENDPOINTS, ONDEMAND_URL, SERVER_URL, TokenCache, endpoint_url, predict_url
+from vexus_tools.client import create_session as _create_session
+
+DEFAULT_TIMEOUT = 10  # Seconds per check
+PREDICT_TIMEOUT = 30  # Predictions may hit a cold endpoint
+
+# Minimal valid 1x1 PNG used by the prediction checks
+PROBE_PAYLOAD = {
+    "instances": [
+        {
+            "content": "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mP8z8BQDwAEhQGAhKmMIQAAAABJRU5ErkJggg==",
+            "mimeType": "image/png"
+        }
+    ],
+    "parameters": {
+        "confidenceThreshold": 0.0,
+        "maxPredictions": 1
+    }
+}
+
+
+def create_session(pool_size=16):
+    """Create a keep-alive session whose pool fits every concurrent check.
+
+    Retries are off: a probe should report a failure, not hide it.
+    """
+    return _create_session(pool_size=pool_size, retries=0)
+
+
+def _error_detail(response):
+    try:
+        return json.dumps(response.json())[:500]
+    except ValueError:
+        return response.text[:500]
+
+
+def check_vertex_endpoint(session, token_cache, endpoint_id, timeout):
+    """Check that a Vertex AI endpoint exists and has deployed models."""
+    response = session.get(
+        endpoint_url(endpoint_id),
+        headers={"Authorization": f"Bearer {token_cache.get()}"},
+        timeout=timeout
+    )
+    if response.status_code != 200:
+        return False, response.status_code, _error_detail(response)
+    deployed = response.json().get("deployedModels", [])
+    return bool(deployed), response.status_code, None if deployed else "No deployed models"
+
+
+def check_direct_prediction(session, token_cache, endpoint_id, timeout):
+    """Send a minimal prediction straight to a Vertex AI endpoint."""
+    response = session.post(
+        predict_url(endpoint_id),
+        headers={"Authorization": f"Bearer {token_cache.get()}"},
+        json=PROBE_PAYLOAD,
+        timeout=timeout
+    )
+    if response.status_code != 200:
+        return False, response.status_code, _error_detail(response)
+    return bool(response.json().get("predictions")), response.status_code, None
+
+
+def check_ondemand_service(session, token_cache, timeout):
+    """Check the on-demand service health route."""
+    response = session.get(f"{ONDEMAND_URL}/health", timeout=timeout)
+    ok = response.status_code == 200
+    return ok, response.status_code, None if ok else _error_detail(response)
+
+
+def check_ondemand_prediction(session, token_cache, timeout):
+    """Send a minimal prediction through the on-demand service."""
+    response = session.post(f"{ONDEMAND_URL}/predict/hepatic", json=PROBE_PAYLOAD, timeout=timeout)
+    ok = response.status_code == 200
+    return ok, response.status_code, None if ok else _error_detail(response)
+
+
+def check_server(session, token_cache, timeout):
+    """Check that the local Node server is listening."""
+    response = session.get(f"{SERVER_URL}/", timeout=timeout)
+    # Server is running but might not have a root endpoint
+    ok = response.status_code != 404
+    return ok, response.status_code, None
+
+
+def default_checks():
+    """Return the standard checks as (name, function, args, timeout)."""
+    checks = [
+        ("server", check_server, (), DEFAULT_TIMEOUT),
+        ("ondemand_health", check_ondemand_service, (), DEFAULT_TIMEOUT),
+        ("ondemand_predict", check_ondemand_prediction, (), PREDICT_TIMEOUT),
+        ("direct_predict_hepatic", check_direct_prediction, (ENDPOINTS["hepatic"],), PREDICT_TIMEOUT),
+    ]
+    for vein_type, endpoint_id in ENDPOINTS.items():
+        checks.append((f"vertex_{vein_type}", check_vertex_endpoint, (endpoint_id,), DEFAULT_TIMEOUT))
+    return checks
+
+
+async def run_check(name, func, args, timeout, session, token_cache):
+    """Run one blocking check in a worker thread under its own timeout."""
+    start = time.perf_counter()
+    result = {"name": name, "ok": False, "status_code": None, "error": None}
+    try:
+        ok, status_code, error = await asyncio.wait_for(
+            asyncio.to_thread(func, session, token_cache, *args, timeout),
+            timeout=timeout + 1
+        )
+        result.update(ok=ok, status_code=status_code, error=error)
+    except asyncio.TimeoutError:
+        result["error"] = f"Timed out after {timeout}s"
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+    result["latency_ms"] = round((time.perf_counter() - start) * 1000, 1)
+    result["checked_at"] = datetime.now().isoformat()
+    return result
+
+
+async def probe_all(session, token_cache, checks=None):
+    """Run every check concurrently and return their results in check order."""
+    checks = checks or default_checks()
+    return await asyncio.gather(*(
+        run_check(name, func, args, timeout, session, token_cache)
+        for name, func, args, timeout in checks
+    ))
+
+
+def summarize_history(history):
+    """Summarize latency history per check as last/min/median/max and uptime."""
+    summary = {}
+    for name, samples in history.items():
+        latencies = sorted(s["latency_ms"] for s in samples)
+        summary[name] = {
+            "samples": len(samples),
+            "uptime": sum(1 for s in samples if s["ok"]) / len(samples),
+            "last_ms": samples[-1]["latency_ms"],
+            "min_ms": latencies[0],
+            "median_ms": latencies[len(latencies) // 2],
+            "max_ms": latencies[-1],
+        }
+    return summary
+
+
+def print_results(results, summary=None):
+    """Print results in the same style as the original health check script."""
+    for r in results:
+        mark = "✓" if r["ok"] else "✗"
+        line = f"{mark} {r['name']:<24} {r['latency_ms']:>8.1f} ms  status={r['status_code']}"
+        if summary and r["name"] in summary:
+            s = summary[r["name"]]
+            line += f"  median={s['median_ms']:.1f} ms  uptime={s['uptime'] * 100:.0f}%"
+        print(line)
+        if r["error"]:
+            print(f"    {r['error']}")
+
+
+async def watch(interval, history_size, as_json):
+    """Probe at a fixed interval, keeping a bounded latency history per check."""
+    token_cache = TokenCache()
+    history = defaultdict(lambda: deque(maxlen=history_size))
+    with create_session() as session:
+        while True:
+            started = time.monotonic()
+            results = await probe_all(session, token_cache)
+            for r in results:
+                history[r["name"]].append(r)
+            summary = summarize_history(history)
+            if as_json:
+                print(json.dumps({"results": results, "history": summary}), flush=True)
+            else:
+                print(f"\n[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}]")
+                print_results(results, summary)
+            await asyncio.sleep(max(0.0, interval - (time.monotonic() - started)))
+
+
+async def run_once(as_json):
+    with create_session() as session:
+        results = await probe_all(session, TokenCache())
+    if as_json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_results(results)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Probe VExUS services concurrently")
+    parser.add_argument("--json", action="store_true", help="Print machine-readable results")
+    parser.add_argument("--watch", type=float, metavar="SECONDS", help="Probe repeatedly at this interval")
+    parser.add_argument("--history", type=int, default=60, help="Samples of latency history kept per check")
+    args = parser.parse_args()
+
+    try:
+        if args.watch:
+            asyncio.run(watch(args.watch, args.history, args.json))
+        else:
+            results = asyncio.run(run_once(args.json))
+            raise SystemExit(0 if all(r["ok"] for r in results) else 1)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
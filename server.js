@@ -1269,80 +1269,48 @@ const endpointStatus = {
 
 // Helper function to prewarm all endpoints
 async function prewarmAllEndpoints() {
-    console.log('Prewarming all endpoints systematically...');
+    console.log('Prewarming all endpoints in parallel...');
     
-    // Sequential prewarming with proper error handling
-    for (const veinType of VALID_VEIN_TYPES) {
-        try {
-            // Skip if already warming or warmed recently (within last 2 minutes)
-            if (endpointStatus[veinType].warming) {
-                console.log(`Skipping ${veinType} endpoint prewarming - already in progress`);
-                continue;
-            }
-            
-            if (endpointStatus[veinType].lastWarmedAt && 
-                (Date.now() - endpointStatus[veinType].lastWarmedAt < 120000)) {
-                console.log(`Skipping ${veinType} endpoint prewarming - warmed recently at ${new Date(endpointStatus[veinType].lastWarmedAt).toISOString()}`);
-                continue;
-            }
-            
-            // Mark endpoint as warming
-            endpointStatus[veinType].warming = true;
-            
-            console.log(`Prewarming ${veinType} endpoint with minimal test payload...`);
-            
-            // Create minimal test payload
-            const testPayload = {
-                instances: [{
-                    content: 'test',  // Minimal content for prewarming
-                    mimeType: 'text/plain'
-                }],
-                parameters: {
-                    confidenceThreshold: 0,
-                    maxPredictions: 1
-                },
-                metadata: {
-                    veinType,
-                    prewarm: true,
-                    timestamp: Date.now()
-                }
-            };
-            
-            // Send a test request to prewarm without waiting for response
-            try {
-                console.log(`Sending prewarm request to on-demand service for ${veinType}...`);
-                fetch(`${CONFIG.onDemandServiceUrl}/predict/${veinType}`, {
-                    method: 'POST',
-                    headers: { 'Content-Type': 'application/json' },
-                    body: JSON.stringify(testPayload)
-                })
-                .then(response => {
-                    if (response.ok) {
-                        console.log(`✅ ${veinType} endpoint prewarmed successfully`);
-                        endpointStatus[veinType].ready = true;
-                    } else {
-                        console.log(`⚠️ ${veinType} endpoint prewarming returned status ${response.status}`);
-                        endpointStatus[veinType].ready = false;
-                    }
-                    endpointStatus[veinType].lastWarmedAt = Date.now();
-                    endpointStatus[veinType].warming = false;
-                })
-                .catch(e => {
-                    console.log(`Prewarm request error for ${veinType}: ${e.message}`);
-                    endpointStatus[veinType].ready = false;
-                    endpointStatus[veinType].warming = false;
-                });
-            } catch (e) {
-                console.log(`Prewarm request error for ${veinType}: ${e.message}`);
-                endpointStatus[veinType].warming = false;
-            }
-            
-            // Allow a brief pause between endpoint warmups
-            await new Promise(resolve => setTimeout(resolve, 3000)); // Longer pause between endpoint warmups
-        } catch (error) {
-            console.warn(`⚠️ Error prewarming ${veinType} endpoint: ${error.message}`);
-            endpointStatus[veinType].warming = false;
+    const veins = VALID_VEIN_TYPES.filter(veinType => {
+        // Skip if already warming or warmed recently (within last 2 minutes)
+        if (endpointStatus[veinType].warming) {
+            console.log(`Skipping ${veinType} endpoint prewarming - already in progress`);
+            return false;
+        }
+        if (endpointStatus[veinType].lastWarmedAt && 
+            (Date.now() - endpointStatus[veinType].lastWarmedAt < 120000)) {
+            console.log(`Skipping ${veinType} endpoint prewarming - warmed recently at ${new Date(endpointStatus[veinType].lastWarmedAt).toISOString()}`);
+            return false;
         }
+        return true;
+    });
+    if (veins.length === 0) {
+        return;
+    }
+    veins.forEach(veinType => { endpointStatus[veinType].warming = true; });
+    
+    try {
+        // One request checks every model and deploys the missing ones concurrently
+        const response = await fetch(`${CONFIG.onDemandServiceUrl}/warm`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ veins })
+        });
+        const result = await response.json();
+        if (!response.ok && response.status !== 202) {
+            throw new Error(result.error || `status ${response.status}`);
+        }
+        for (const veinType of veins) {
+            const model = (result.models || {})[veinType] || {};
+            endpointStatus[veinType].ready = model.status === 'ready';
+            endpointStatus[veinType].lastWarmedAt = Date.now();
+            console.log(`${model.status === 'ready' ? '✅' : '⏳'} ${veinType} endpoint: ${model.status || 'unknown'}` +
+                (model.job_id ? ` (deploy job ${model.job_id})` : ''));
+        }
+    } catch (error) {
+        console.warn(`⚠️ Error prewarming endpoints: ${error.message}`);
+    } finally {
+        veins.forEach(veinType => { endpointStatus[veinType].warming = false; });
     }
     
     console.log('Endpoint prewarming process completed');
@@ -1,9 +1,9 @@
-import requests
 import base64
 import json
-import subprocess
 import os
 
+from vexus_tools import ENDPOINTS, get_access_token, get_session, predict_url
+
 print("========== DIRECT VERTEX AI API PREDICTION TEST ==========")
 
 # Use a standard test image from Google Cloud samples
@@ -18,23 +18,12 @@ except FileNotFoundError:
     print("Standard test image not found, using fallback 1x1 pixel image")
     base64_image = "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mP8z8BQDwAEhQGAhKmMIQAAAABJRU5ErkJggg=="
 
-# Define endpoints and project
-HEPATIC_ENDPOINT_ID = "8159951878260523008"
-PROJECT_ID = "456295042668"
-LOCATION = "us-central1"
-
 # Get access token
 print("\nGetting access token...")
 try:
-    token_process = subprocess.run(
-        ["gcloud", "auth", "print-access-token"], 
-        capture_output=True, 
-        text=True, 
-        check=True
-    )
-    access_token = token_process.stdout.strip()
+    access_token = get_access_token()
     print("Access token obtained successfully")
-except subprocess.CalledProcessError as e:
+except Exception as e:
     print(f"Error getting access token: {e}")
     access_token = None
 
@@ -58,11 +47,11 @@ payload = {
 
 # Make request directly to Vertex AI API
 print("\nMaking direct request to Vertex AI API...")
-api_url = f"https://{LOCATION}-aiplatform.googleapis.com/v1/projects/{PROJECT_ID}/locations/{LOCATION}/endpoints/{HEPATIC_ENDPOINT_ID}:predict"
+api_url = predict_url(ENDPOINTS["hepatic"])
 print(f"URL: {api_url}")
 
 try:
-    response = requests.post(
+    response = get_session().post(
         api_url,
         json=payload,
         headers={
@@ -1,31 +1,14 @@
 #!/usr/bin/env python3
 
-import requests
 import json
-import subprocess
-import time
 
-# Configuration
-PROJECT_ID = "456295042668"
-LOCATION = "us-central1"
-ENDPOINT_ID = "8159951878260523008"
+from vexus_tools import ENDPOINTS, auth_headers, create_session, get_access_token, predict_url
 
-def get_access_token():
-    """Get access token from gcloud"""
-    print("Getting access token...")
-    result = subprocess.run(
-        ["gcloud", "auth", "print-access-token"], 
-        capture_output=True, 
-        text=True, 
-        check=True
-    )
-    token = result.stdout.strip()
-    print("✓ Access token obtained successfully")
-    return token
+ENDPOINT_ID = ENDPOINTS["hepatic"]
 
 def make_prediction(token, retries=5, delay=2):
     """Make prediction with retry logic"""
-    url = f"https://{LOCATION}-aiplatform.googleapis.com/v1/projects/{PROJECT_ID}/locations/{LOCATION}/endpoints/{ENDPOINT_ID}:predict"
+    url = predict_url(ENDPOINT_ID)
     
     # Very simple 1x1 pixel transparent PNG
     payload = {
@@ -41,41 +24,27 @@ def make_prediction(token, retries=5, delay=2):
         }
     }
     
-    headers = {
-        "Authorization": f"Bearer {token}",
-        "Content-Type": "application/json"
-    }
+    # Transient failures are retried by the session with exponential backoff
+    session = create_session(retries=retries, backoff=delay)
     
-    for attempt in range(1, retries + 1):
+    try:
+        print(f"Sending prediction with up to {retries} retries...")
+        response = session.post(url, headers=auth_headers(token), json=payload, timeout=15)
+        print(f"Status code: {response.status_code}")
+        
+        if response.status_code == 200:
+            return response.json()
+        
+        # Print error details
         try:
-            print(f"Attempt {attempt}/{retries}...")
-            response = requests.post(url, headers=headers, json=payload, timeout=15)
-            
-            print(f"Status code: {response.status_code}")
-            
-            if response.status_code == 200:
-                return response.json()
-            
-            # Print error details
-            if response.status_code >= 400:
-                try:
-                    error = response.json()
-                    print(f"Error details: {json.dumps(error, indent=2)}")
-                except:
-                    print(f"Error response: {response.text}")
-            
-            # If not successful and we have more retries, wait and then try again
-            if attempt < retries:
-                wait_time = delay * attempt
-                print(f"Waiting {wait_time} seconds before retrying...")
-                time.sleep(wait_time)
-            
-        except Exception as e:
-            print(f"Error during request: {e}")
-            if attempt < retries:
-                wait_time = delay * attempt
-                print(f"Waiting {wait_time} seconds before retrying...")
-                time.sleep(wait_time)
+            error = response.json()
+            print(f"Error details: {json.dumps(error, indent=2)}")
+        except ValueError:
+            print(f"Error response: {response.text}")
+    except Exception as e:
+        print(f"Error during request: {e}")
+    finally:
+        session.close()
     
     return None
 
@@ -83,7 +52,9 @@ def main():
     print("========== DIRECT API TEST WITH RETRIES ==========")
     
     # Get access token
+    print("Getting access token...")
     token = get_access_token()
+    print("✓ Access token obtained successfully")
     
     # Make prediction with retries
     result = make_prediction(token)
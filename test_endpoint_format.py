@@ -2,34 +2,19 @@
 
 import json
 import base64
-import requests
-import subprocess
 import os
 from PIL import Image
 import io
 import time
 
+from vexus_tools import ENDPOINTS, get_access_token, get_session, predict_url
+
 # Configuration
-PROJECT_ID = "456295042668"
-LOCATION = "us-central1"
-ENDPOINT_ID = "8159951878260523008"
+ENDPOINT_ID = ENDPOINTS["hepatic"]
 TEST_IMAGE_PATH = "/Users/gabe/VEXUS/test_image.png"
 
 print("========== VERTEX AI ENDPOINT FORMAT TEST ==========")
 
-def get_access_token():
-    """Get access token from gcloud"""
-    print("Getting access token...")
-    result = subprocess.run(
-        ["gcloud", "auth", "print-access-token"], 
-        capture_output=True, 
-        text=True, 
-        check=True
-    )
-    token = result.stdout.strip()
-    print("✓ Access token obtained successfully")
-    return token
-
 # Load the test image
 try:
     with open(TEST_IMAGE_PATH, "rb") as image_file:
@@ -55,7 +40,9 @@ except FileNotFoundError:
     print("Created fallback 1x1 pixel image")
 
 # Get access token
+print("Getting access token...")
 token = get_access_token()
+print("✓ Access token obtained successfully")
 
 # Create a different test image for variety
 print("\nCreating an alternative test image...")
@@ -66,7 +53,7 @@ alt_base64_data = base64.b64encode(alt_buffered.getvalue()).decode("utf-8")
 
 # Try endpoint prediction with different formats
 print("\nTesting different formats with Vertex AI endpoint...")
-endpoint_url = f"https://{LOCATION}-aiplatform.googleapis.com/v1/projects/{PROJECT_ID}/locations/{LOCATION}/endpoints/{ENDPOINT_ID}:predict"
+endpoint_url = predict_url(ENDPOINT_ID)
 
 # Different request formats to try
 formats_to_try = [
@@ -134,7 +121,7 @@ for i, payload in enumerate(formats_to_try):
     }
     
     try:
-        response = requests.post(endpoint_url, headers=headers, json=payload)
+        response = get_session().post(endpoint_url, headers=headers, json=payload)
         
         print(f"Status code: {response.status_code}")
         
@@ -1,99 +1,90 @@
 #!/usr/bin/env python3
 
+import argparse
 import json
 import base64
-import requests
-import subprocess
+import hashlib
 import os
 import io
 import time
+import numpy as np
 from PIL import Image
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
-import random
-import sys
-
-print("========== VERTEX AI FORMAT TESTING SUITE ==========")
-print(f"Test started at: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+from vexus_tools import ENDPOINTS, create_session, get_access_token, ondemand_predict_url, predict_url
 
 # Configuration
-PROJECT_ID = "456295042668"
-LOCATION = "us-central1"
-ENDPOINT_ID = "8159951878260523008"
-ONDEMAND_URL = f"https://endpoints-on-demand-456295042668.us-central1.run.app/predict/hepatic"
-DIRECT_API_URL = f"https://{LOCATION}-aiplatform.googleapis.com/v1/projects/{PROJECT_ID}/locations/{LOCATION}/endpoints/{ENDPOINT_ID}:predict"
-TEST_IMAGES_DIR = "/Users/gabe/VEXUS/test_images"
-RESULTS_FILE = "/Users/gabe/VEXUS/format_test_results.json"
+ENDPOINT_ID = ENDPOINTS["hepatic"]
+ONDEMAND_URL = ondemand_predict_url("hepatic")
+DIRECT_API_URL = predict_url(ENDPOINT_ID)
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+TEST_IMAGES_DIR = os.path.join(BASE_DIR, "test_images")
+ACTUAL_IMAGE_PATH = os.path.join(BASE_DIR, "test_image.png")
+IMAGE_CACHE_DIR = os.path.join(BASE_DIR, ".format_test_cache")
+RESULTS_FILE = os.path.join(BASE_DIR, "format_test_results.jsonl")
 
-def get_access_token():
-    """Get access token from gcloud"""
-    print("Getting access token...")
-    result = subprocess.run(
-        ["gcloud", "auth", "print-access-token"], 
-        capture_output=True, 
-        text=True, 
-        check=True
-    )
-    token = result.stdout.strip()
-    print("✓ Access token obtained successfully")
-    return token
+def _encode_image(array, fmt, quality=90):
+    """Encode a HxWx3 uint8 array with Pillow and return the raw bytes"""
+    buffered = io.BytesIO()
+    img = Image.fromarray(array)
+    if fmt == "JPEG":
+        img.save(buffered, format=fmt, quality=quality)
+    else:
+        img.save(buffered, format=fmt)
+    return buffered.getvalue()
+
+def _solid(width, height, color):
+    return np.broadcast_to(np.array(color, dtype=np.uint8), (height, width, 3)).copy()
+
+def _gradient(width, height, step=25, blue=100):
+    ys, xs = np.indices((height, width))
+    array = np.empty((height, width, 3), dtype=np.uint8)
+    array[..., 0] = (xs * step) % 256
+    array[..., 1] = (ys * step) % 256
+    array[..., 2] = blue
+    return array
+
+# name -> (generator, generator kwargs, format, mime type, description)
+SYNTHETIC_IMAGES = {
+    "white_1x1_png": (_solid, {"width": 1, "height": 1, "color": (255, 255, 255)}, "PNG", "image/png", "1x1 white pixel PNG"),
+    "gradient_10x10_png": (_gradient, {"width": 10, "height": 10}, "PNG", "image/png", "10x10 gradient PNG"),
+    "blue_100x100_jpeg": (_solid, {"width": 100, "height": 100, "color": (0, 0, 200)}, "JPEG", "image/jpeg", "100x100 blue JPEG"),
+}
+
+def cached_image(name, generator, params, fmt):
+    """Return encoded image bytes, generating them only if not cached on disk"""
+    key = hashlib.sha256(json.dumps([name, generator.__name__, params, fmt], sort_keys=True).encode()).hexdigest()[:16]
+    path = os.path.join(IMAGE_CACHE_DIR, f"{name}-{key}.{fmt.lower()}")
+    if os.path.exists(path):
+        with open(path, "rb") as f:
+            return f.read()
+    data = _encode_image(generator(**params), fmt)
+    os.makedirs(IMAGE_CACHE_DIR, exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+    return data
 
 def create_test_images():
     """Create a variety of test images"""
     images = {}
     
-    # 1. Create a 1x1 pixel white PNG
     print("Creating test images of various formats and sizes...")
-    img = Image.new('RGB', (1, 1), color = (255, 255, 255))
-    buffered = io.BytesIO()
-    img.save(buffered, format="PNG")
-    images["white_1x1_png"] = {
-        "data": base64.b64encode(buffered.getvalue()).decode('utf-8'),
-        "mime_type": "image/png",
-        "size": (1, 1),
-        "description": "1x1 white pixel PNG"
-    }
-    
-    # 2. Create a 10x10 gradient PNG
-    img = Image.new('RGB', (10, 10))
-    for x in range(10):
-        for y in range(10):
-            img.putpixel((x, y), (x*25, y*25, 100))
-    buffered = io.BytesIO()
-    img.save(buffered, format="PNG")
-    images["gradient_10x10_png"] = {
-        "data": base64.b64encode(buffered.getvalue()).decode('utf-8'),
-        "mime_type": "image/png",
-        "size": (10, 10),
-        "description": "10x10 gradient PNG"
-    }
-    
-    # 3. Create a 100x100 blue JPEG
-    img = Image.new('RGB', (100, 100), color = (0, 0, 200))
-    buffered = io.BytesIO()
-    img.save(buffered, format="JPEG", quality=90)
-    images["blue_100x100_jpeg"] = {
-        "data": base64.b64encode(buffered.getvalue()).decode('utf-8'),
-        "mime_type": "image/jpeg",
-        "size": (100, 100),
-        "description": "100x100 blue JPEG"
-    }
+    for name, (generator, params, fmt, mime_type, description) in SYNTHETIC_IMAGES.items():
+        data = cached_image(name, generator, params, fmt)
+        images[name] = {
+            "data": base64.b64encode(data).decode('utf-8'),
+            "mime_type": mime_type,
+            "size": (params["width"], params["height"]),
+            "description": description
+        }
     
-    # 4. Load an actual test image if available
-    try:
-        actual_image_path = "/Users/gabe/VEXUS/test_image.png"
-        if os.path.exists(actual_image_path):
-            with open(actual_image_path, "rb") as image_file:
-                image_data = image_file.read()
-                img = Image.open(io.BytesIO(image_data))
-                images["actual_image"] = {
-                    "data": base64.b64encode(image_data).decode('utf-8'),
-                    "mime_type": f"image/{img.format.lower()}",
-                    "size": img.size,
-                    "description": f"Actual test image ({img.size[0]}x{img.size[1]} {img.format})"
-                }
-                print(f"✓ Loaded actual image: {images['actual_image']['description']}")
-    except Exception as e:
-        print(f"Error loading actual image: {e}")
+    # Load an actual test image if available
+    if os.path.exists(ACTUAL_IMAGE_PATH):
+        actual = load_image(ACTUAL_IMAGE_PATH)
+        if actual:
+            actual["description"] = f"Actual test image ({actual['size'][0]}x{actual['size'][1]})"
+            images["actual_image"] = actual
+            print(f"✓ Loaded actual image: {images['actual_image']['description']}")
     
     print(f"✓ Created {len(images)} test images")
     return images
@@ -385,66 +376,137 @@ def create_request_formats(image_info):
     
     return formats
 
-def test_format(format_info, image_info, token, endpoint_url):
-    """Test a specific request format"""
-    print(f"\n--- Testing format: {format_info['name']} ---")
-    print(f"Description: {format_info['description']}")
-    print(f"Image: {image_info['description']}")
-    print(f"Endpoint: {endpoint_url}")
-    
+def test_format(session, format_info, token, target, endpoint_url):
+    """Test a specific request format against one target and return a result record"""
     headers = {
         "Authorization": f"Bearer {token}",
         "Content-Type": "application/json"
     }
     
+    record = {"format": format_info["name"], "target": target, "success": False, "status_code": None}
+    start = time.perf_counter()
     try:
-        response = requests.post(
+        response = session.post(
             endpoint_url, 
             headers=headers, 
             json=format_info['payload'],
             timeout=20
         )
-        
-        print(f"Status code: {response.status_code}")
-        
+        record["status_code"] = response.status_code
+        record["success"] = response.status_code == 200
         if response.status_code == 200:
-            print("✓ SUCCESS!")
             try:
                 result = response.json()
-                if "predictions" in result and len(result["predictions"]) > 0:
-                    prediction = result["predictions"][0]
-                    if "displayNames" in prediction and "confidences" in prediction:
-                        print("Top predictions:")
-                        for i, (name, conf) in enumerate(zip(prediction["displayNames"], prediction["confidences"])):
-                            if i < 3:  # Just show top 3
-                                print(f"  {i+1}. {name}: {conf:.2%}")
-                    else:
-                        print(f"Prediction format: {prediction.keys()}")
-                else:
-                    print(f"Response format: {result.keys()}")
-                return True, result
-            except Exception as e:
-                print(f"Error parsing response: {e}")
-                print(f"Response text: {response.text[:200]}...")
-                return True, response.text
+                prediction = (result.get("predictions") or [result])[0]
+                if isinstance(prediction, dict) and "displayNames" in prediction:
+                    record["top_prediction"] = prediction["displayNames"][0] if prediction["displayNames"] else None
+            except ValueError:
+                pass
         else:
-            print("✗ FAILED")
             try:
-                error = response.json()
-                print(f"Error details: {json.dumps(error, indent=2)}")
-            except:
-                print(f"Error response: {response.text[:200]}...")
-            return False, None
+                record["error"] = json.dumps(response.json())[:300]
+            except ValueError:
+                record["error"] = response.text[:300]
     except Exception as e:
-        print(f"Request error: {e}")
-        return False, None
+        record["error"] = f"Request error: {e}"
+    record["latency_ms"] = round((time.perf_counter() - start) * 1000, 1)
+    return record
+
+def image_hash(image_info):
+    """Identify an image by its content, so a changed file under the same name is not resumed"""
+    return hashlib.sha256(image_info["data"].encode()).hexdigest()[:16]
+
+def load_completed(results_file, content_hash):
+    """Load the result records of this image's unfinished run, if an earlier one was interrupted
+
+    A run that got through every pair ends with a completion marker; records
+    before the image's last marker belong to a finished run and are not resumed.
+    """
+    completed = {}
+    if not os.path.exists(results_file):
+        return completed
+    with open(results_file, "r") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # Partially written line from an interrupted run
+            if record.get("image_hash") != content_hash:
+                continue
+            if record.get("run_complete"):
+                completed = {}
+                continue
+            completed[(record["format"], record["target"])] = record
+    return completed
+
+def run_matrix(formats, image_key, content_hash, token, results_file, concurrency):
+    """Run every format x target pair with bounded concurrency, appending results as they finish"""
+    targets = {"direct": DIRECT_API_URL, "ondemand": ONDEMAND_URL}
+    completed = load_completed(results_file, content_hash)
+    # Requests that never got a response (network errors) are retried on resume
+    completed = {k: r for k, r in completed.items() if r["status_code"] is not None}
+    pending = [
+        (fmt, target) for fmt in formats for target in targets
+        if (fmt["name"], target) not in completed
+    ]
+    if completed:
+        print(f"Resuming: {len(completed)} results already recorded, {len(pending)} remaining")
+    
+    # No transport retries: each format's first response is the result being measured
+    session = create_session(pool_size=concurrency, retries=0)
+    with open(results_file, "a") as out, ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = {
+            executor.submit(test_format, session, fmt, token, target, targets[target]): fmt
+            for fmt, target in pending
+        }
+        for future in as_completed(futures):
+            record = future.result()
+            record["image"] = image_key
+            record["image_hash"] = content_hash
+            completed[(record["format"], record["target"])] = record
+            out.write(json.dumps(record) + "\n")
+            out.flush()
+            mark = "✓" if record["success"] else "✗"
+            print(f"{mark} {record['format']:<24} {record['target']:<9} "
+                  f"status={record['status_code']} {record['latency_ms']:.0f} ms")
+        # Every pair got a response: the next invocation starts a new run instead of resuming this one
+        if all(r["status_code"] is not None for r in completed.values()):
+            out.write(json.dumps({"run_complete": True, "image": image_key, "image_hash": content_hash,
+                                  "timestamp": time.time()}) + "\n")
+    session.close()
+    return list(completed.values())
+
+def print_summary(formats, records):
+    """Print pass/fail and latency per variant and target"""
+    by_key = {(r["format"], r["target"]): r for r in records}
+    print(f"\n{'Format':<24} {'Direct':>16} {'On-demand':>16}")
+    for fmt in formats:
+        cells = []
+        for target in ("direct", "ondemand"):
+            r = by_key.get((fmt["name"], target))
+            cells.append(f"{'✓' if r['success'] else '✗'} {r['latency_ms']:>8.0f} ms" if r else "-")
+        print(f"{fmt['name']:<24} {cells[0]:>16} {cells[1]:>16}")
 
 def main():
+    parser = argparse.ArgumentParser(description="Test request format variations against both prediction targets")
+    parser.add_argument("--concurrency", type=int, default=4, help="Maximum requests in flight")
+    parser.add_argument("--results", default=RESULTS_FILE, help="Incremental results file (JSONL)")
+    parser.add_argument("--fresh", action="store_true", help="Discard earlier results instead of resuming an interrupted run")
+    args = parser.parse_args()
+    
+    print("========== VERTEX AI FORMAT TESTING SUITE ==========")
+    print(f"Test started at: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    
+    if args.fresh and os.path.exists(args.results):
+        os.remove(args.results)
+    
     # Create test images
     test_images = create_test_images()
     
     # Get access token
+    print("Getting access token...")
     token = get_access_token()
+    print("✓ Access token obtained successfully")
     
     # Select which image to test with
     selected_image_key = "actual_image" if "actual_image" in test_images else next(iter(test_images))
@@ -453,40 +515,22 @@ def main():
     # Create request formats
     formats = create_request_formats(selected_image)
     
-    # Test direct API endpoint
-    print("\n========== TESTING DIRECT VERTEX AI ENDPOINT ==========")
-    successful_formats_direct = []
-    
-    for fmt in formats:
-        success, _ = test_format(fmt, selected_image, token, DIRECT_API_URL)
-        if success:
-            successful_formats_direct.append(fmt["name"])
-        time.sleep(2)  # Small delay between requests
-    
-    # Test on-demand service
-    print("\n========== TESTING ON-DEMAND SERVICE ENDPOINT ==========")
-    successful_formats_ondemand = []
+    print(f"\n========== TESTING {len(formats)} FORMATS x 2 TARGETS ==========")
+    records = run_matrix(formats, selected_image_key, image_hash(selected_image), token, args.results,
+                         args.concurrency)
     
-    for fmt in formats:
-        success, _ = test_format(fmt, selected_image, token, ONDEMAND_URL)
-        if success:
-            successful_formats_ondemand.append(fmt["name"])
-        time.sleep(2)  # Small delay between requests
+    successful_formats_direct = [f["name"] for f in formats if any(
+        r["format"] == f["name"] and r["target"] == "direct" and r["success"] for r in records)]
+    successful_formats_ondemand = [f["name"] for f in formats if any(
+        r["format"] == f["name"] and r["target"] == "ondemand" and r["success"] for r in records)]
     
     # Summary
     print("\n========== SUMMARY ==========")
-    print(f"Total formats tested: {len(formats)}")
+    print_summary(formats, records)
+    print(f"\nTotal formats tested: {len(formats)}")
     print(f"Successful with direct endpoint: {len(successful_formats_direct)}/{len(formats)}")
     print(f"Successful with on-demand service: {len(successful_formats_ondemand)}/{len(formats)}")
     
-    print("\nSuccessful formats with direct endpoint:")
-    for fmt in successful_formats_direct:
-        print(f"✓ {fmt}")
-    
-    print("\nSuccessful formats with on-demand service:")
-    for fmt in successful_formats_ondemand:
-        print(f"✓ {fmt}")
-    
     # Write successful formats to file for reference
     with open("successful_formats.json", "w") as f:
         json.dump({
@@ -502,7 +546,8 @@ def main():
         }, f, indent=2)
     
     print("\nSuccessful formats saved to successful_formats.json")
+    print(f"Per-request results saved to {args.results}")
     print("\n========== TEST COMPLETE ==========")
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
@@ -2,33 +2,18 @@
 
 import json
 import base64
-import requests
-import subprocess
 import os
 from PIL import Image
 import io
 
+from vexus_tools import MODELS, get_access_token, get_session, model_predict_url
+
 # Configuration
-PROJECT_ID = "456295042668" 
-LOCATION = "us-central1"
-MODEL_ID = "6041241350047793152"  # Model ID (not endpoint ID)
+MODEL_ID = MODELS["hepatic"]  # Model ID (not endpoint ID)
 TEST_IMAGE_PATH = "/Users/gabe/VEXUS/test_image.png"
 
 print("========== VERTEX AI DIRECT MODEL TEST ==========")
 
-def get_access_token():
-    """Get access token from gcloud"""
-    print("Getting access token...")
-    result = subprocess.run(
-        ["gcloud", "auth", "print-access-token"], 
-        capture_output=True, 
-        text=True, 
-        check=True
-    )
-    token = result.stdout.strip()
-    print("✓ Access token obtained successfully")
-    return token
-
 # Load the test image
 try:
     with open(TEST_IMAGE_PATH, "rb") as image_file:
@@ -54,11 +39,13 @@ except FileNotFoundError:
     print("Created fallback 1x1 pixel image")
 
 # Get access token
+print("Getting access token...")
 token = get_access_token()
+print("✓ Access token obtained successfully")
 
 # Try direct model prediction (not endpoint)
 print("\nMaking direct Vertex AI model prediction (bypassing endpoint)...")
-model_url = f"https://{LOCATION}-aiplatform.googleapis.com/v1/projects/{PROJECT_ID}/locations/{LOCATION}/models/{MODEL_ID}:predict"
+model_url = model_predict_url(MODEL_ID)
 
 # Different request formats to try
 formats_to_try = [
@@ -99,7 +86,7 @@ for i, payload in enumerate(formats_to_try):
     }
     
     try:
-        response = requests.post(model_url, headers=headers, json=payload)
+        response = get_session().post(model_url, headers=headers, json=payload)
         
         print(f"Status code: {response.status_code}")
         
@@ -1,42 +1,24 @@
 #!/usr/bin/env python3
 
 import json
-import requests
-import subprocess
 
-# Configuration
-PROJECT_ID = "456295042668"
-LOCATION = "us-central1"
+from vexus_tools import auth_headers, get_access_token, get_session, vertex_url
 
 print("========== VERTEX AI MODELS LIST ==========")
 
-def get_access_token():
-    """Get access token from gcloud"""
-    print("Getting access token...")
-    result = subprocess.run(
-        ["gcloud", "auth", "print-access-token"], 
-        capture_output=True, 
-        text=True, 
-        check=True
-    )
-    token = result.stdout.strip()
-    print("✓ Access token obtained successfully")
-    return token
-
 # Get access token
+print("Getting access token...")
 token = get_access_token()
+print("✓ Access token obtained successfully")
 
 # List models
 print("\nListing Vertex AI models...")
-models_url = f"https://{LOCATION}-aiplatform.googleapis.com/v1/projects/{PROJECT_ID}/locations/{LOCATION}/models"
+models_url = vertex_url("models")
 
-headers = {
-    "Authorization": f"Bearer {token}",
-    "Content-Type": "application/json"
-}
+headers = auth_headers(token)
 
 try:
-    response = requests.get(models_url, headers=headers)
+    response = get_session().get(models_url, headers=headers)
     
     print(f"Status code: {response.status_code}")
     
@@ -72,10 +54,10 @@ except Exception as e:
 
 # List endpoints
 print("\nListing Vertex AI endpoints...")
-endpoints_url = f"https://{LOCATION}-aiplatform.googleapis.com/v1/projects/{PROJECT_ID}/locations/{LOCATION}/endpoints"
+endpoints_url = vertex_url("endpoints")
 
 try:
-    response = requests.get(endpoints_url, headers=headers)
+    response = get_session().get(endpoints_url, headers=headers)
     
     print(f"Status code: {response.status_code}")
     
@@ -0,0 +1,42 @@
+"""Shared helpers for the VExUS tooling scripts.
+
+Scripts import project configuration, a cached access token and a pooled
+HTTP session from here instead of each spawning gcloud and hard-coding IDs.
+"""
+
+from vexus_tools.auth import TokenCache, get_access_token
+from vexus_tools.client import auth_headers, create_session, get_session
+from vexus_tools.config import (
+    ENDPOINTS,
+    LOCATION,
+    MODELS,
+    ONDEMAND_URL,
+    PROJECT_ID,
+    PROJECT_NUMBER,
+    SERVER_URL,
+    endpoint_url,
+    model_predict_url,
+    ondemand_predict_url,
+    predict_url,
+    vertex_url,
+)
+
+__all__ = [
+    "ENDPOINTS",
+    "LOCATION",
+    "MODELS",
+    "ONDEMAND_URL",
+    "PROJECT_ID",
+    "PROJECT_NUMBER",
+    "SERVER_URL",
+    "TokenCache",
+    "auth_headers",
+    "create_session",
+    "endpoint_url",
+    "get_access_token",
+    "get_session",
+    "model_predict_url",
+    "ondemand_predict_url",
+    "predict_url",
+    "vertex_url",
+]
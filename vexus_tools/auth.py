@@ -0,0 +1,100 @@
+"""Access tokens for the Vertex AI REST API, cached in memory and on disk.
+
+Spawning `gcloud auth print-access-token` costs about a second, so a token
+is written to a user-only cache file and reused by every script until it is
+close to expiry.
+"""
+
+import json
+import os
+import subprocess
+import threading
+from datetime import datetime, timedelta, timezone
+
+TOKEN_CACHE_PATH = os.environ.get(
+    "VEXUS_TOKEN_CACHE",
+    os.path.join(os.path.expanduser("~"), ".cache", "vexus", "token.json")
+)
+# gcloud does not report token expiry; its tokens last an hour
+GCLOUD_TOKEN_LIFETIME = timedelta(minutes=55)
+
+
+class TokenCache:
+    """Caches an access token until shortly before it expires."""
+
+    def __init__(self, path=TOKEN_CACHE_PATH, refresh_margin=300):
+        self.path = path
+        self.refresh_margin = timedelta(seconds=refresh_margin)
+        self.token = None
+        self.expiry = None
+        self.lock = threading.Lock()
+
+    def get(self):
+        with self.lock:
+            if not self._valid():
+                self._load()
+            if not self._valid():
+                self.token, self.expiry = self._fetch()
+                self._save()
+            return self.token
+
+    def invalidate(self):
+        """Drop the cached token, e.g. after a 401."""
+        with self.lock:
+            self.token = self.expiry = None
+            if self.path and os.path.exists(self.path):
+                os.remove(self.path)
+
+    def _valid(self):
+        return bool(self.token and self.expiry
+                    and datetime.now(timezone.utc) < self.expiry - self.refresh_margin)
+
+    def _load(self):
+        if not self.path:
+            return
+        try:
+            with open(self.path, "r") as f:
+                cached = json.load(f)
+            self.token = cached["token"]
+            self.expiry = datetime.fromisoformat(cached["expiry"])
+        except (OSError, ValueError, KeyError):
+            pass
+
+    def _save(self):
+        if not self.path:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            fd = os.open(self.path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, "w") as f:
+                json.dump({"token": self.token, "expiry": self.expiry.isoformat()}, f)
+        except OSError:
+            pass  # The in-memory token still works
+
+    @staticmethod
+    def _fetch():
+        """Get a token from application default credentials, falling back to gcloud."""
+        try:
+            import google.auth
+            import google.auth.transport.requests
+            credentials, _ = google.auth.default(scopes=["https://www.googleapis.com/auth/cloud-platform"])
+            credentials.refresh(google.auth.transport.requests.Request())
+            if credentials.expiry:
+                return credentials.token, credentials.expiry.replace(tzinfo=timezone.utc)
+            return credentials.token, datetime.now(timezone.utc) + GCLOUD_TOKEN_LIFETIME
+        except Exception:
+            result = subprocess.run(
+                ["gcloud", "auth", "print-access-token"],
+                capture_output=True,
+                text=True,
+                check=True
+            )
+            return result.stdout.strip(), datetime.now(timezone.utc) + GCLOUD_TOKEN_LIFETIME
+
+
+_default_cache = TokenCache()
+
+
+def get_access_token():
+    """Return a valid access token, fetching one only when the cache is stale."""
+    return _default_cache.get()
@@ -0,0 +1,51 @@
+"""Pooled keep-alive HTTP session with the common retry policy."""
+
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from vexus_tools.auth import get_access_token
+
+# Retry transient failures, including POST: predictions are safe to repeat
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+DEFAULT_RETRIES = 3
+DEFAULT_BACKOFF = 0.5  # Seconds; doubles on each attempt
+
+
+def create_session(pool_size=16, retries=DEFAULT_RETRIES, backoff=DEFAULT_BACKOFF):
+    """Create a keep-alive session with a connection pool and the retry policy."""
+    retry = Retry(
+        total=retries,
+        backoff_factor=backoff,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=None,
+        raise_on_status=False
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """Return the process-wide shared session."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = create_session()
+        return _session
+
+
+def auth_headers(token=None):
+    """Headers for an authenticated JSON request to the Vertex AI API."""
+    return {
+        "Authorization": f"Bearer {token or get_access_token()}",
+        "Content-Type": "application/json"
+    }
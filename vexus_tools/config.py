@@ -0,0 +1,46 @@
+"""Project, endpoint and service configuration shared by the scripts."""
+
+import os
+
+PROJECT_ID = os.environ.get("PROJECT_ID", "plucky-weaver-450819-k7")
+PROJECT_NUMBER = os.environ.get("PROJECT_NUMBER", "456295042668")
+LOCATION = os.environ.get("LOCATION", "us-central1")
+
+ONDEMAND_URL = os.environ.get("ONDEMAND_URL", f"https://endpoints-on-demand-{PROJECT_NUMBER}.{LOCATION}.run.app")
+SERVER_URL = os.environ.get("SERVER_URL", "http://localhost:3002")
+
+# Vertex AI endpoint IDs per vein type
+ENDPOINTS = {
+    "hepatic": "8159951878260523008",
+    "portal": "2970410926785691648",
+    "renal": "1148704877514326016"
+}
+
+# Vertex AI model IDs per vein type
+MODELS = {
+    "hepatic": "6041241350047793152",
+    "portal": "6378976137728491520",
+    "renal": "8902680778916233216"
+}
+
+
+def vertex_url(path=""):
+    """Return a Vertex AI REST URL under this project and location."""
+    base = f"https://{LOCATION}-aiplatform.googleapis.com/v1/projects/{PROJECT_ID}/locations/{LOCATION}"
+    return f"{base}/{path}" if path else base
+
+
+def endpoint_url(endpoint_id):
+    return vertex_url(f"endpoints/{endpoint_id}")
+
+
+def predict_url(endpoint_id):
+    return f"{endpoint_url(endpoint_id)}:predict"
+
+
+def model_predict_url(model_id):
+    return vertex_url(f"models/{model_id}:predict")
+
+
+def ondemand_predict_url(vein_type):
+    return f"{ONDEMAND_URL}/predict/{vein_type}"